@@ -0,0 +1,79 @@
+"""
+离线压测截图链路（不需要模拟器）
+
+用debug/里的截图伪造一个和 `while true; do screencap; done` 一样的原始数据流，
+分别测量：
+1. RawScreencapReader 逐帧解析的吞吐
+2. FrameProducer 后台线程 + 消费者取最新帧的延迟
+
+用法（在项目根目录下）：
+    python dev_tools/bench_capture.py [--frames 200]
+"""
+import argparse
+import glob
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.zzz_assistant.core.capture import CaptureBackend, FakeScreencapStream, FrameProducer, RawScreencapReader
+from src.zzz_assistant.utils.paths import PROJECT_ROOT
+
+
+class _StreamBackend(CaptureBackend):
+    """把假数据流包装成截图后端，交给FrameProducer使用"""
+
+    def __init__(self, stream: FakeScreencapStream, header_size: int):
+        self.reader = RawScreencapReader(stream.recv_into, header_size)
+
+    def grab(self):
+        try:
+            return self.reader.read_frame()
+        except EOFError:
+            return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="离线压测截图链路")
+    parser.add_argument('--frames', type=int, default=200, help="解析多少帧")
+    args = parser.parse_args()
+
+    paths = sorted(glob.glob(os.path.join(PROJECT_ROOT, 'debug', '*.png')))
+    paths.append(os.path.join(PROJECT_ROOT, 'debug_screenshot.png'))
+    paths = [p for p in paths if os.path.exists(p)]
+    if not paths:
+        print("Error: 没有找到可用于回放的截图。")
+        return
+
+    # 1. 纯解析吞吐
+    stream = FakeScreencapStream(paths, header_size=16, frame_count=args.frames)
+    reader = RawScreencapReader(stream.recv_into, header_size=16)
+    start = time.perf_counter()
+    for _ in range(args.frames):
+        reader.read_frame()
+    elapsed = time.perf_counter() - start
+    print(f"解析原始数据流：{args.frames}帧，{elapsed:.2f}秒，平均{elapsed / args.frames * 1000:.2f}毫秒/帧，"
+          f"{args.frames / elapsed:.1f} FPS")
+
+    # 2. 后台线程 + 取最新帧
+    stream = FakeScreencapStream(paths, header_size=16)
+    producer = FrameProducer(_StreamBackend(stream, header_size=16))
+    producer.grab()
+    samples = []
+    start = time.perf_counter()
+    while time.perf_counter() - start < 2:
+        t = time.perf_counter()
+        frame = producer.grab()
+        samples.append(time.perf_counter() - t)
+        assert frame is not None
+        time.sleep(0.01)
+    produced = producer.frames_produced
+    producer.close()
+    samples.sort()
+    print(f"后台线程2秒内产出{produced}帧；消费者取帧延迟 "
+          f"中位数{samples[len(samples) // 2] * 1e6:.1f}微秒，最大{samples[-1] * 1e6:.1f}微秒")
+
+
+if __name__ == '__main__':
+    main()
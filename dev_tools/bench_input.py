@@ -0,0 +1,71 @@
+"""
+测量点击延迟，对比几种输入方式
+
+不带参数时只用FakeInputChannel离线检查：触控脚本翻译成的命令、一段多步脚本合并后只需要发送一次，
+以及Python这一侧每次点击的开销。
+指定--serial时连接真正的模拟器，分别用adb、shell（和配置了--maatouch时的maatouch）方式
+在同一个位置连续点击，测量每次点击的耗时。请把点击位置选在不会触发任何操作的空白处。
+
+用法（在项目根目录下）：
+    python dev_tools/bench_input.py
+    python dev_tools/bench_input.py --serial 127.0.0.1:16384 --x 640 --y 20 --count 20
+"""
+import argparse
+import os
+import statistics
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import adbutils
+
+from src.zzz_assistant.core.input import INPUT_METHODS, FakeInputChannel, Gesture, create_input_channel, \
+    measure_tap_latency
+
+
+def report(name: str, samples: list[float]):
+    samples = sorted(samples)
+    print(f"{name:<10} 点击{len(samples)}次：中位数{statistics.median(samples) * 1000:.2f}ms，"
+          f"最小{samples[0] * 1000:.2f}ms，最大{samples[-1] * 1000:.2f}ms")
+
+
+def offline(x: int, y: int, count: int):
+    channel = FakeInputChannel(screen_size=(1280, 720))
+    script = Gesture.tap(x, y).then(Gesture.long_press(x, y, 800)).then(Gesture.swipe(x, 600, x, 100, 300))
+    channel.run(script)
+    print(f"一段{len(script.steps)}步的触控脚本合并成1次发送：{channel.commands[-1][1]}")
+    report('fake', measure_tap_latency(channel, x, y, count))
+
+
+def online(serial: str, x: int, y: int, count: int, maatouch: str | None):
+    adb_device = adbutils.device(serial=serial)
+    methods = [m for m in INPUT_METHODS if m != 'maatouch' or maatouch]
+    for method in methods:
+        channel = create_input_channel(method, adb_device, maatouch)
+        try:
+            # 第一次点击包含建立连接的开销，不计入结果
+            channel.tap(x, y)
+            report(method, measure_tap_latency(channel, x, y, count))
+        except Exception as e:
+            print(f"Error: {method}方式测量失败：{e}")
+        finally:
+            channel.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="测量点击延迟")
+    parser.add_argument('--serial', help="模拟器的adb序列号，不填则只做离线检查")
+    parser.add_argument('--maatouch', help="本地的MaaTouch文件路径，填了才会测量maatouch方式")
+    parser.add_argument('--x', type=int, default=640)
+    parser.add_argument('--y', type=int, default=20)
+    parser.add_argument('--count', type=int, default=20, help="每种方式点击几次")
+    args = parser.parse_args()
+
+    if args.serial:
+        online(args.serial, args.x, args.y, args.count, args.maatouch)
+    else:
+        offline(args.x, args.y, args.count)
+
+
+if __name__ == '__main__':
+    main()
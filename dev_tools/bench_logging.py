@@ -0,0 +1,91 @@
+"""
+日志开销的微基准测试（不需要模拟器）
+
+比较热路径上每次调用的开销：
+1. print：原来的做法，同步写到输出（默认写到os.devnull，真实的Windows控制台要慢得多，可以用--stdout看）
+2. debug（关闭）：默认级别下热路径上的logger.debug()，消息不会被格式化
+3. info（队列）：达到级别的日志，只在调用线程里代入参数、放进队列，由后台线程写出
+4. iteration[级别]：在一张截图上检查一次模板（wait_for_template的快速检查模式，匹配结果走缓存），
+   分别在INFO和DEBUG级别下测一次，两者的差就是热路径日志剩下的开销
+
+用法（在项目根目录下）：
+    python dev_tools/bench_logging.py
+    python dev_tools/bench_logging.py --calls 100000 --stdout
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.zzz_assistant.core.frame import Frame
+from src.zzz_assistant.utils.helpers import wait_for_template
+from src.zzz_assistant.utils.log import configure_logging, dropped_records, flush_logging, get_logger
+from src.zzz_assistant.utils.paths import PROJECT_ROOT
+
+logger = get_logger('bench')
+
+
+def per_call(func, calls: int) -> float:
+    """执行calls次，返回每次的平均耗时（秒）"""
+    start = time.perf_counter()
+    for i in range(calls):
+        func(i)
+    return (time.perf_counter() - start) / calls
+
+
+def main():
+    parser = argparse.ArgumentParser(description="测量日志在热路径上的开销")
+    parser.add_argument('--calls', type=int, default=20000, help="每项调用多少次")
+    parser.add_argument('--stdout', action='store_true', help="输出到真实的控制台而不是os.devnull")
+    args = parser.parse_args()
+
+    real_stdout = sys.stdout
+    sink = real_stdout if args.stdout else open(os.devnull, 'w', encoding='utf-8')
+    frame = Frame.from_file(PROJECT_ROOT / 'debug_screenshot.png')
+    point = (640, 360)
+    results = {}
+
+    # 日志的StreamHandler在configure_logging时绑定sys.stdout，先换成sink
+    sys.stdout = sink
+    try:
+        results['print'] = per_call(
+            lambda i: print(f"在坐标{point}找到模板login/_TEMP_AD_BUTTON, 相似度：{0.95:.2f}", flush=True),
+            args.calls)
+
+        configure_logging({'logging': {'level': 'INFO'}})
+        results['debug（关闭）'] = per_call(
+            lambda i: logger.debug("在坐标(%d, %d)找到模板%s，相似度：%.2f", *point, 'login/_TEMP_AD_BUTTON', 0.95),
+            args.calls)
+        results['info（队列）'] = per_call(
+            lambda i: logger.info("在坐标(%d, %d)找到模板%s，相似度：%.2f", *point, 'login/_TEMP_AD_BUTTON', 0.95),
+            args.calls)
+        start = time.perf_counter()
+        flush_logging()
+        drain = time.perf_counter() - start
+
+        for level in ('INFO', 'DEBUG'):
+            configure_logging({'logging': {'level': level}})
+            check = lambda i: wait_for_template(None, 'login/_TEMP_AD_BUTTON', pre_captured_image=frame,
+                                                roi=(880, 0, 400, 300), margin=20)
+            check(0)  # 预热：加载模板，之后的匹配都走缓存
+            results[f"iteration[{level}]"] = per_call(check, args.calls)
+            flush_logging()
+    finally:
+        sys.stdout = real_stdout
+        configure_logging()
+        if sink is not real_stdout:
+            sink.close()
+
+    print(f"每项调用{args.calls}次，输出到{'控制台' if args.stdout else 'os.devnull'}")
+    for name, seconds in results.items():
+        print(f"  {name:<18} {seconds * 1e6:8.2f} µs/次")
+    print(f"后台线程写完{args.calls}条info日志又用了{drain * 1000:.1f}ms（不占调用线程），"
+          f"队列满丢弃了{dropped_records()}条")
+    print(f"打开DEBUG时每次检查多花{(results['iteration[DEBUG]'] - results['iteration[INFO]']) * 1e6:.1f}µs；"
+          f"默认级别下每条热路径日志只剩{results['debug（关闭）'] * 1e6:.2f}µs的级别判断")
+
+
+if __name__ == '__main__':
+    main()
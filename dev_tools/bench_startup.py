@@ -0,0 +1,99 @@
+"""
+启动耗时的基准测试（不需要模拟器）
+
+在新的子进程里分别测量：
+1. import：`import main` 的耗时，以及用 `python -X importtime` 统计出的最慢的几个模块
+2. check：`python main.py --check` 从启动到退出的总耗时
+并检查这两种情况下cv2、numpy、adbutils有没有被导入——它们应该等到第一次截图、识别时才导入。
+
+用法（在项目根目录下）：
+    python dev_tools/bench_startup.py
+    python dev_tools/bench_startup.py --rounds 10 --top 15
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 导入很慢、应当延迟到第一次使用时才导入的模块
+HEAVY_MODULES = ('cv2', 'numpy', 'adbutils')
+
+# 导入main后打印出已经导入了哪些重量级模块
+PROBE_CODE = ("import sys, main; "
+              f"print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))")
+
+
+def run_python(args: list[str]) -> tuple[float, subprocess.CompletedProcess]:
+    """
+    在项目根目录下启动一个新的Python进程
+    :return: (从启动到退出的耗时（秒）, 进程结果)
+    """
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, *args], cwd=PROJECT_ROOT, capture_output=True, text=True)
+    return time.perf_counter() - start, result
+
+
+def parse_importtime(stderr: str) -> list[tuple[int, str]]:
+    """
+    解析 -X importtime 的输出
+    :return: [(累计耗时（微秒）, 模块名)]，只包含顶层导入和它们直接导入的模块
+    """
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative_us, name = line[len('import time:'):].split('|')
+        # 模块名前每两个空格表示一层嵌套导入
+        depth = (len(name) - len(name.lstrip(' ')) - 1) // 2
+        if depth <= 1:
+            entries.append((int(cumulative_us), name.strip()))
+    return entries
+
+
+def main():
+    parser = argparse.ArgumentParser(description="启动耗时基准测试")
+    parser.add_argument('--rounds', type=int, default=5, help="每一项重复多少次，取中位数")
+    parser.add_argument('--top', type=int, default=10, help="列出导入最慢的多少个模块")
+    args = parser.parse_args()
+
+    import_times, check_times = [], []
+    loaded = ''
+    for _ in range(args.rounds):
+        elapsed, result = run_python(['-c', PROBE_CODE])
+        if result.returncode != 0:
+            print(f"Error: import main失败：\n{result.stderr}")
+            sys.exit(2)
+        import_times.append(elapsed)
+        loaded = result.stdout.strip().splitlines()[-1] if result.stdout.strip() else ''
+
+        elapsed, result = run_python(['main.py', '--check'])
+        check_times.append(elapsed)
+        check_ok = result.returncode == 0
+
+    # 解释器本身的启动耗时，用来扣除
+    baseline_times = [run_python(['-c', 'pass'])[0] for _ in range(args.rounds)]
+    interpreter = statistics.median(baseline_times)
+
+    print(f"Python {sys.version.split()[0]}，每项{args.rounds}轮，取中位数（已扣除解释器启动{interpreter * 1000:.0f}ms）")
+    print(f"  import main       {(statistics.median(import_times) - interpreter) * 1000:8.1f} ms")
+    print(f"  main.py --check   {(statistics.median(check_times) - interpreter) * 1000:8.1f} ms"
+          f"  （{'通过' if check_ok else '发现问题'}）")
+
+    _, result = run_python(['-X', 'importtime', '-c', 'import main'])
+    entries = sorted(parse_importtime(result.stderr), reverse=True)[:args.top]
+    print(f"\n导入最慢的{len(entries)}个模块（累计耗时）：")
+    for cumulative_us, name in entries:
+        print(f"  {cumulative_us / 1000:8.1f} ms  {name}")
+
+    if loaded:
+        print(f"\nWarning: import main时就导入了{loaded}，启动会变慢。")
+        sys.exit(1)
+    print(f"\nimport main时没有导入{'、'.join(HEAVY_MODULES)}。")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,281 @@
+"""
+视觉链路的微基准测试（不需要模拟器）
+
+用assets/里的真实模板和debug/里的截图，分别在720P、1080P、1440P下合成测试画面，测量：
+1. decode：把所有画面的PNG各解码一次
+2. resize：把所有画面各缩放到设计分辨率一次（Frame.scaled + 灰度图）
+3. match：每个模板分别用全分辨率匹配和金字塔匹配在全屏中匹配一次（不含缩放，不走匹配缓存）
+4. probes：在所有画面上各检查一次8个颜色探针（页面识别前的快速排除，不触发缩放）
+5. navigator：对所有画面各做一次完整的Navigator.get_current_page()（截图由假设备直接给出）
+
+输出和pytest-benchmark类似的表格。结果可以保存为基线，之后的运行和基线比较，
+任何一项的中位数比基线慢超过--max-regression（默认25%）时以非0状态码退出，方便在改动视觉代码前后对比。
+基线和机器有关，默认保存在cache/下，不会提交到仓库。
+
+用法（在项目根目录下）：
+    python dev_tools/bench_vision.py --save-baseline      # 记录基线
+    python dev_tools/bench_vision.py                      # 和基线比较
+    python dev_tools/bench_vision.py --filter 1080p --min-time 0.5
+"""
+import argparse
+import glob
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.zzz_assistant.core.frame import DESIGN_RESOLUTION, Frame
+from src.zzz_assistant.core.navigator import Navigator
+from src.zzz_assistant.core.probes import ColorProbe, ProbeSet
+from src.zzz_assistant.core.template_registry import get_template
+from src.zzz_assistant.core.vision import MATCH_STRATEGIES, match_memo, match_template
+from src.zzz_assistant.utils.log import configure_logging
+from src.zzz_assistant.utils.paths import ASSETS_PATH, CACHE_PATH, PROJECT_ROOT
+
+# 测试的截图分辨率（宽×高），都是16:9
+RESOLUTIONS = {
+    '720p': (1280, 720),
+    '1080p': (1920, 1080),
+    '1440p': (2560, 1440),
+}
+DEFAULT_BASELINE_FILE = CACHE_PATH / "bench_vision_baseline.json"
+DEFAULT_MAX_REGRESSION = 0.25
+
+
+class _FrameDevice:
+    """依次返回给定画面的假设备，给Navigator用"""
+
+    def __init__(self, images: list[np.ndarray]):
+        self.serial = 'bench'
+        self.images = images
+        self.index = 0
+
+    def screenshot(self) -> Frame:
+        image = self.images[self.index % len(self.images)]
+        self.index += 1
+        # 每次都是新的Frame，派生图像不会跨轮次复用
+        return Frame(image)
+
+
+def load_captures() -> list[np.ndarray]:
+    """读取debug/里的截图，统一成设计分辨率"""
+    paths = sorted(glob.glob(os.path.join(PROJECT_ROOT, 'debug', '*.png')))
+    paths.append(os.path.join(PROJECT_ROOT, 'debug_screenshot.png'))
+    images = []
+    for path in paths:
+        if os.path.exists(path):
+            image = Frame.from_file(path).scaled
+            images.append(image)
+    return images
+
+
+def template_keys() -> list[str]:
+    """assets/下所有模板的键"""
+    keys = []
+    for path in sorted(ASSETS_PATH.rglob('*.png')):
+        keys.append(path.relative_to(ASSETS_PATH).with_suffix('').as_posix())
+    return keys
+
+
+def template_collage(keys: list[str]) -> np.ndarray:
+    """
+    把所有模板依次贴到一张设计分辨率的画面上，保证每个模板都至少有一个真正的匹配
+    """
+    width, height = DESIGN_RESOLUTION
+    canvas = np.full((height, width, 3), 96, np.uint8)
+    x = y = row_height = 0
+    for key in keys:
+        template = get_template(key)
+        if template is None:
+            continue
+        w, h = template.size
+        if x + w > width:
+            x, y, row_height = 0, y + row_height, 0
+        if y + h > height:
+            break
+        canvas[y:y + h, x:x + w] = template.bgr[:, :, :3]
+        x += w
+        row_height = max(row_height, h)
+    return canvas
+
+
+def bench(func, setup=None, min_time: float = 0.2, min_rounds: int = 5) -> list[float]:
+    """
+    反复执行func，直到总时长达到min_time且至少执行min_rounds轮
+    :param setup: 每轮执行前调用（不计时），返回值作为func的参数
+    :return: 每轮的耗时（秒）
+    """
+    samples = []
+    total = 0.0
+    while total < min_time or len(samples) < min_rounds:
+        arg = setup() if setup else None
+        start = time.perf_counter()
+        func(arg)
+        elapsed = time.perf_counter() - start
+        samples.append(elapsed)
+        total += elapsed
+    return samples
+
+
+def summarize(samples: list[float]) -> dict:
+    return {
+        'min': min(samples),
+        'max': max(samples),
+        'mean': statistics.mean(samples),
+        'stddev': statistics.stdev(samples) if len(samples) > 1 else 0.0,
+        'median': statistics.median(samples),
+        'rounds': len(samples),
+    }
+
+
+def build_cases(captures: list[np.ndarray], keys: list[str], config: dict):
+    """
+    生成所有基准测试项
+    :return: [(名称, 计时函数, 准备函数)]
+    """
+    sources = captures + [template_collage(keys)]
+    cases = []
+    for label, size in RESOLUTIONS.items():
+        images = [image if size == DESIGN_RESOLUTION else cv2.resize(image, size, interpolation=cv2.INTER_CUBIC)
+                  for image in sources]
+        encoded = [cv2.imencode('.png', image)[1] for image in images]
+        counter = iter(range(1 << 62))
+
+        def pick(items, _counter=counter):
+            return items[next(_counter) % len(items)]
+
+        # 不同画面的耗时差别较大，decode、resize和navigator每轮把所有画面各处理一次，结果才稳定
+        cases.append((f"decode[{label}]",
+                      lambda buffers: [cv2.imdecode(buffer, cv2.IMREAD_COLOR) for buffer in buffers],
+                      lambda _encoded=encoded: _encoded))
+        cases.append((f"resize[{label}]",
+                      lambda frames: [frame.gray for frame in frames],
+                      lambda _images=images: [Frame(image) for image in _images]))
+
+        # 匹配只计模板匹配本身：缩放、灰度图和金字塔在准备阶段算好
+        prepared = []
+        for image in images:
+            frame = Frame(image)
+            frame.pyramid(2)
+            prepared.append(frame)
+        for key in keys:
+            for strategy in MATCH_STRATEGIES:
+                cases.append((f"match[{label}-{key}-{strategy}]",
+                              lambda frame, _key=key, _strategy=strategy: match_template(
+                                  frame, _key, strategy=_strategy),
+                              lambda _prepared=prepared, _pick=pick: _pick(_prepared)))
+
+        # 探针的位置和颜色不重要，耗时只和探针数量有关；每轮都是新的Frame
+        probe_set = ProbeSet([ColorProbe(160 * i, 90 * i, (32, 32, 32)) for i in range(8)])
+        cases.append((f"probes[{label}]",
+                      lambda frames, _probe_set=probe_set: [_probe_set.check(frame) for frame in frames],
+                      lambda _images=images: [Frame(image) for image in _images]))
+
+        navigator = Navigator(device=_FrameDevice(images), config=config)
+
+        def navigate_all(nav, _count=len(images)):
+            for _ in range(_count):
+                # 不复用上一次的识别结果，每次都是一次完整的识别
+                nav.last_recognition = None
+                nav.last_frame = None
+                nav.get_current_page()
+
+        cases.append((f"navigator[{label}]", navigate_all, lambda _navigator=navigator: _navigator))
+    return cases
+
+
+def compare(results: dict, baseline: dict, max_regression: float) -> list[str]:
+    """
+    和基线比较中位数
+    :return: 变慢超过max_regression的测试项说明
+    """
+    regressions = []
+    for name, stats in results.items():
+        base = baseline.get(name)
+        if not base:
+            continue
+        change = stats['median'] / base['median'] - 1
+        stats['change'] = change
+        if change > max_regression:
+            regressions.append(f"{name}：中位数{base['median'] * 1000:.3f}ms -> {stats['median'] * 1000:.3f}ms "
+                               f"（慢了{change:.0%}）")
+    return regressions
+
+
+def print_table(results: dict):
+    name_width = max(len(name) for name in results)
+    print(f"{'Name':<{name_width}} {'Min(ms)':>9} {'Max(ms)':>9} {'Mean(ms)':>9} {'StdDev':>8} "
+          f"{'Median(ms)':>10} {'Rounds':>6} {'OPS':>9} {'vs基线':>7}")
+    for name, s in results.items():
+        change = f"{s['change']:+.0%}" if 'change' in s else '-'
+        print(f"{name:<{name_width}} {s['min'] * 1000:9.3f} {s['max'] * 1000:9.3f} {s['mean'] * 1000:9.3f} "
+              f"{s['stddev'] * 1000:8.3f} {s['median'] * 1000:10.3f} {s['rounds']:6d} "
+              f"{1 / s['mean']:9.1f} {change:>7}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="视觉链路微基准测试")
+    parser.add_argument('--filter', help="只运行名称中包含这个字符串的测试项")
+    parser.add_argument('--min-time', type=float, default=0.2, help="每个测试项至少运行多少秒")
+    parser.add_argument('--min-rounds', type=int, default=5, help="每个测试项至少运行多少轮")
+    parser.add_argument('--baseline', default=str(DEFAULT_BASELINE_FILE), help="基线文件路径")
+    parser.add_argument('--save-baseline', action='store_true', help="把这次的结果保存为基线")
+    parser.add_argument('--max-regression', type=float, default=DEFAULT_MAX_REGRESSION,
+                        help="中位数比基线慢超过这个比例即判为退化（0.25表示25%%）")
+    args = parser.parse_args()
+
+    captures = load_captures()
+    keys = template_keys()
+    if not captures or not keys:
+        print("Error: 没有找到可用的截图或模板。")
+        sys.exit(2)
+
+    # 基准测试测的是真正的计算，关掉匹配缓存；跳转图也不写盘
+    match_memo.enabled = False
+    # Navigator会记录识别过程，计时时只输出警告
+    config = {'vision': {'learn_transitions': False}, 'logging': {'level': 'WARNING'}}
+    configure_logging(config)
+    cases = build_cases(captures, keys, config)
+    if args.filter:
+        cases = [case for case in cases if args.filter in case[0]]
+
+    print(f"{platform.python_version()} / OpenCV {cv2.__version__} / {platform.machine()}，"
+          f"{len(captures)}张截图，{len(keys)}个模板，{len(cases)}个测试项")
+    results = {}
+    for name, func, setup in cases:
+        func(setup())  # 预热（加载模板等）
+        samples = bench(func, setup, args.min_time, args.min_rounds)
+        results[name] = summarize(samples)
+
+    regressions = []
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f).get('results', {})
+        regressions = compare(results, baseline, args.max_regression)
+    print_table(results)
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump({'python': platform.python_version(), 'opencv': cv2.__version__,
+                       'saved_at': time.strftime('%Y-%m-%d %H:%M:%S'), 'results': results}, f, indent=2)
+        print(f"基线已保存到{args.baseline}")
+    elif not os.path.exists(args.baseline):
+        print(f"没有找到基线文件{args.baseline}，可以用--save-baseline记录一份。")
+
+    if regressions:
+        print(f"\nError: {len(regressions)}项比基线慢了超过{args.max_regression:.0%}：")
+        for line in regressions:
+            print(f"  {line}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,146 @@
+"""
+多进程视觉工作池的吞吐测试（不需要模拟器）
+
+模拟多台设备同时识别页面：每台设备一个线程，各自用一个Navigator（共用一个识别引擎），
+不停地对debug/里的截图做完整的页面识别（每次都是新的Frame，不走匹配缓存），统计总的识别次数/秒。
+先在主进程里用线程匹配跑一遍，再分别用不同数量的工作进程（见src/zzz_assistant/core/vision_workers.py）跑，
+并检查工作进程里每次模板匹配的相似度和位置都和主进程里算的完全一致。
+
+用法（在项目根目录下）：
+    python dev_tools/bench_workers.py
+    python dev_tools/bench_workers.py --devices 8 --processes 2 4 7 --duration 10 --resolution 1920x1080
+"""
+import argparse
+import glob
+import os
+import sys
+import threading
+import time
+
+import cv2
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.zzz_assistant.core.frame import Frame
+from src.zzz_assistant.core.navigator import PAGE_CLASSES, Navigator
+from src.zzz_assistant.core.recognition import RecognitionEngine
+from src.zzz_assistant.core.vision import match_memo, match_template, set_worker_pool
+from src.zzz_assistant.core.vision_workers import VisionWorkerPool
+from src.zzz_assistant.utils.log import configure_logging
+from src.zzz_assistant.utils.paths import PROJECT_ROOT
+
+# 等工作进程加载模板的最长时间（秒）
+READY_TIMEOUT = 60
+
+
+class _FrameDevice:
+    """依次返回给定画面的假设备，每次都是新的Frame"""
+
+    def __init__(self, serial: str, images: list):
+        self.serial = serial
+        self.images = images
+        self.index = 0
+
+    def screenshot(self) -> Frame:
+        image = self.images[self.index % len(self.images)]
+        self.index += 1
+        return Frame(image.copy())
+
+
+def parse_resolution(text: str) -> tuple[int, int]:
+    width, height = (int(v) for v in text.lower().split('x'))
+    return width, height
+
+
+def load_images(size: tuple[int, int]) -> list:
+    paths = sorted(glob.glob(os.path.join(PROJECT_ROOT, 'debug', '*.png')))
+    paths.append(os.path.join(PROJECT_ROOT, 'debug_screenshot.png'))
+    return [cv2.resize(Frame.from_file(path).scaled, size, interpolation=cv2.INTER_LINEAR)
+            for path in paths if os.path.exists(path)]
+
+
+def match_all(images: list) -> list[tuple]:
+    """
+    每张画面上把所有页面的特征元素各匹配一次，用来比较两种方式的结果
+    （不比较识别出的页面：一张画面同时满足多个页面时，识别引擎取先确认的那个，和线程调度有关）
+    :return: 每次匹配的 (相似度, 左上角)
+    """
+    pages = [page_class(None) for page_class in PAGE_CLASSES]
+    results = []
+    for image in images:
+        frame = Frame(image.copy())
+        for page in pages:
+            for element in page.check_elements:
+                match = match_template(frame, element.key, element.roi, element.margin, page.strategy)
+                results.append((match.score, match.top_left))
+    return results
+
+
+def run_devices(images: list, engine: RecognitionEngine, config: dict, devices: int, duration: float) -> float:
+    """
+    :return: 所有设备加起来每秒完成的识别次数
+    """
+    counts = [0] * devices
+    deadline = time.perf_counter() + duration
+
+    def loop(index: int):
+        navigator = Navigator(_FrameDevice(f"bench-{index}", images[index:] + images[:index]), config, engine)
+        while time.perf_counter() < deadline:
+            navigator.last_recognition = None
+            navigator.recognize()
+            counts[index] += 1
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=loop, args=(i,)) for i in range(devices)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return sum(counts) / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="多进程视觉工作池的吞吐测试")
+    parser.add_argument('--devices', type=int, default=4, help="模拟多少台设备")
+    parser.add_argument('--processes', type=int, nargs='+', default=[2], help="要测试的工作进程数")
+    parser.add_argument('--duration', type=float, default=5.0, help="每种配置运行多少秒")
+    parser.add_argument('--resolution', type=parse_resolution, default=(1280, 720), help="画面分辨率，例如1920x1080")
+    args = parser.parse_args()
+
+    images = load_images(args.resolution)
+    if not images:
+        print("Error: 没有找到可用的截图。")
+        sys.exit(2)
+    # 测的是真正的计算，关掉匹配缓存；跳转图不写盘，也不校准
+    match_memo.enabled = False
+    config = {'vision': {'learn_transitions': False, 'calibration': False}, 'logging': {'level': 'WARNING'}}
+    configure_logging(config)
+    print(f"{os.cpu_count()}个CPU，{args.devices}台设备，{len(images)}张{args.resolution[0]}x{args.resolution[1]}的画面，"
+          f"每种配置{args.duration:.0f}秒")
+
+    engine = RecognitionEngine(max_workers=max(args.devices, max(args.processes)))
+    expected = match_all(images)
+    baseline = run_devices(images, engine, config, args.devices, args.duration)
+    print(f"  {'主进程线程':<12} {baseline:8.1f} 次识别/秒")
+
+    failed = False
+    for processes in args.processes:
+        pool = VisionWorkerPool(processes, slots=args.devices * 2, max_frame_size=args.resolution).start()
+        try:
+            if not pool.wait_ready(READY_TIMEOUT):
+                print(f"Error: {processes}个工作进程在{READY_TIMEOUT}秒内没有准备好")
+                sys.exit(1)
+            set_worker_pool(pool)
+            same = match_all(images) == expected
+            failed |= not same
+            throughput = run_devices(images, engine, config, args.devices, args.duration)
+        finally:
+            pool.close()
+        print(f"  {f'{processes}个工作进程':<12} {throughput:8.1f} 次识别/秒（{throughput / baseline:.2f}x），"
+              f"结果{'一致' if same else '不一致'}")
+    engine.shutdown()
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+"""
+用截图离线校准界面缩放比例（不需要模拟器）
+
+运行时Navigator会在第一次认出页面时自动校准，这个工具用来检查某张截图能校准出什么比例，
+或者提前把结果写进cache/calibration.json（指定--serial时）。
+
+用法（在项目根目录下）：
+    python dev_tools/calibrate_scale.py screenshot_2400x1080.png
+    python dev_tools/calibrate_scale.py screenshot.png --serial 127.0.0.1:16384     # 保存结果
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.zzz_assistant.core.calibration import CALIBRATION_SCALE_RANGE, calibrate, calibration_store
+from src.zzz_assistant.core.frame import Frame, ScreenTransform
+from src.zzz_assistant.core.navigator import PAGE_CLASSES
+
+
+def main():
+    parser = argparse.ArgumentParser(description="用截图校准界面缩放比例")
+    parser.add_argument('images', nargs='+', help="截图文件")
+    parser.add_argument('--serial', help="把校准结果保存为这台设备的结果")
+    parser.add_argument('--range', type=float, default=CALIBRATION_SCALE_RANGE,
+                        help="在默认比例上下搜索的范围（0.2表示±20%%）")
+    args = parser.parse_args()
+
+    pages = [page_class(None) for page_class in PAGE_CLASSES]
+    failed = 0
+    for path in args.images:
+        frame = Frame.from_file(path)
+        start = time.perf_counter()
+        result = calibrate(frame, pages, scale_range=args.range)
+        elapsed = time.perf_counter() - start
+        default = ScreenTransform.fit(frame.size)
+        if result is None:
+            failed += 1
+            print(f"{path}（{frame.width}x{frame.height}）：没有任何页面达到阈值，默认{default}（{elapsed * 1000:.0f}ms）")
+            continue
+        print(f"{path}（{frame.width}x{frame.height}）：{result.transform}，默认{default}，"
+              f"依据【{result.page}】，相似度{result.score:.3f}（{elapsed * 1000:.0f}ms）")
+        if args.serial:
+            calibration_store.put(args.serial, frame.size, result)
+            print(f"已保存到{calibration_store.path}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,171 @@
+"""
+从参考截图生成页面的颜色探针（见src/zzz_assistant/core/probes.py）
+
+给出同一个页面的几张截图（正例，最好是不同时间、不同设备上截的），以及其他页面的截图（反例），
+工具会在设计分辨率的画面上挑出这样的点：
+1. 在每张正例中都处在一片纯色区域的中间（界面缩放、轻微偏移都不会改变取到的颜色）
+2. 在所有正例中颜色都几乎一样（背景动画、人物、特效上的点会被排除）
+3. 尽量让每张反例都有足够多的探针不通过，剩下的名额按距离均匀地铺开
+
+最后用生成的探针重新检查所有截图，并输出可以直接粘贴到页面定义里的代码。
+正例只有一张时无法排除会变化的区域，尽量多给几张，或者用--region限制在固定的界面元素上。
+
+用法（在项目根目录下）：
+    python dev_tools/create_probes.py main1.png main2.png --negative login.png ad.png
+    python dev_tools/create_probes.py main*.png --negative other/*.png --region 640,0,640,360 --count 6
+"""
+import argparse
+import math
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.zzz_assistant.core.frame import DESIGN_RESOLUTION, Frame
+from src.zzz_assistant.core.probes import DEFAULT_PROBE_MIN_RATIO, DEFAULT_PROBE_TOLERANCE, ColorProbe, ProbeSet
+
+# 候选点的网格间距（设计分辨率下的像素）
+CANDIDATE_STEP = 4
+# 候选点周围这个半径内都必须是纯色
+FLAT_RADIUS = 4
+# 纯色区域内每个通道允许的最大起伏
+FLAT_MAX_RANGE = 16
+# 两个探针之间的最小距离
+MIN_PROBE_DISTANCE = 48
+
+
+def parse_region(text: str) -> tuple[int, int, int, int]:
+    x, y, w, h = (int(v) for v in text.split(','))
+    return x, y, w, h
+
+
+def load_design_images(paths: list[str]) -> list[np.ndarray]:
+    """读取截图并取出设计画面（任意分辨率的截图都按默认的居中放置换算）"""
+    return [Frame.from_file(path).scaled for path in paths]
+
+
+def flat_mask(image: np.ndarray) -> np.ndarray:
+    """每个像素周围FLAT_RADIUS内是否为纯色"""
+    kernel = np.ones((2 * FLAT_RADIUS + 1, 2 * FLAT_RADIUS + 1), np.uint8)
+    value_range = cv2.dilate(image, kernel) - cv2.erode(image, kernel)
+    return value_range.max(axis=2) <= FLAT_MAX_RANGE
+
+
+def find_candidates(positives: list[np.ndarray],
+                    regions: list[tuple[int, int, int, int]],
+                    tolerance: int) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    :return: (xs, ys, 期望颜色, 容差)，每个候选点一行
+    """
+    width, height = DESIGN_RESOLUTION
+    allowed = np.zeros((height, width), bool)
+    for x, y, w, h in regions or [(0, 0, width, height)]:
+        allowed[y:y + h, x:x + w] = True
+    grid = np.zeros((height, width), bool)
+    grid[FLAT_RADIUS:height - FLAT_RADIUS:CANDIDATE_STEP, FLAT_RADIUS:width - FLAT_RADIUS:CANDIDATE_STEP] = True
+    mask = allowed & grid
+    for image in positives:
+        mask &= flat_mask(image)
+    ys, xs = np.nonzero(mask)
+
+    samples = np.stack([image[ys, xs] for image in positives]).astype(np.int16)  # (正例数, 点数, 3)
+    low, high = samples.min(axis=0), samples.max(axis=0)
+    spread = (high - low).max(axis=1)
+    # 正例之间颜色差得太多的点不稳定
+    stable = spread <= tolerance // 2
+    colors = ((low + high) // 2)[stable]
+    tolerances = np.maximum(tolerance, (spread[stable] + 1) // 2 + tolerance // 2)
+    return xs[stable], ys[stable], colors, tolerances
+
+
+def select_probes(xs, ys, colors, tolerances, negatives: list[np.ndarray], count: int,
+                  min_ratio: float) -> list[int]:
+    """
+    贪心挑选探针
+    :return: 选中的候选点下标
+    """
+    # 每张反例上需要有几个探针不通过，整个页面才不通过
+    needed = math.floor(count * (1 - min_ratio)) + 1
+    if negatives:
+        rejects = np.stack([np.abs(image[ys, xs].astype(np.int16) - colors).max(axis=1) > tolerances
+                            for image in negatives])  # (反例数, 点数)
+    else:
+        rejects = np.zeros((0, len(xs)), bool)
+    remaining = np.full(len(negatives), needed)
+    chosen: list[int] = []
+    available = np.ones(len(xs), bool)
+    while len(chosen) < count and available.any():
+        # 先照顾还没被排除的反例，其余按和已选探针的距离挑，尽量铺开
+        coverage = (rejects[remaining > 0]).sum(axis=0) if (remaining > 0).any() else np.zeros(len(xs))
+        if chosen:
+            distance = np.min([np.hypot(xs - xs[i], ys - ys[i]) for i in chosen], axis=0)
+        else:
+            distance = np.hypot(xs - DESIGN_RESOLUTION[0] / 2, ys - DESIGN_RESOLUTION[1] / 2)
+        score = np.where(available, coverage * 10000 + distance, -1)
+        best = int(np.argmax(score))
+        if score[best] < 0:
+            break
+        chosen.append(best)
+        remaining -= rejects[:, best]
+        available &= np.hypot(xs - xs[best], ys - ys[best]) >= MIN_PROBE_DISTANCE
+    return chosen
+
+
+def main():
+    parser = argparse.ArgumentParser(description="从参考截图生成页面的颜色探针")
+    parser.add_argument('positives', nargs='+', help="这个页面的截图")
+    parser.add_argument('--negative', nargs='*', default=[], help="其他页面的截图")
+    parser.add_argument('--region', action='append', type=parse_region, default=[],
+                        help="只在这些区域（设计分辨率下的x,y,宽,高）里挑选探针，可以指定多次")
+    parser.add_argument('--count', type=int, default=8, help="探针数量")
+    parser.add_argument('--tolerance', type=int, default=DEFAULT_PROBE_TOLERANCE, help="每个通道的最小容差")
+    parser.add_argument('--min-ratio', type=float, default=DEFAULT_PROBE_MIN_RATIO,
+                        help="至少要有这个比例的探针通过")
+    args = parser.parse_args()
+
+    positives = load_design_images(args.positives)
+    negatives = load_design_images(args.negative)
+    if len(positives) < 2:
+        print("Warning: 只有一张正例，无法排除会变化的区域，生成的探针可能不稳定")
+
+    xs, ys, colors, tolerances = find_candidates(positives, args.region, args.tolerance)
+    if len(xs) == 0:
+        print("Error: 没有找到在所有正例中都稳定的纯色区域，试试放宽--tolerance或换一个--region")
+        sys.exit(1)
+    chosen = select_probes(xs, ys, colors, tolerances, negatives, args.count, args.min_ratio)
+    probes = [ColorProbe(int(xs[i]), int(ys[i]), tuple(int(c) for c in colors[i]), int(tolerances[i]))
+              for i in chosen]
+    probe_set = ProbeSet(probes, args.min_ratio)
+    print(f"从{len(xs)}个稳定的候选点中选出了{len(probes)}个探针")
+
+    # 用原始截图（不是设计画面）重新检查一遍，和运行时的用法完全一致
+    failed = False
+    for label, paths, expected in (("正例", args.positives, True), ("反例", args.negative, False)):
+        for path in paths:
+            frame = Frame.from_file(path)
+            ratio = probe_set.match_ratio(frame)
+            start = time.perf_counter()
+            for _ in range(1000):
+                probe_set.check(frame)
+            elapsed = (time.perf_counter() - start) / 1000
+            ok = (ratio >= probe_set.min_ratio) == expected
+            failed |= not ok
+            print(f"  {'OK ' if ok else 'BAD'} {label} {path}：{ratio:.0%}的探针通过（{elapsed * 1e6:.1f}µs）")
+    if failed:
+        print("Warning: 有截图没有按预期通过或排除，请增加正例/反例、调整--region或--count后重试")
+
+    print("\n# 粘贴到页面定义中，作为BasePage的probes参数：")
+    custom_ratio = args.min_ratio != DEFAULT_PROBE_MIN_RATIO
+    print("probes = ProbeSet([" if custom_ratio else "probes = [")
+    for probe in probes:
+        print(f"    {probe!r},")
+    print(f"], min_ratio={args.min_ratio})" if custom_ratio else "]")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
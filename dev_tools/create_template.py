@@ -0,0 +1,81 @@
+"""
+把assets/下的所有模板编译成一个模板包（见src/zzz_assistant/core/asset_pack.py）
+
+模板包里保存每个模板解码后的BGR图、灰度图、掩码和金字塔各层；页面的特征元素（搜索区域、阈值等）
+仍然定义在pages/下的代码里，不打进包里。运行时TemplateRegistry会自动使用它，
+没有改动过的模板直接从包里内存映射，不再解码PNG；改过的模板会自动退回到读取PNG，
+所以忘了重新生成也不会出错，只是慢一点（`python main.py --check` 会提示模板包已过期）。
+
+用法（在项目根目录下）：
+    python dev_tools/create_template.py                   # 生成cache/templates.pack
+    python dev_tools/create_template.py --output dist/templates.pack --levels 3
+"""
+import argparse
+import os
+import sys
+import time
+
+import cv2
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.zzz_assistant.core.asset_pack import DEFAULT_PACK_PATH, AssetPack, write_pack
+from src.zzz_assistant.core.template_registry import TemplateRegistry
+from src.zzz_assistant.core.vision import PYRAMID_LEVEL
+
+
+def collect_templates(registry: TemplateRegistry, levels: int) -> list[dict]:
+    """
+    从PNG解码所有模板
+    :param levels: 预先计算的金字塔层数
+    """
+    templates = []
+    for key in registry.keys():
+        path = registry.resolve_path(key)
+        stat = os.stat(path)
+        template = registry._load(key, path, stat.st_mtime)
+        if template is None:
+            continue
+        arrays = {'bgr': template.bgr, 'gray': template.gray, 'mask': template.mask}
+        for level in range(1, levels + 1):
+            arrays[f"pyramid{level}"] = template.pyramid(level)
+        templates.append({'key': key, 'mtime': stat.st_mtime, 'file_size': stat.st_size, 'arrays': arrays})
+    return templates
+
+
+def main():
+    parser = argparse.ArgumentParser(description="生成模板包")
+    parser.add_argument('--output', default=str(DEFAULT_PACK_PATH), help="模板包输出路径")
+    parser.add_argument('--levels', type=int, default=PYRAMID_LEVEL, help="预先计算的金字塔层数")
+    args = parser.parse_args()
+
+    # 从PNG读取，不能用已有的模板包
+    registry = TemplateRegistry(pack_path=None)
+    start = time.perf_counter()
+    templates = collect_templates(registry, args.levels)
+    decode_time = time.perf_counter() - start
+    size = write_pack(args.output, templates)
+    print(f"已生成模板包{args.output}：{len(templates)}个模板，{size / 1024:.1f}KB")
+
+    # 验证：从包里读出的每个数组都和PNG解码的结果一致，顺便比较加载耗时
+    start = time.perf_counter()
+    pack_registry = TemplateRegistry(pack_path=args.output)
+    loaded = [pack_registry.get(template['key']) for template in templates]
+    load_time = time.perf_counter() - start
+    pack = AssetPack(args.output)
+    for template, packed in zip(templates, loaded):
+        for name, array in template['arrays'].items():
+            if array is None:
+                continue
+            if not (pack.array(pack.get(template['key']), name) == array).all():
+                print(f"Error: 模板包中{template['key']}的{name}和PNG不一致")
+                sys.exit(1)
+        if packed is None:
+            print(f"Error: 无法从模板包加载{template['key']}")
+            sys.exit(1)
+    print(f"解码PNG {decode_time * 1000:.1f}ms，从模板包加载 {load_time * 1000:.1f}ms"
+          f"（OpenCV {cv2.__version__}）")
+
+
+if __name__ == '__main__':
+    main()
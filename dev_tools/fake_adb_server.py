@@ -0,0 +1,385 @@
+"""
+假的adb server，用来离线检查adb连接管理（src/zzz_assistant/core/connection.py）的断线重连（不需要模拟器）
+
+在本机的一个端口上实现adb server的smart socket协议中程序用到的部分：
+host:version、host:connect、host:tport / host:transport、get-state，以及设备上的
+echo、getprop、screencap（原始格式，画面来自debug/里的截图）、流式screencap、常驻sh、input、
+wm size、dumpsys display / window、monkey。
+可以注入故障：让设备离线一段时间（离线时断开所有到设备的连接）、断开所有常驻连接、给每条命令加延迟。
+
+默认依次运行几个场景，用真正的Device连接它并检查：
+1. 连接、截图、点击都正常，记住adb server版本后每条命令少一次TCP连接
+2. 设备离线几秒：期间的截图和点击排队等重连，一个都不失败
+3. 设备空闲时离线：健康检查发现断线并在后台重连
+4. 常驻的输入shell被断开：立即重开并重试，不算断线
+5. 离线时间超过reconnect_timeout：操作在限定时间内失败（截图返回None），设备恢复后自动重连
+6. 流式截图在断线恢复后继续出帧
+最后输出连接的延迟统计。任何一项不符合预期时以退出码1结束。
+
+用法（在项目根目录下）：
+    python dev_tools/fake_adb_server.py
+    python dev_tools/fake_adb_server.py --serve --port 5038      # 只启动假的adb server，配置里的adb.port指向它
+"""
+import argparse
+import glob
+import os
+import socketserver
+import struct
+import sys
+import threading
+import time
+
+import adbutils
+import cv2
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.zzz_assistant.core.connection import STATE_RECONNECTING
+from src.zzz_assistant.core.device import Device
+from src.zzz_assistant.core.frame import Frame
+from src.zzz_assistant.utils.log import configure_logging
+from src.zzz_assistant.utils.paths import PROJECT_ROOT
+
+SERIAL = "127.0.0.1:16384"
+# 假装的adb server版本（1.0.41，adbutils会用host:tport）
+SERVER_VERSION = 41
+MODEL = "FakeDevice"
+
+
+class FakeAdbServer(socketserver.ThreadingTCPServer):
+    """
+    connections(int): 收到的TCP连接数
+    taps(list[tuple[int, int]]): 收到的input tap坐标
+    latency(float): 每条命令额外的延迟（秒）
+    """
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, images: list, port: int = 0, serial: str = SERIAL):
+        """
+        :param images: BGR画面，screencap依次返回
+        :param port: 监听的端口，0表示随便找一个空闲端口
+        """
+        super().__init__(('127.0.0.1', port), _AdbHandler)
+        self.serial = serial
+        self.raw_frames = []
+        for image in images:
+            height, width = image.shape[:2]
+            header = struct.pack('<IIII', width, height, 1, 0)
+            self.raw_frames.append(header + cv2.cvtColor(image, cv2.COLOR_BGR2RGBA).tobytes())
+        self.screen_size = images[0].shape[1], images[0].shape[0]
+        self.connections = 0
+        self.taps: list[tuple[int, int]] = []
+        self.latency = 0.0
+        self.foreground = "com.android.launcher"
+        self._frame_index = 0
+        self._offline_until = 0.0
+        self._device_sockets = set()
+        self._lock = threading.Lock()
+
+    @property
+    def port(self) -> int:
+        return self.server_address[1]
+
+    @property
+    def offline(self) -> bool:
+        return time.monotonic() < self._offline_until
+
+    def start(self) -> "FakeAdbServer":
+        threading.Thread(target=self.serve_forever, name="fake-adb", daemon=True).start()
+        return self
+
+    def close(self):
+        self.shutdown()
+        self.server_close()
+        self.drop_connections()
+
+    def go_offline(self, seconds: float):
+        """让设备离线seconds秒，并断开现有的所有到设备的连接"""
+        self._offline_until = time.monotonic() + seconds
+        self.drop_connections()
+
+    def drop_connections(self) -> int:
+        """断开所有还开着的到设备的连接（常驻shell、流式截图），返回断开的个数"""
+        with self._lock:
+            sockets, self._device_sockets = self._device_sockets, set()
+        for sock in sockets:
+            try:
+                sock.shutdown(2)
+            except OSError:
+                pass
+        return len(sockets)
+
+    def next_frame(self) -> bytes:
+        with self._lock:
+            frame = self.raw_frames[self._frame_index % len(self.raw_frames)]
+            self._frame_index += 1
+        return frame
+
+    def track(self, sock, tracked: bool):
+        with self._lock:
+            if tracked:
+                self._device_sockets.add(sock)
+            else:
+                self._device_sockets.discard(sock)
+
+
+class _AdbHandler(socketserver.BaseRequestHandler):
+    server: FakeAdbServer
+
+    def handle(self):
+        self.server.connections += 1
+        try:
+            command = self._read_command()
+            if command == 'host:version':
+                self._okay(self._block(f"{SERVER_VERSION:04x}"))
+            elif command.startswith('host:connect:'):
+                address = command[len('host:connect:'):]
+                result = f"failed to connect to '{address}'" if self.server.offline else f"already connected to {address}"
+                self._okay(self._block(result))
+            elif command == f"host-serial:{self.server.serial}:get-state":
+                self._okay(self._block('offline' if self.server.offline else 'device'))
+            elif command.startswith(('host:tport:serial:', 'host:transport:')):
+                serial = command.rsplit(':', 1)[1] if command.startswith('host:transport:') \
+                    else command[len('host:tport:serial:'):]
+                if serial != self.server.serial:
+                    self._fail(f"device '{serial}' not found")
+                elif self.server.offline:
+                    self._fail("device offline")
+                else:
+                    self._okay(struct.pack('<Q', 1) if command.startswith('host:tport:') else b'')
+                    self._device_command(self._read_command())
+            else:
+                self._fail(f"unknown host service: {command}")
+        except OSError:
+            pass
+
+    def _device_command(self, command: str):
+        if not command.startswith('shell:'):
+            self._fail(f"unsupported: {command}")
+            return
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        self.request.sendall(b'OKAY')
+        cmd = command[len('shell:'):]
+        self.server.track(self.request, True)
+        try:
+            if cmd == 'sh':
+                self._interactive_shell()
+            elif cmd == 'while true; do screencap; done':
+                while True:
+                    self.request.sendall(self.server.next_frame())
+            else:
+                self.request.sendall(self._run(cmd))
+        finally:
+            self.server.track(self.request, False)
+
+    def _interactive_shell(self):
+        """常驻的sh：一行一行执行，和真正的shell一样回显echo"""
+        reader = self.request.makefile('rb')
+        for line in reader:
+            self.request.sendall(self._run(line.decode().strip()))
+
+    def _run(self, cmd: str) -> bytes:
+        """执行一行命令（可以用分号连接），返回输出"""
+        output = b''
+        for part in (p.strip() for p in cmd.split(';')):
+            args = part.split()
+            if not args:
+                continue
+            if args[0] == 'echo':
+                output += (' '.join(args[1:]) + '\n').encode()
+            elif args[:2] == ['getprop', 'ro.product.model']:
+                output += f"{MODEL}\n".encode()
+            elif args == ['screencap']:
+                output += self.server.next_frame()
+            elif args[:2] == ['input', 'tap']:
+                self.server.taps.append((int(args[2]), int(args[3])))
+            elif args[:2] in (['input', 'swipe'], ['sleep']):
+                pass
+            elif args[:2] == ['wm', 'size']:
+                # 横屏模拟器：物理尺寸按竖屏报告，再由orientation换算
+                width, height = self.server.screen_size
+                output += f"Physical size: {height}x{width}\n".encode()
+            elif args[:2] == ['dumpsys', 'display']:
+                output += b"mOverrideDisplayInfo=DisplayInfo{orientation=1}\n"
+            elif args[:3] == ['dumpsys', 'window', 'windows']:
+                output += f"mCurrentFocus=Window{{1 u0 {self.server.foreground}/.MainActivity}}\n".encode()
+            elif args[0] == 'monkey':
+                self.server.foreground = args[args.index('-p') + 1]
+            else:
+                output += f"/system/bin/sh: {args[0]}: not found\n".encode()
+        return output
+
+    def _read_command(self) -> str:
+        length = int(self._read_exactly(4), 16)
+        return self._read_exactly(length).decode()
+
+    def _read_exactly(self, n: int) -> bytes:
+        data = b''
+        while len(data) < n:
+            chunk = self.request.recv(n - len(data))
+            if not chunk:
+                raise EOFError("客户端断开了连接")
+            data += chunk
+        return data
+
+    @staticmethod
+    def _block(text: str) -> bytes:
+        return f"{len(text):04x}{text}".encode()
+
+    def _okay(self, payload: bytes = b''):
+        self.request.sendall(b'OKAY' + payload)
+
+    def _fail(self, message: str):
+        self.request.sendall(b'FAIL' + self._block(message))
+
+
+def load_images() -> list:
+    paths = sorted(glob.glob(os.path.join(PROJECT_ROOT, 'debug', '*.png')))[:3]
+    paths.append(os.path.join(PROJECT_ROOT, 'debug_screenshot.png'))
+    images = [Frame.from_file(path).image for path in paths if os.path.exists(path)]
+    # 统一成一种分辨率，和真正的设备一样
+    return [cv2.resize(image, (1280, 720)) for image in images]
+
+
+class _Checks:
+    def __init__(self):
+        self.failed = 0
+
+    def expect(self, condition: bool, message: str):
+        print(f"  {'✓' if condition else '✗'} {message}")
+        self.failed += not condition
+
+
+def _screenshots_during(device: Device, seconds: float) -> tuple[int, int]:
+    """在seconds秒内不停截图，返回(成功次数, 失败次数)"""
+    ok = failed = 0
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        if device.screenshot() is not None:
+            ok += 1
+        else:
+            failed += 1
+    return ok, failed
+
+
+def run_scenarios(server: FakeAdbServer) -> int:
+    """
+    :return: 不符合预期的项数
+    """
+    checks = _Checks()
+    adb_config = {'host': '127.0.0.1', 'port': server.port, 'health_check_interval': 0.5, 'reconnect_timeout': 5}
+
+    print("1. 连接、截图、点击")
+    device = Device(SERIAL, adb_config=adb_config)
+    checks.expect(device.connect(), "连接成功")
+    frame = device.screenshot()
+    checks.expect(frame is not None and frame.size == server.screen_size, "截图的尺寸正确")
+    device.click(640, 360)
+    checks.expect(server.taps[-1:] == [(640, 360)], "点击送到了设备上")
+    start = server.connections
+    for _ in range(10):
+        device.screenshot()
+    cached = (server.connections - start) / 10
+    # 不经过连接管理，直接用adbutils
+    plain = adbutils.AdbClient(port=server.port).device(serial=SERIAL)
+    start = server.connections
+    for _ in range(10):
+        plain.shell(['screencap'], encoding=None)
+    uncached = (server.connections - start) / 10
+    checks.expect(cached < uncached, f"每次截图的TCP连接数：{uncached:g} -> {cached:g}")
+
+    print("2. 设备离线2秒，期间的操作等待重连")
+    reconnects = device.connection.stats.reconnects
+    server.go_offline(2)
+    clicker = threading.Thread(target=lambda: [device.click(100, 100 + i) for i in range(5)])
+    taps_before = len(server.taps)
+    clicker.start()
+    ok, failed = _screenshots_during(device, 3)
+    clicker.join()
+    stats = device.connection.stats
+    checks.expect(failed == 0 and ok > 0, f"截图成功{ok}次，失败{failed}次")
+    checks.expect(len(server.taps) - taps_before == 5, f"5次点击全部送达（{len(server.taps) - taps_before}次）")
+    checks.expect(stats.reconnects == reconnects + 1, f"重连了{stats.reconnects - reconnects}次")
+    checks.expect(stats.deferred > 0, f"{stats.deferred}次操作排队等待了重连")
+    checks.expect(1.5 < stats.downtime < 4, f"断线时长{stats.downtime:.2f}秒")
+
+    print("3. 设备空闲时离线，健康检查发现断线")
+    reconnects = stats.reconnects
+    server.go_offline(1.5)
+    time.sleep(1.2)
+    checks.expect(device.connection.state == STATE_RECONNECTING, "没有任何操作时也发现了断线")
+    time.sleep(3)
+    checks.expect(device.connection.connected and stats.reconnects == reconnects + 1, "设备恢复后自动重连")
+
+    print("4. 常驻的输入shell被断开")
+    disconnects = stats.disconnects
+    # 先点一次，让输入shell重新打开（上一个场景离线时它已经被断开了）
+    device.click(200, 100)
+    dropped = server.drop_connections()
+    taps_before = len(server.taps)
+    device.click(200, 200)
+    checks.expect(dropped == 1 and len(server.taps) == taps_before + 1, "点击立即重开shell并送达")
+    checks.expect(stats.disconnects == disconnects, "不算断线")
+
+    print("5. 离线时间超过reconnect_timeout")
+    server.go_offline(8)
+    start = time.monotonic()
+    frame = device.screenshot()
+    waited = time.monotonic() - start
+    checks.expect(frame is None and 4 < waited < 7, f"截图在{waited:.1f}秒后失败")
+    deadline = time.monotonic() + 15
+    while not device.connection.connected and time.monotonic() < deadline:
+        time.sleep(0.2)
+    checks.expect(device.screenshot() is not None, "设备恢复后自动重连，截图正常")
+    print(f"连接统计：{device.connection.to_dict()}")
+    device.close()
+
+    print("6. 流式截图断线恢复")
+    device = Device(SERIAL, capture_method='stream', adb_config=adb_config)
+    checks.expect(device.connect() and device.screenshot() is not None, "流式截图开始出帧")
+    server.go_offline(2)
+    time.sleep(2.5)
+    produced = device.capture.frames_produced
+    time.sleep(1)
+    checks.expect(device.capture.frames_produced > produced, "恢复后继续出帧")
+    checks.expect(device.screenshot() is not None, "截图正常")
+    device.close()
+    return checks.failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="假的adb server，检查断线重连")
+    parser.add_argument('--serve', action='store_true', help="只启动假的adb server，不运行检查")
+    parser.add_argument('--port', type=int, default=0, help="监听的端口，默认随便找一个空闲端口")
+    parser.add_argument('--latency', type=float, default=0.0, help="每条命令额外的延迟（秒）")
+    args = parser.parse_args()
+
+    images = load_images()
+    if not images:
+        print("Error: 没有找到可用的截图。")
+        sys.exit(2)
+    server = FakeAdbServer(images, port=args.port).start()
+    server.latency = args.latency
+    if args.serve:
+        print(f"假的adb server在127.0.0.1:{server.port}上运行，设备序列号{SERIAL}，Ctrl+C退出")
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            pass
+        server.close()
+        return
+
+    # 断线时的警告也输出出来，方便对照
+    configure_logging({'logging': {'level': 'WARNING'}})
+    try:
+        failed = run_scenarios(server)
+    finally:
+        server.close()
+    print("全部符合预期" if not failed else f"{failed}项不符合预期")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
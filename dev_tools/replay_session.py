@@ -0,0 +1,134 @@
+"""
+离线回放会话，对任务做可重复的延迟/吞吐基准测试（不需要模拟器）
+
+会话文件由 `python main.py --record xxx.session.zip` 录制；
+没有录制好的会话时，可以用 --from-images 把几张截图拼成一个会话（每张图重复若干帧）。
+
+用法（在项目根目录下）：
+    python dev_tools/replay_session.py my.session.zip --repeat 5
+    python dev_tools/replay_session.py my.session.zip --task navigator
+    python dev_tools/replay_session.py --from-images debug/*.png debug_screenshot.png --save demo.session.zip
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.zzz_assistant.core.capture import FileReplayBackend
+from src.zzz_assistant.core.navigator import Navigator
+from src.zzz_assistant.core.session import ReplayDevice, SessionRecorder
+from src.zzz_assistant.core.vision import match_memo
+from src.zzz_assistant.tasks.login import LoginTask
+from src.zzz_assistant.utils.config_loader import load_config
+from src.zzz_assistant.utils.log import configure_logging
+
+
+class _ImageDevice:
+    """把一组图片当作设备画面，用来生成演示会话"""
+
+    def __init__(self, paths: list[str], repeat: int):
+        ordered = [path for path in paths for _ in range(repeat)]
+        self.serial = 'images'
+        self.frame_count = len(ordered)
+        self.capture = FileReplayBackend(ordered, loop=False)
+
+    def connect(self):
+        return True
+
+    def screenshot(self):
+        return self.capture.grab()
+
+    def click(self, x, y):
+        pass
+
+    def is_game_running(self, package_name):
+        return True
+
+    def start_game(self, package_name):
+        return True
+
+    def close(self):
+        pass
+
+
+def record_from_images(paths: list[str], out_path: str, repeat: int):
+    recorder = SessionRecorder(_ImageDevice(paths, repeat), out_path)
+    recorder.connect()
+    recorder.is_game_running('')
+    # 只录制真正的画面，不录制图片用完后的那次失败截图，回放到最后会一直停在最后一张图上
+    for _ in range(recorder.frame_count):
+        recorder.screenshot()
+    recorder.close()
+
+
+def run_navigator(device: ReplayDevice, config: dict) -> bool:
+    """把会话里的每一帧都识别一遍"""
+    navigator = Navigator(device=device, config=config)
+    while not device.finished:
+        navigator.recognize()
+    return True
+
+
+def run_once(session_path: str, config: dict, speed: float | None, task: str) -> dict:
+    device = ReplayDevice(session_path, speed=speed)
+    device.connect()
+    # 每次运行都从冷的匹配缓存开始，保证各次结果可比
+    match_memo.clear()
+    start = time.perf_counter()
+    if task == 'navigator':
+        success = run_navigator(device, config)
+    else:
+        success = LoginTask(device=device, config=config).execute()
+    elapsed = time.perf_counter() - start
+    return {
+        'success': success,
+        'elapsed': elapsed,
+        'frames': device.frames_captured,
+        'clicks': device.clicks,
+        'divergences': device.divergences,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="离线回放会话，对登录任务或页面识别做基准测试")
+    parser.add_argument('session', nargs='?', help="会话文件路径")
+    parser.add_argument('--from-images', nargs='+', help="用这些截图生成一个会话")
+    parser.add_argument('--frames-per-image', type=int, default=3, help="生成会话时每张截图重复几帧")
+    parser.add_argument('--save', help="生成的会话保存到哪里（默认临时文件）")
+    parser.add_argument('--task', choices=['login', 'navigator'], default='login',
+                        help="login：完整跑一遍登录任务；navigator：只对每一帧做页面识别")
+    parser.add_argument('--repeat', type=int, default=3, help="回放几次")
+    parser.add_argument('--speed', type=float, default=None, help="按时间轴回放的倍速，不填则按顺序尽快回放")
+    args = parser.parse_args()
+
+    session_path = args.session
+    if args.from_images:
+        session_path = args.save or os.path.join(tempfile.mkdtemp(), 'images.session.zip')
+        record_from_images(args.from_images, session_path, args.frames_per_image)
+    if not session_path:
+        parser.error("需要指定会话文件或--from-images")
+
+    config = load_config()
+    # 回放时不要把跳转统计写进真实的缓存文件
+    config.setdefault('vision', {})['learn_transitions'] = False
+    # 识别过程的日志不输出，只保留警告
+    config['logging'] = {**(config.get('logging') or {}), 'level': 'WARNING'}
+    configure_logging(config)
+
+    results = [run_once(session_path, config, args.speed, args.task) for _ in range(args.repeat)]
+    times = [r['elapsed'] for r in results]
+    frames = results[-1]['frames']
+    print(f"会话：{session_path}")
+    print(f"回放{args.repeat}次，结果：{['成功' if r['success'] else '失败' for r in results]}")
+    print(f"耗时 最小{min(times):.3f}秒 中位数{statistics.median(times):.3f}秒 最大{max(times):.3f}秒")
+    print(f"每次回放截图{frames}次，吞吐{frames / statistics.median(times):.1f}帧/秒，点击{results[-1]['clicks']}次")
+    for divergence in results[-1]['divergences']:
+        print(f"  与录制不一致：{divergence}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,58 +1,179 @@
-import yaml
-import os
+import argparse
+import sys
+import threading
 
 from src.zzz_assistant.core.device import Device
+from src.zzz_assistant.core.flight_recorder import configure_flight_recorder, flight_recorder
+from src.zzz_assistant.core.metrics import configure_metrics, metrics
+from src.zzz_assistant.core.session import SessionRecorder
+from src.zzz_assistant.core.template_registry import template_registry
 from src.zzz_assistant.tasks.login import LoginTask
 from src.zzz_assistant.utils.config_loader import load_config
-from src.zzz_assistant.utils.paths import CONFIG_PATH
+from src.zzz_assistant.utils.lazy_import import is_imported
+from src.zzz_assistant.utils.log import configure_logging, get_logger
 
+logger = get_logger(__name__)
 
-def main():
+
+def main(record_path: str | None = None, daemon: bool = False):
     """
     程序主函数
+    :param record_path: 不为None时，把这次运行的画面和操作录制成会话文件，供离线回放
+    :param daemon: 是否以常驻模式运行（见src/zzz_assistant/core/daemon.py）
     """
-    print("ZZZ Assistant 正在启动...")
+    logger.info("ZZZ Assistant 正在启动...")
 
     # --- 1. 加载配置 ---
     config = load_config()
+    configure_logging(config)
     try:
         # 打印一下我们从配置文件里读到的模拟器地址和名字
         emulator_serial = config['emulator']['device_serial']
-        print(f"Target emulator address: {emulator_serial}")
-        print(f"Emulator name: {config['emulator']['name']}")
+        logger.info("Target emulator address: %s", emulator_serial)
+        logger.info("Emulator name: %s", config['emulator']['name'])
 
     except KeyError:
-        print("Error: 配置文件缺少emulator.device_serial 项。")
+        logger.error("配置文件缺少emulator.device_serial 项。")
         return
     except Exception as e:
-        print(f"An error occurred while loading config: {e}")
+        logger.error("An error occurred while loading config: %s", e)
         return  # 退出程序
 
-    print("已成功加载配置！")
+    logger.info("已成功加载配置！")
+    metrics_path = configure_metrics(config)
+    configure_flight_recorder(config)
+    # 配置了视觉工作进程时，模板匹配交给多个进程做（多开时才有明显收益），只有这时才导入multiprocessing
+    worker_pool = None
+    if (config.get('vision') or {}).get('worker_processes'):
+        from src.zzz_assistant.core.vision_workers import start_worker_pool
+        worker_pool = start_worker_pool(config)
+
+    try:
+        if daemon:
+            # 常驻模式依赖http.server，只有这时才导入
+            from src.zzz_assistant.core.daemon import run_daemon
+            run_daemon(config)
+        else:
+            _run(config, emulator_serial, record_path)
+    finally:
+        if worker_pool is not None:
+            worker_pool.close()
+        # 等黑匣子把出错时的画面写完
+        flight_recorder.flush()
+        # 运行结束时再导出一次，保证最后一段时间的指标也被记录下来
+        metrics.stop_exporter()
+        if metrics_path:
+            metrics.export(metrics_path)
+            logger.info("性能指标已导出到：%s", metrics_path)
+
+
+def _run(config: dict, emulator_serial: str, record_path: str | None):
+    """连接设备并执行任务"""
+    # 配置了多台模拟器时，交给多设备调度器并发执行
+    if config.get('devices'):
+        # 调度器依赖asyncio，只有多开时才导入
+        from src.zzz_assistant.core.orchestrator import run_on_all_devices
+        run_on_all_devices(config, [LoginTask])
+        logger.info("PJSK Assistant has finished its run. (for now)")
+        return
 
 
     # --- 2. 初始化核心模块 (我们后面再写) ---
-    print("Initializing core modules...")
-    device = Device(device_serial=emulator_serial)
+    logger.debug("Initializing core modules...")
+    capture_method = config['emulator'].get('capture', 'screencap')
+    device = Device(device_serial=emulator_serial,
+                    capture_method=capture_method,
+                    input_method=config['emulator'].get('input', 'shell'),
+                    maatouch_path=config['emulator'].get('maatouch_path'),
+                    adb_config=config.get('adb'))
+    if record_path:
+        logger.info("将录制本次运行的会话到：%s", record_path)
+        device = SessionRecorder(device, record_path)
+    # 预热：连接设备的同时在后台导入OpenCV、解码所有模板，第一次识别页面时就不用再等了
+    threading.Thread(target=template_registry.preload, name="warm-start", daemon=True).start()
     if not device.connect():
-        print("Error: 无法连接到模拟器，程序退出。")
+        logger.error("无法连接到模拟器，程序退出。")
         return
 
-    print("设备连接成功！")
+    logger.info("设备连接成功！")
     # cv_handler = ...
 
 
     # --- 3. 执行测试任务 (我们后面再写主任务) ---
     # print("Starting main task loop...")
     # run_daily_tasks(...)
-    print("执行测试任务：识别主界面")
+    logger.info("执行测试任务：识别主界面")
     login_task = LoginTask(device=device, config=config)
-    success = login_task.run()
+    success = login_task.execute()
+    device.close()
+
+
+    logger.info("PJSK Assistant has finished its run. (for now)")
 
 
+def check() -> bool:
+    """
+    只检查配置和模板，不连接设备，也不导入OpenCV，适合在定时任务启动前快速自检
+    :return: 没有发现问题时返回True
+    """
+    from src.zzz_assistant.utils.check import check_assets, check_config
+
+    config = load_config()
+    configure_logging(config)
+    problems = check_config(config) + check_assets()
+    for problem in problems:
+        logger.error(problem)
+    logger.info("检查了%d个模板，发现%d个问题。（OpenCV%s导入）",
+                len(template_registry.keys()), len(problems), '已' if is_imported('cv2') else '未')
+    return not problems
+
+
+def client(args: argparse.Namespace) -> bool:
+    """
+    作为客户端和常驻的守护进程通信：提交任务、查看状态或让它退出，发完请求立刻返回
+    :return: 请求是否成功
+    """
+    from src.zzz_assistant.core.daemon import DaemonClient
+
+    config = load_config()
+    configure_logging(config)
+    daemon = DaemonClient(config)
+    try:
+        if args.submit:
+            for task in args.submit:
+                for job in daemon.submit(task, args.device):
+                    logger.info("已提交任务#%d：%s -> 【%s】（%s）", job['id'], job['task'], job['device'], job['status'])
+        elif args.stop:
+            daemon.shutdown()
+            logger.info("已通知守护进程在当前任务结束后退出")
+        else:
+            status = daemon.status()
+            logger.info("守护进程已运行%.0f秒，可提交的任务：%s", status['uptime'], ", ".join(status['tasks']))
+            for device in status['devices']:
+                current = device['current']
+                logger.info("【%s】%s，当前任务：%s，排队：%s", device['name'], '已连接' if device['connected'] else '未连接',
+                            f"#{current['id']} {current['task']}" if current else '无', device['queued'] or '无')
+    except (ConnectionError, ValueError) as e:
+        logger.error("%s", e)
+        return False
+    return True
 
-    print("PJSK Assistant has finished its run. (for now)")
 
 if __name__ == '__main__':
-    print("__main__主程序运行.")
-    main()
\ No newline at end of file
+    # 先用默认设置启用日志，加载配置文件后再按配置调整
+    configure_logging()
+    logger.debug("__main__主程序运行.")
+    parser = argparse.ArgumentParser(description="ZZZ Assistant")
+    parser.add_argument('--record', metavar='PATH', help="把本次运行录制成会话文件（见dev_tools/replay_session.py）")
+    parser.add_argument('--check', action='store_true', help="只检查配置和模板是否有效，不连接设备")
+    parser.add_argument('--daemon', action='store_true', help="常驻运行，保持设备连接，通过本机HTTP接口接收任务")
+    parser.add_argument('--submit', metavar='TASK', nargs='+', help="把任务提交给常驻的守护进程后立刻返回，例如LoginTask")
+    parser.add_argument('--device', help="和--submit一起使用，只提交到这台设备（名称或序列号），默认提交到所有设备")
+    parser.add_argument('--status', action='store_true', help="查看守护进程和各设备的状态")
+    parser.add_argument('--stop', action='store_true', help="让守护进程执行完当前任务后退出")
+    args = parser.parse_args()
+    if args.check:
+        sys.exit(0 if check() else 1)
+    if args.submit or args.status or args.stop:
+        sys.exit(0 if client(args) else 1)
+    main(record_path=args.record, daemon=args.daemon)
\ No newline at end of file
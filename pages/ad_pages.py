@@ -1,12 +1,11 @@
-import os
-
-from pages.base_page import BasePage
-from src.zzz_assistant.utils.paths import ASSETS_PATH
+from pages.base_page import BasePage, CheckElement
 
 
 class AdPage(BasePage):
     def __init__(self, device):
+        # 广告弹窗的关闭按钮在画面右上方
         check_elements = [
-            os.path.join(ASSETS_PATH, 'login', '_TEMP_AD_BUTTON.png')
+            CheckElement('login/_TEMP_AD_BUTTON', roi=(880, 0, 400, 300), margin=20)
         ]
-        super().__init__(device, '广告弹窗页', check_elements)
\ No newline at end of file
+        # 关掉一个广告后可能还有下一个广告，全部关掉后进入主界面
+        super().__init__(device, '广告弹窗页', check_elements, next_pages=['游戏主页'])
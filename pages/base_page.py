@@ -1,39 +1,101 @@
 from src.zzz_assistant.core.device import Device
+from src.zzz_assistant.core.frame import Frame
+from src.zzz_assistant.core.probes import ColorProbe, ProbeSet
+from src.zzz_assistant.core.vision import DEFAULT_THRESHOLD, MATCH_FULL
 from src.zzz_assistant.utils.helpers import wait_for_template
+from src.zzz_assistant.utils.log import get_logger
+
+logger = get_logger(__name__)
+
+
+class CheckElement:
+    """
+    页面上的一个特征元素
+
+    key(str): 模板键（见TemplateRegistry），例如 'login/CLICK_INTO_GAME'
+    roi(tuple | None): 设计分辨率（1280×720）下的搜索区域 (x, y, 宽, 高)，为None时搜索全屏
+    margin(int): 在搜索区域四周额外扩展的像素，用来容忍按钮位置的轻微偏移
+    threshold(float | None): 这个元素的匹配阈值，为None时使用识别引擎的默认阈值
+    """
+    def __init__(self,
+                 key: str,
+                 roi: tuple[int, int, int, int] | None = None,
+                 margin: int = 0,
+                 threshold: float | None = None):
+        self.key = key
+        self.roi = roi
+        self.margin = margin
+        self.threshold = threshold
+
+    def __repr__(self):
+        return f"CheckElement({self.key!r}, roi={self.roi}, margin={self.margin}, threshold={self.threshold})"
 
 
 class BasePage:
     """
     所有页面类的基类（模具）
     name(str): 页面的唯一标识名称
-    check_elements(list[str]): 用于唯一识别此页面的模板图片路径列表，只有当所有这些元素都出现时才认为在当前页面
+    check_elements(list[CheckElement]): 用于唯一识别此页面的特征元素列表，只有当所有这些元素都出现时才认为在当前页面
+        为了方便，也可以直接传模板键字符串，等价于不限制搜索区域的CheckElement
+    strategy(str): 检查特征元素时使用的匹配策略，MATCH_FULL或MATCH_PYRAMID（见vision.py）
+    next_pages(list[str]): 从这个页面通常会跳转到哪些页面（页面名），作为Navigator预测下一个页面的先验
+    probes(ProbeSet | None): 颜色探针签名（见probes.py），探针不通过时直接判断不在这个页面，不做模板匹配；
+        可以用dev_tools/create_probes.py从这个页面的截图生成。为None时总是做模板匹配
     """
-    def __init__(self, device: Device, name: str, check_elements: list[str]):
+    def __init__(self,
+                 device: Device,
+                 name: str,
+                 check_elements: list[CheckElement | str],
+                 strategy: str = MATCH_FULL,
+                 next_pages: list[str] | None = None,
+                 probes: list[ColorProbe] | ProbeSet | None = None):
         self.device = device
         self.name = name
-        self.check_elements = check_elements
+        self.strategy = strategy
+        self.next_pages = next_pages or []
+        self.check_elements = [
+            element if isinstance(element, CheckElement) else CheckElement(element)
+            for element in check_elements
+        ]
+        self.probes = probes if probes is None or isinstance(probes, ProbeSet) else ProbeSet(probes)
+
+    def might_be_on_page(self, frame: Frame) -> bool:
+        """
+        用颜色探针快速预判（微秒级），返回False时一定不在这个页面，返回True时还需要模板匹配确认
+        """
+        return self.probes is None or self.probes.check(frame)
 
     def is_on_page(self,
-                   screenshot_bytes: bytes,
+                   frame: Frame,
                    timeout: int = 2) -> bool:
         """
         检查“我”这个页面当前 **是否** 停留在屏幕上。
         通过检查所有的check_elements是否都在屏幕上出现来判断
         这是一个快速检查，所以超时时间很短
+        :param frame: 由Navigator截取、所有页面共用的截图帧
         :param timeout: 为每个元素的检查设置的超过时间
         :return: bool: 如果所有检查元素都找到则返回True，否则False
         """
-        print(f"正在检查是否在【{self.name}】界面...")
-        for element_path in self.check_elements:
+        logger.debug("正在检查是否在【%s】界面...", self.name)
+        if not self.might_be_on_page(frame):
+            logger.debug("颜色探针不符，判断不在【%s】界面。", self.name)
+            return False
+        for element in self.check_elements:
             # 使用wait_for_template检查元素，但超时时间很短
+            # 元素没有单独设置阈值时和识别引擎一样用默认阈值，而不是wait_for_template等待时用的更严格的阈值
+            threshold = DEFAULT_THRESHOLD if element.threshold is None else element.threshold
             if not wait_for_template(self.device,
-                                     element_path,
+                                     element.key,
                                      timeout=timeout,
-                                     pre_captured_image=screenshot_bytes):
+                                     pre_captured_image=frame,
+                                     roi=element.roi,
+                                     margin=element.margin,
+                                     strategy=self.strategy,
+                                     threshold=threshold):
                 # 只要有一个元素没找到，就说明不在这个页面
-                print(f"Error: 未找到特征【{element_path}】，判断不在【{self.name}】界面！")
+                logger.debug("未找到特征【%s】，判断不在【%s】界面。", element.key, self.name)
                 return False
 
         # 如果所有元素都找到，则返回True
-        print(f"已确认在【{self.name}】界面.")
+        logger.debug("已确认在【%s】界面。", self.name)
         return True
@@ -1,24 +1,24 @@
-import os
-
-from pages.base_page import BasePage
-from src.zzz_assistant.utils.paths import ASSETS_PATH
+from pages.base_page import BasePage, CheckElement
 
 
 class LoginPage(BasePage):
     def __init__(self, device):
         # 定义登录页面的特征：必须能看到“点击进入游戏”的按钮
+        # 按钮固定在画面下方正中（录像机的显示屏上）
         check_elements = [
-            os.path.join(ASSETS_PATH, 'login', 'CLICK_INTO_GAME.png')
+            CheckElement('login/CLICK_INTO_GAME', roi=(440, 530, 400, 110), margin=20)
         ]
-        super().__init__(device, "登录页", check_elements)
+        # 点击进入游戏后，一般会先弹出广告，然后进入主界面
+        super().__init__(device, "登录页", check_elements, next_pages=["广告弹窗页", "游戏主页"])
 
 
 
 class MainPage(BasePage):
     def __init__(self, device):
         # 定义主页面的特征：必须能看到“导航”和“交互”按钮
+        # 导航按钮在右上角的功能栏里，交互按钮在右下角
         check_elements = [
-            os.path.join(ASSETS_PATH, "main_page", "MAIN_GOTO_GUIDE.png"),
-            os.path.join(ASSETS_PATH, "main_page", "INTERACTIVE_BUTTON.png")
+            CheckElement("main_page/MAIN_GOTO_GUIDE", roi=(640, 0, 640, 360), margin=10),
+            CheckElement("main_page/INTERACTIVE_BUTTON", roi=(640, 360, 640, 360), margin=10)
         ]
         super().__init__(device, "游戏主页", check_elements)
@@ -0,0 +1,191 @@
+from __future__ import annotations
+
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+from pathlib import Path
+
+from src.zzz_assistant.utils.lazy_import import lazy_import
+from src.zzz_assistant.utils.paths import CACHE_PATH
+
+np = lazy_import('numpy')
+
+# 模板包的默认位置，由dev_tools/create_template.py生成
+DEFAULT_PACK_PATH = CACHE_PATH / "templates.pack"
+
+# 文件格式：MAGIC + <版本号, 头部长度>（小端uint32）+ JSON头部 + 对齐后的像素数据
+PACK_MAGIC = b'ZZZPACK\x00'
+PACK_VERSION = 1
+_PREFIX = struct.Struct('<II')
+# 每个数组的起始偏移都按这个字节数对齐，映射出来的数组可以直接交给OpenCV
+PACK_ALIGNMENT = 64
+
+
+class PackedTemplate:
+    """
+    模板包中的一个模板条目
+
+    key(str): 模板键
+    mtime(float): 打包时源PNG的修改时间
+    file_size(int): 打包时源PNG的文件大小（字节）
+    size(tuple[int, int]): 模板尺寸 (宽, 高)
+    arrays(dict[str, list]): 数组名 -> [偏移, 形状, dtype]，数组名为 'bgr'、'gray'、'mask'、'pyramid1'、'pyramid2'……
+    """
+    def __init__(self, key: str, entry: dict):
+        self.key = key
+        self.mtime = entry['mtime']
+        self.file_size = entry['file_size']
+        self.size = tuple(entry['size'])
+        self.arrays = entry['arrays']
+
+    def matches_source(self, stat: os.stat_result) -> bool:
+        """源PNG在打包之后是否没有被改动过"""
+        return stat.st_mtime == self.mtime and stat.st_size == self.file_size
+
+
+class AssetPack:
+    """
+    编译好的模板包（只读，内存映射）
+
+    把所有模板解码后的BGR图、灰度图、掩码和金字塔各层存进一个文件里。
+    页面定义（特征元素的搜索区域、阈值等）不在包里，仍然以pages/下的代码为准。运行时用mmap打开，取模板只是在映射上建一个numpy视图，不需要解码PNG；
+    多个进程打开同一个模板包时共享操作系统的页缓存，像素数据在内存里只有一份。
+
+    读取头部只需要标准库（不导入numpy），`main.py --check` 可以用它检查模板包是否过期。
+    """
+
+    def __init__(self, path: str | os.PathLike):
+        """
+        :raise ValueError: 不是模板包，或者版本不兼容
+        :raise OSError: 文件无法读取
+        """
+        self.path = Path(path)
+        with open(self.path, 'rb') as f:
+            prefix = f.read(len(PACK_MAGIC) + _PREFIX.size)
+            if len(prefix) < len(PACK_MAGIC) + _PREFIX.size or not prefix.startswith(PACK_MAGIC):
+                raise ValueError(f"不是模板包：{self.path}")
+            version, header_size = _PREFIX.unpack_from(prefix, len(PACK_MAGIC))
+            if version != PACK_VERSION:
+                raise ValueError(f"模板包版本为{version}，当前程序需要版本{PACK_VERSION}，请重新生成")
+            self.header = json.loads(f.read(header_size).decode('utf-8'))
+        # 头部已经补齐到对齐位置，数组的偏移都是相对数据区起点的
+        self._data_start = len(PACK_MAGIC) + _PREFIX.size + header_size
+        self.templates = {key: PackedTemplate(key, entry) for key, entry in self.header['templates'].items()}
+        self._mmap: mmap.mmap | None = None
+        self._lock = threading.Lock()
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.templates
+
+    def get(self, key: str) -> PackedTemplate | None:
+        return self.templates.get(key)
+
+    def array(self, entry: PackedTemplate, name: str) -> np.ndarray | None:
+        """
+        取模板包中的一个数组（只读视图，不会拷贝）
+        :param entry: 模板条目
+        :param name: 数组名，见PackedTemplate.arrays
+        :return: 数组，条目中没有这个数组时返回None
+        """
+        spec = entry.arrays.get(name)
+        if spec is None:
+            return None
+        offset, shape, dtype = spec
+        array = np.frombuffer(self._map(), dtype=dtype, count=int(np.prod(shape)), offset=self._data_start + offset)
+        return array.reshape(shape)
+
+    def stale_keys(self, assets_root: str | os.PathLike) -> list[str]:
+        """
+        打包之后被修改、删除或新增的模板
+        :param assets_root: 模板所在的assets目录
+        """
+        assets_root = Path(assets_root)
+        stale = []
+        for key, entry in self.templates.items():
+            try:
+                if not entry.matches_source(os.stat(assets_root / f"{key}.png")):
+                    stale.append(key)
+            except OSError:
+                stale.append(key)
+        for path in assets_root.rglob('*.png'):
+            key = path.relative_to(assets_root).with_suffix('').as_posix()
+            if key not in self.templates:
+                stale.append(key)
+        return sorted(stale)
+
+    def close(self):
+        with self._lock:
+            if self._mmap is not None:
+                # 还有数组引用着映射时不能关闭，交给垃圾回收
+                try:
+                    self._mmap.close()
+                except BufferError:
+                    pass
+                self._mmap = None
+
+    def _map(self) -> mmap.mmap:
+        with self._lock:
+            if self._mmap is None:
+                with open(self.path, 'rb') as f:
+                    self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            return self._mmap
+
+
+def write_pack(path: str | os.PathLike,
+               templates: list[dict]) -> int:
+    """
+    生成模板包
+    :param path: 输出文件路径，先写临时文件再替换，正在运行的程序不会读到写了一半的文件
+    :param templates: 每个模板一个dict：{'key', 'mtime', 'file_size', 'arrays': {数组名: np.ndarray}}
+    :return: 文件大小（字节）
+    """
+    entries = {}
+    blobs = []
+    offset = 0
+    for template in templates:
+        arrays = {}
+        for name, array in template['arrays'].items():
+            if array is None:
+                continue
+            array = np.ascontiguousarray(array)
+            offset = _align(offset)
+            arrays[name] = [offset, list(array.shape), array.dtype.str]
+            blobs.append((offset, array))
+            offset += array.nbytes
+        height, width = template['arrays']['bgr'].shape[:2]
+        entries[template['key']] = {
+            'mtime': template['mtime'],
+            'file_size': template['file_size'],
+            'size': [width, height],
+            'arrays': arrays,
+        }
+    header = {
+        'version': PACK_VERSION,
+        'built_at': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'templates': entries,
+    }
+    header_bytes = json.dumps(header, ensure_ascii=False).encode('utf-8')
+    # 数据区从对齐的位置开始，头部用空格补齐（JSON允许尾随空白）
+    data_start = _align(len(PACK_MAGIC) + _PREFIX.size + len(header_bytes))
+    header_bytes += b' ' * (data_start - len(PACK_MAGIC) - _PREFIX.size - len(header_bytes))
+
+    path = Path(path)
+    os.makedirs(path.parent, exist_ok=True)
+    tmp_path = path.with_name(path.name + '.tmp')
+    with open(tmp_path, 'wb') as f:
+        f.write(PACK_MAGIC)
+        f.write(_PREFIX.pack(PACK_VERSION, len(header_bytes)))
+        f.write(header_bytes)
+        for blob_offset, array in blobs:
+            f.seek(data_start + blob_offset)
+            f.write(array.tobytes())
+        size = f.tell()
+    os.replace(tmp_path, path)
+    return size
+
+
+def _align(offset: int) -> int:
+    return (offset + PACK_ALIGNMENT - 1) // PACK_ALIGNMENT * PACK_ALIGNMENT
@@ -0,0 +1,241 @@
+from __future__ import annotations
+
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from src.zzz_assistant.core.frame import Frame, ScreenTransform
+from src.zzz_assistant.core.metrics import metrics
+from src.zzz_assistant.core.vision import DEFAULT_THRESHOLD, match_template_at
+from src.zzz_assistant.utils.log import get_logger
+from src.zzz_assistant.utils.paths import CACHE_PATH
+
+if TYPE_CHECKING:
+    # pages依赖Device，Device又依赖这里，只在类型检查时导入
+    from pages.base_page import BasePage
+
+logger = get_logger(__name__)
+
+# 校准结果的默认保存位置
+DEFAULT_CALIBRATION_FILE = CACHE_PATH / "calibration.json"
+
+# 校准时在默认比例（刚好放进屏幕）上下搜索的范围，0.2表示±20%
+CALIBRATION_SCALE_RANGE = 0.2
+# 先粗搜再细搜的步长（相对默认比例）
+CALIBRATION_COARSE_STEP = 0.05
+CALIBRATION_FINE_STEP = 0.01
+# 某个元素的相似度比阈值低这么多时，这个页面剩下的元素就不用再匹配了
+CALIBRATION_REJECT_DROP = 0.15
+# 连续多少次识别都没有认出任何页面，就用所有页面重新做一次多比例搜索
+RECALIBRATE_AFTER_MISSES = 3
+# 重新搜索也没找到时（例如一直在加载画面），下一次要等的次数翻倍，最多等这么多次
+RECALIBRATE_MAX_MISSES = 48
+
+
+class CalibrationResult:
+    """
+    一次缩放校准的结果
+
+    transform(ScreenTransform): 校准出的坐标换算
+    score(float): 用来校准的页面在这个比例下所有特征元素中最低的相似度
+    page(str): 用来校准的页面名
+    """
+    def __init__(self, transform: ScreenTransform, score: float, page: str):
+        self.transform = transform
+        self.score = score
+        self.page = page
+
+    def __repr__(self):
+        return f"CalibrationResult({self.transform}, score={self.score:.3f}, page={self.page!r})"
+
+
+def calibrate(frame: Frame,
+              pages: list[BasePage],
+              threshold: float = DEFAULT_THRESHOLD,
+              scale_range: float = CALIBRATION_SCALE_RANGE) -> CalibrationResult | None:
+    """
+    在一帧画面上搜索界面的缩放比例
+
+    以刚好放进屏幕的比例为中心，先按CALIBRATION_COARSE_STEP粗搜，再在最好的比例附近按CALIBRATION_FINE_STEP细搜。
+    每个比例下把模板缩放到屏幕尺寸，只在按这个比例换算出的搜索区域里匹配，不缩放整帧。
+    一个页面在某个比例下的得分是它所有特征元素中最低的相似度。
+    :param frame: 截图帧
+    :param pages: 用来校准的页面，画面上必须有其中之一
+    :param threshold: 最好的得分达到这个阈值才算校准成功
+    :param scale_range: 搜索范围（相对默认比例）
+    :return: CalibrationResult，没有任何页面达到阈值时返回None
+    """
+    base_scale = ScreenTransform.fit(frame.size).scale
+    evaluated: dict[float, tuple[float, str | None]] = {}
+
+    def evaluate(factor: float) -> tuple[float, str | None]:
+        factor = round(factor, 4)
+        if factor not in evaluated:
+            evaluated[factor] = _score_scale(frame, pages, base_scale * factor, threshold)
+        return evaluated[factor]
+
+    with metrics.span('calibration.search') as span:
+        steps = round(scale_range / CALIBRATION_COARSE_STEP)
+        best_factor = max((1 + i * CALIBRATION_COARSE_STEP for i in range(-steps, steps + 1)),
+                          key=lambda f: evaluate(f)[0])
+        fine_steps = round(CALIBRATION_COARSE_STEP / CALIBRATION_FINE_STEP)
+        best_factor = max((best_factor + i * CALIBRATION_FINE_STEP for i in range(-fine_steps + 1, fine_steps)),
+                          key=lambda f: evaluate(f)[0])
+        score, page = evaluate(best_factor)
+        span.set(result='ok' if score >= threshold else 'failed')
+    if page is None or score < threshold:
+        return None
+    return CalibrationResult(ScreenTransform.fit(frame.size, base_scale * round(best_factor, 4)), score, page)
+
+
+def _score_scale(frame: Frame, pages: list[BasePage], scale: float, threshold: float) -> tuple[float, str | None]:
+    """某个比例下得分最高的页面 (得分, 页面名)"""
+    transform = ScreenTransform.fit(frame.size, scale)
+    best_score, best_page = 0.0, None
+    for page in pages:
+        page_score = 1.0
+        for element in page.check_elements:
+            match = match_template_at(frame, element.key, transform, element.roi, element.margin)
+            page_score = min(page_score, match.score if match is not None else 0.0)
+            if page_score < threshold - CALIBRATION_REJECT_DROP:
+                break
+        if page_score > best_score:
+            best_score, best_page = page_score, page.name
+    return best_score, best_page
+
+
+class CalibrationStore:
+    """
+    所有设备的校准结果，按 (设备序列号, 屏幕分辨率) 保存在cache/calibration.json里，下次运行直接使用
+    """
+
+    def __init__(self, path: Path | None = DEFAULT_CALIBRATION_FILE):
+        """
+        :param path: 保存校准结果的json文件，为None时不持久化
+        """
+        self.path = Path(path) if path else None
+        self.entries: dict[str, dict] = {}
+        self._lock = threading.Lock()
+        self.load()
+
+    @staticmethod
+    def key(serial: str, screen_size: tuple[int, int]) -> str:
+        return f"{serial}@{screen_size[0]}x{screen_size[1]}"
+
+    def get(self, serial: str, screen_size: tuple[int, int]) -> ScreenTransform | None:
+        """
+        :return: 这台设备在这个分辨率下校准过的换算，没有校准过时返回None
+        """
+        with self._lock:
+            entry = self.entries.get(self.key(serial, screen_size))
+        if entry is None:
+            return None
+        return ScreenTransform(entry['scale'], tuple(entry['offset']))
+
+    def put(self, serial: str, screen_size: tuple[int, int], result: CalibrationResult):
+        """记录一次校准结果并立刻保存"""
+        with self._lock:
+            self.entries[self.key(serial, screen_size)] = {
+                'scale': result.transform.scale,
+                'offset': list(result.transform.offset),
+                'score': round(result.score, 4),
+                'page': result.page,
+                'calibrated_at': time.strftime('%Y-%m-%d %H:%M:%S'),
+            }
+        self.save()
+
+    def load(self):
+        if not self.path or not self.path.exists():
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self.entries = json.load(f).get('devices', {})
+        except (OSError, ValueError) as e:
+            logger.warning("读取缩放校准结果时出错，将重新校准：%s", e)
+            self.entries = {}
+
+    def save(self):
+        if not self.path:
+            return
+        with self._lock:
+            data = {'devices': dict(self.entries)}
+        try:
+            os.makedirs(self.path.parent, exist_ok=True)
+            tmp_path = self.path.with_suffix('.tmp')
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.warning("保存缩放校准结果时出错：%s", e)
+
+
+class DeviceCalibration:
+    """
+    一台设备的缩放校准状态
+
+    Device用它给每一帧截图设置坐标换算（transform_for），点击时把设计坐标换算成屏幕坐标；
+    Navigator在识别结果出来后调用after_recognition()：
+    1. 这个分辨率还没校准过，且认出了页面：用这个页面做一次多比例搜索，保存结果（每台设备每种分辨率只做一次）
+    2. 连续RECALIBRATE_AFTER_MISSES次没认出任何页面：用所有页面重新做一次多比例搜索，比例变了就更新；
+       搜索失败时下一次要等的次数翻倍，避免在长时间的加载画面上反复搜索
+    """
+
+    def __init__(self, serial: str, store: CalibrationStore | None = None):
+        self.serial = serial
+        self.store = store if store is not None else calibration_store
+        self.misses = 0
+        self.misses_before_search = RECALIBRATE_AFTER_MISSES
+
+    def transform_for(self, screen_size: tuple[int, int]) -> ScreenTransform:
+        """这个分辨率下的坐标换算，没有校准过时使用默认的居中放置"""
+        transform = self.store.get(self.serial, screen_size)
+        return transform if transform is not None else ScreenTransform.fit(screen_size)
+
+    def is_calibrated(self, screen_size: tuple[int, int]) -> bool:
+        return self.store.get(self.serial, screen_size) is not None
+
+    def after_recognition(self, frame: Frame, page: BasePage | None, pages: list[BasePage]) -> Frame | None:
+        """
+        根据一次识别的结果决定要不要校准
+        :param frame: 识别用的截图帧
+        :param page: 识别出的页面，没有认出时为None
+        :param pages: 所有已知页面
+        :return: 缩放比例发生了变化时，返回换成新比例的帧（调用方应该用它重新识别），否则返回None
+        """
+        if page is not None:
+            self.misses = 0
+            self.misses_before_search = RECALIBRATE_AFTER_MISSES
+            if not self.is_calibrated(frame.size):
+                self._calibrate(frame, [page])
+            return None
+
+        self.misses += 1
+        if self.misses < self.misses_before_search:
+            return None
+        self.misses = 0
+        result = self._calibrate(frame, pages)
+        if result is None:
+            self.misses_before_search = min(RECALIBRATE_MAX_MISSES, self.misses_before_search * 2)
+            return None
+        if result.transform == frame.transform:
+            return None
+        return frame.with_transform(result.transform)
+
+    def _calibrate(self, frame: Frame, pages: list[BasePage]) -> CalibrationResult | None:
+        start = time.perf_counter()
+        result = calibrate(frame, pages)
+        elapsed = time.perf_counter() - start
+        if result is None:
+            logger.info("缩放校准未找到可靠的比例（%.0fms），继续使用%s", elapsed * 1000, frame.transform)
+            return None
+        logger.info("缩放校准完成：%s %dx%d -> %s，依据【%s】，相似度%.2f（%.0fms）", self.serial,
+                    frame.width, frame.height, result.transform, result.page, result.score, elapsed * 1000)
+        self.store.put(self.serial, frame.size, result)
+        return result
+
+
+# 全局共享的校准结果
+calibration_store = CalibrationStore()
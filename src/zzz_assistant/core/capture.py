@@ -0,0 +1,310 @@
+from __future__ import annotations
+
+import io
+import os
+import struct
+import threading
+import time
+from typing import TYPE_CHECKING
+
+from src.zzz_assistant.core.frame import Frame
+from src.zzz_assistant.core.metrics import metrics
+from src.zzz_assistant.utils.lazy_import import lazy_import
+from src.zzz_assistant.utils.log import get_logger
+
+if TYPE_CHECKING:
+    from src.zzz_assistant.core.connection import AdbConnection
+
+cv2 = lazy_import('cv2')
+adbutils = lazy_import('adbutils')
+logger = get_logger(__name__)
+
+# 可选的截图方式（对应配置文件中的 emulator.capture）
+CAPTURE_METHODS = ('screencap', 'stream')
+
+# 在设备上循环执行screencap，每一帧原始数据首尾相接地写到同一个连接里
+STREAM_COMMAND = "while true; do screencap; done"
+
+
+class CaptureBackend:
+    """
+    截图后端的基类
+
+    Device.screenshot() 只和这个接口打交道，具体怎么拿到画面由子类决定。
+    """
+
+    def grab(self) -> Frame | None:
+        """
+        获取一帧画面
+        :return: Frame，失败时返回None
+        """
+        raise NotImplementedError("每个截图后端都必须实现自己的'grab'方法")
+
+    def close(self):
+        """释放后端占用的连接、线程等资源"""
+
+
+class ScreencapBackend(CaptureBackend):
+    """
+    每次截图都发起一次 `adb shell screencap` 请求，读取原始像素
+    最简单、最稳定，但每一帧都要重新建立连接、启动screencap进程
+    """
+
+    def __init__(self, adb_device: adbutils.AdbDevice):
+        self.adb_device = adb_device
+
+    def grab(self) -> Frame | None:
+        with metrics.span('capture.transfer', method='screencap'):
+            raw = self.adb_device.shell(['screencap'], encoding=None)
+        try:
+            with metrics.span('capture.decode', format='raw'):
+                return Frame.from_screencap(raw)
+        except ValueError as e:
+            # 少数模拟器的原始格式比较特殊，退回到adbutils自带的截图方式
+            logger.warning("无法解析原始截图（%s），改用PNG截图。", e)
+            with metrics.span('capture.transfer', method='png'):
+                pil_image = self.adb_device.screenshot()
+            with metrics.span('capture.decode', format='png'):
+                return Frame.from_pil(pil_image)
+
+
+class RawScreencapReader:
+    """
+    从一个连续的字节流中逐帧解析screencap原始数据
+
+    字节流由多帧 “文件头 + 像素” 首尾相接组成。读取时复用同一块缓冲区，
+    Frame.from_screencap做颜色转换时会生成新的数组，所以缓冲区可以安全地反复使用。
+    """
+
+    def __init__(self, recv_into, header_size: int):
+        """
+        :param recv_into: 形如 socket.recv_into 的函数，把数据读入给定的缓冲区并返回读取的字节数，返回0表示流结束
+        :param header_size: 每帧文件头的字节数（12或16，取决于Android版本）
+        """
+        self._recv_into = recv_into
+        self.header_size = header_size
+        self._buffer = bytearray()
+
+    def read_frame(self) -> Frame:
+        """
+        读取下一帧
+        :return: Frame
+        """
+        header = bytearray(self.header_size)
+        self._read_exactly(memoryview(header))
+        width, height, _ = struct.unpack_from('<III', header, 0)
+        frame_size = self.header_size + width * height * 4
+
+        if len(self._buffer) != frame_size:
+            self._buffer = bytearray(frame_size)
+        view = memoryview(self._buffer)
+        view[:self.header_size] = header
+        self._read_exactly(view[self.header_size:])
+        return Frame.from_screencap(self._buffer)
+
+    def _read_exactly(self, view: memoryview):
+        while len(view):
+            n = self._recv_into(view)
+            if not n:
+                raise EOFError("截图数据流已结束")
+            view = view[n:]
+
+
+class ScreencapStreamBackend(CaptureBackend):
+    """
+    通过一条常驻的adb shell连接持续获取原始截图
+
+    设备端循环执行screencap，所有帧都从同一个连接里读出来，
+    省掉了每一帧建立adb连接和启动shell的开销。通常配合FrameProducer在后台线程中使用。
+    """
+
+    def __init__(self, adb_device: adbutils.AdbDevice):
+        self.adb_device = adb_device
+        self._connection = None
+        self._reader: RawScreencapReader | None = None
+
+    def grab(self) -> Frame | None:
+        if self._reader is None:
+            self._open()
+        try:
+            return self._reader.read_frame()
+        except (EOFError, OSError, adbutils.AdbError):
+            # 连接断了，下次grab时重新打开
+            self.close()
+            raise
+
+    def close(self):
+        if self._connection is not None:
+            self._connection.close()
+        self._connection = None
+        self._reader = None
+
+    def _open(self):
+        # 先单独截一帧，用来确定这台设备screencap的文件头长度
+        probe = self.adb_device.shell(['screencap'], encoding=None)
+        width, height, _ = struct.unpack_from('<III', probe, 0)
+        header_size = len(probe) - width * height * 4
+
+        self._connection = self.adb_device.shell(STREAM_COMMAND, stream=True)
+        self._reader = RawScreencapReader(self._connection.conn.recv_into, header_size)
+
+
+class FrameProducer(CaptureBackend):
+    """
+    后台截图线程
+
+    在后台线程中不停地从另一个后端取帧，始终只保留最新的一帧。
+    消费者调用grab()时直接拿到最新的画面，不需要等待截图完成（只有在第一帧到来之前会等待）。
+    """
+
+    def __init__(self, backend: CaptureBackend, first_frame_timeout: float = 10.0, retry_interval: float = 0.5,
+                 connection: AdbConnection | None = None):
+        """
+        :param backend: 真正负责截图的后端
+        :param first_frame_timeout: 第一次grab时最多等待多久
+        :param retry_interval: 截图出错后，隔多久再重试
+        :param connection: 设备的adb连接，给出时通过它取帧，断线时等重连成功后再继续
+        """
+        self.backend = backend
+        self.connection = connection
+        self.first_frame_timeout = first_frame_timeout
+        self.retry_interval = retry_interval
+        self.frames_produced = 0
+        self._latest: Frame | None = None
+        self._condition = threading.Condition()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="frame-producer", daemon=True)
+        self._thread.start()
+
+    def latest(self) -> Frame | None:
+        """最新的一帧，还没有任何帧时返回None，从不阻塞"""
+        return self._latest
+
+    def grab(self) -> Frame | None:
+        if self._latest is None:
+            with self._condition:
+                self._condition.wait_for(lambda: self._latest is not None, timeout=self.first_frame_timeout)
+        return self._latest
+
+    def wait_for_newer(self, timestamp: float, timeout: float) -> Frame | None:
+        """
+        等待一帧比timestamp更新的画面（例如点击之后想拿到点击之后的画面）
+        :param timestamp: 参考时间
+        :param timeout: 最长等待时间（秒）
+        :return: 新的一帧，超时返回None
+        """
+        with self._condition:
+            self._condition.wait_for(
+                lambda: self._latest is not None and self._latest.timestamp > timestamp,
+                timeout=timeout)
+        latest = self._latest
+        if latest is not None and latest.timestamp > timestamp:
+            return latest
+        return None
+
+    def close(self):
+        self._stopped.set()
+        self.backend.close()
+        self._thread.join(timeout=2)
+
+    def _run(self):
+        while not self._stopped.is_set():
+            try:
+                if self.connection is not None:
+                    frame = self.connection.call('stream_frame', self.backend.grab)
+                else:
+                    frame = self.backend.grab()
+            except Exception as e:
+                if self._stopped.is_set():
+                    break
+                # 断线前的旧画面已经不代表当前的屏幕，不要再交给消费者
+                self._latest = None
+                logger.warning("后台截图失败：%s，%s秒后重试。", e, self.retry_interval)
+                self._stopped.wait(self.retry_interval)
+                continue
+            if frame is None:
+                self._stopped.wait(self.retry_interval)
+                continue
+            with self._condition:
+                self._latest = frame
+                self.frames_produced += 1
+                self._condition.notify_all()
+
+
+# --- 离线替身：不需要模拟器也能测试、压测截图链路 ---
+
+class FileReplayBackend(CaptureBackend):
+    """
+    按顺序回放磁盘上的截图文件（例如debug/里的图片）
+    """
+
+    def __init__(self, paths: list[str | os.PathLike], loop: bool = True, fps: float | None = None):
+        """
+        :param paths: 图片路径列表
+        :param loop: 放完后是否从头开始
+        :param fps: 限制回放帧率，为None时不限速
+        """
+        if not paths:
+            raise ValueError("回放至少需要一张图片")
+        # 预先解码，回放时只是取出数组
+        self._images = [Frame.from_file(path).image for path in paths]
+        self.loop = loop
+        self.fps = fps
+        self._index = 0
+        self._last_time = 0.0
+
+    def grab(self) -> Frame | None:
+        if self._index >= len(self._images):
+            if not self.loop:
+                return None
+            self._index = 0
+        if self.fps:
+            delay = self._last_time + 1 / self.fps - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            self._last_time = time.perf_counter()
+        image = self._images[self._index]
+        self._index += 1
+        return Frame(image)
+
+
+class FakeScreencapStream(io.RawIOBase):
+    """
+    假的adb截图数据流
+
+    把几张图片编码成和设备端 `while true; do screencap; done` 一模一样的字节流，
+    可以直接交给RawScreencapReader解析，用来离线测试和压测流式截图。
+    """
+
+    def __init__(self, paths: list[str | os.PathLike], header_size: int = 16, frame_count: int | None = None):
+        """
+        :param paths: 图片路径列表，会循环输出
+        :param header_size: 模拟的文件头长度（12或16）
+        :param frame_count: 总共输出多少帧，为None时无限输出
+        """
+        self._raw_frames = []
+        for path in paths:
+            image = Frame.from_file(path).image
+            height, width = image.shape[:2]
+            header = struct.pack('<III', width, height, 1) + b'\0' * (header_size - 12)
+            self._raw_frames.append(header + cv2.cvtColor(image, cv2.COLOR_BGR2RGBA).tobytes())
+        self.frame_count = frame_count
+        self._frames_sent = 0
+        self._current = memoryview(b'')
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        if not len(self._current):
+            if self.frame_count is not None and self._frames_sent >= self.frame_count:
+                return 0
+            self._current = memoryview(self._raw_frames[self._frames_sent % len(self._raw_frames)])
+            self._frames_sent += 1
+        n = min(len(buffer), len(self._current))
+        buffer[:n] = self._current[:n]
+        self._current = self._current[n:]
+        return n
+
+    # 和socket.recv_into同名，方便直接传给RawScreencapReader
+    recv_into = readinto
@@ -0,0 +1,319 @@
+"""
+adb连接管理
+
+每台设备一个AdbConnection，设备上的adb操作（截图、点击、查询前台应用……）都通过call()执行：
+1. 所有操作复用同一个adb客户端和设备对象，并记住adb server的版本：adbutils每打开一条到设备的连接，
+   都要先单独连一次adb server问版本，记住之后每条命令少一次TCP连接和一次往返
+2. 设备空闲时每隔health_check_interval秒用一条echo命令检查连接是否还活着，断了就在后台重连
+3. 操作因为adb或网络错误失败时，先确认连接是不是真的断了（有些adb错误只是命令本身失败，
+   例如应用切换的瞬间取不到前台应用）；断了就在后台按指数退避重连，
+   这次操作和之后的操作都排队等重连成功后再执行，而不是直接失败；
+   等了reconnect_timeout秒还没连上才抛出DeviceUnavailable
+4. 记录每种操作的次数和延迟、出错和重连次数、断线总时长（见ConnectionStats），守护进程的/status会带上它们
+"""
+from __future__ import annotations
+
+import functools
+import random
+import threading
+import time
+
+from src.zzz_assistant.core.metrics import Histogram, metrics
+from src.zzz_assistant.utils.lazy_import import lazy_import
+from src.zzz_assistant.utils.log import get_logger
+
+adbutils = lazy_import('adbutils')
+logger = get_logger(__name__)
+
+DEFAULT_ADB_HOST = "127.0.0.1"
+DEFAULT_ADB_PORT = 5037
+# 设备空闲多久（秒）后做一次健康检查，有操作成功时不检查
+HEALTH_CHECK_INTERVAL = 5.0
+# 断线后操作最多等多久（秒）重连成功，超过就抛出DeviceUnavailable
+RECONNECT_TIMEOUT = 30.0
+# 重连失败后的等待时间（秒）：从RECONNECT_INITIAL_DELAY开始每次翻倍，最多RECONNECT_MAX_DELAY
+RECONNECT_INITIAL_DELAY = 0.5
+RECONNECT_MAX_DELAY = 10.0
+# 健康检查命令最多等多久（秒）
+PROBE_TIMEOUT = 3.0
+# 和adb server之间的连接没有数据时最多等多久（秒），设备卡死时常驻连接（流式截图等）也能发现断线
+SOCKET_TIMEOUT = 10.0
+
+STATE_DISCONNECTED = 'disconnected'
+STATE_CONNECTED = 'connected'
+STATE_RECONNECTING = 'reconnecting'
+STATE_CLOSED = 'closed'
+
+
+class DeviceUnavailable(ConnectionError):
+    """设备断开后在限定时间内没有重连成功（或者连接已经关闭）"""
+
+
+class ConnectionStats:
+    """
+    一条adb连接的统计
+
+    errors(int): 因为adb或网络错误失败的操作次数
+    disconnects(int): 确认断线的次数
+    reconnects(int): 重连成功的次数
+    deferred(int): 断线期间排队等待重连的操作次数
+    downtime(float): 已经恢复的断线加起来的时长（秒）
+    last_error(str | None): 最近一次导致断线的错误
+    """
+
+    def __init__(self):
+        self.errors = 0
+        self.disconnects = 0
+        self.reconnects = 0
+        self.deferred = 0
+        self.downtime = 0.0
+        self.last_error: str | None = None
+        self._latencies: dict[str, Histogram] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, name: str, seconds: float):
+        """记录一次成功的操作耗时"""
+        with self._lock:
+            histogram = self._latencies.get(name)
+            if histogram is None:
+                histogram = self._latencies[name] = Histogram()
+            histogram.observe(seconds)
+
+    def add(self, field: str, amount: float = 1):
+        with self._lock:
+            setattr(self, field, getattr(self, field) + amount)
+
+    def to_dict(self) -> dict:
+        """延迟的单位是毫秒，分位数取直方图桶的上界"""
+        with self._lock:
+            return {
+                'errors': self.errors, 'disconnects': self.disconnects, 'reconnects': self.reconnects,
+                'deferred': self.deferred, 'downtime': round(self.downtime, 3), 'last_error': self.last_error,
+                'latency_ms': {
+                    name: {
+                        'count': h.count,
+                        'mean': round(h.total / h.count * 1000, 2),
+                        'p50': round(h.quantile(0.5) * 1000, 2),
+                        'p95': round(h.quantile(0.95) * 1000, 2),
+                        'max': round(h.max * 1000, 2),
+                    }
+                    for name, h in sorted(self._latencies.items())
+                },
+            }
+
+
+class AdbConnection:
+    """
+    一台设备的adb连接，负责健康检查和断线重连
+
+        connection = AdbConnection.from_config('127.0.0.1:16384', config.get('adb'))
+        if connection.connect():
+            model = connection.call('getprop', lambda: connection.device.prop.model)
+    """
+
+    def __init__(self,
+                 serial: str,
+                 host: str = DEFAULT_ADB_HOST,
+                 port: int = DEFAULT_ADB_PORT,
+                 health_check_interval: float = HEALTH_CHECK_INTERVAL,
+                 reconnect_timeout: float = RECONNECT_TIMEOUT):
+        """
+        :param serial: 设备序列号，'地址:端口'形式的序列号在重连时会先执行一次adb connect
+        :param host: adb server的地址
+        :param port: adb server的端口
+        :param health_check_interval: 设备空闲多久后做一次健康检查（秒），0表示不检查
+        :param reconnect_timeout: 断线后操作最多等多久重连成功（秒）
+        """
+        self.serial = serial
+        self.health_check_interval = health_check_interval
+        self.reconnect_timeout = reconnect_timeout
+        self.client = adbutils.AdbClient(host=host, port=port, socket_timeout=SOCKET_TIMEOUT)
+        # adb server的版本在它重启之前不会变，重连时清掉
+        self.client.server_version = functools.lru_cache(maxsize=1)(self.client.server_version)
+        self.device: adbutils.AdbDevice = self.client.device(serial=serial)
+        self.stats = ConnectionStats()
+        self._state = STATE_DISCONNECTED
+        self._condition = threading.Condition()
+        self._closed = threading.Event()
+        self._lost_at = 0.0
+        self._last_success = 0.0
+        self._health_thread: threading.Thread | None = None
+
+    @classmethod
+    def from_config(cls, serial: str, adb_config: dict | None = None) -> "AdbConnection":
+        """
+        :param adb_config: 配置文件中的adb部分
+        """
+        adb_config = adb_config or {}
+        return cls(serial,
+                   host=adb_config.get('host', DEFAULT_ADB_HOST),
+                   port=adb_config.get('port', DEFAULT_ADB_PORT),
+                   health_check_interval=adb_config.get('health_check_interval', HEALTH_CHECK_INTERVAL),
+                   reconnect_timeout=adb_config.get('reconnect_timeout', RECONNECT_TIMEOUT))
+
+    @property
+    def state(self) -> str:
+        return self._state
+
+    @property
+    def connected(self) -> bool:
+        return self._state == STATE_CONNECTED
+
+    def connect(self) -> bool:
+        """
+        第一次连接，连不上时直接返回False，不在后台重试
+        """
+        if not self._try_connect():
+            return False
+        with self._condition:
+            if self._state == STATE_CLOSED:
+                return False
+            self._state = STATE_CONNECTED
+            self._last_success = time.monotonic()
+            self._condition.notify_all()
+        if self.health_check_interval and self._health_thread is None:
+            self._health_thread = threading.Thread(target=self._health_loop, name=f"adb-health-{self.serial}",
+                                                   daemon=True)
+            self._health_thread.start()
+        return True
+
+    def call(self, name: str, func, *args, **kwargs):
+        """
+        执行一次adb操作，断线时等重连成功后再重试一次
+        :param name: 操作名，用于统计延迟，例如'screencap'
+        :param func: 真正执行操作的函数，其余参数原样传给它
+        :return: func的返回值
+        :raises DeviceUnavailable: 连接断开后reconnect_timeout秒内没有重连成功
+        命令本身的错误（连接正常时的AdbError）原样抛出
+        """
+        for attempt in range(2):
+            self.wait_until_connected()
+            start = time.perf_counter()
+            try:
+                result = func(*args, **kwargs)
+            except (OSError, EOFError, adbutils.AdbError) as e:
+                self.stats.add('errors')
+                lost = self._check_after_error(e)
+                # 连接正常时adbutils抛出的AdbError是命令本身失败，重试也没用；
+                # 其他错误（常驻连接被关掉、读超时）多半只是那一条连接坏了，重新打开再试一次
+                if attempt or (not lost and type(e) is adbutils.AdbError):
+                    raise
+                logger.debug("设备%s的%s操作失败（%s），%s重试", self.serial, name, e,
+                             '等重连成功后' if lost else '立即')
+                continue
+            elapsed = time.perf_counter() - start
+            self._last_success = time.monotonic()
+            self.stats.observe(name, elapsed)
+            metrics.observe('adb.command', elapsed, {'device': self.serial, 'op': name})
+            return result
+
+    def wait_until_connected(self):
+        """
+        正在重连时等它完成
+        :raises DeviceUnavailable: reconnect_timeout秒内没有重连成功，或者还没连接、连接已关闭
+        """
+        with self._condition:
+            if self._state == STATE_CONNECTED:
+                return
+            if self._state == STATE_RECONNECTING:
+                self.stats.add('deferred')
+                self._condition.wait_for(lambda: self._state != STATE_RECONNECTING, timeout=self.reconnect_timeout)
+            if self._state != STATE_CONNECTED:
+                reason = {STATE_RECONNECTING: f"{self.reconnect_timeout:g}秒内没有重连成功",
+                          STATE_DISCONNECTED: "还没有连接", STATE_CLOSED: "连接已关闭"}[self._state]
+                raise DeviceUnavailable(f"设备{self.serial}不可用：{reason}")
+
+    def close(self):
+        """停止健康检查和重连，正在排队的操作会收到DeviceUnavailable"""
+        with self._condition:
+            self._state = STATE_CLOSED
+            self._condition.notify_all()
+        self._closed.set()
+
+    def to_dict(self) -> dict:
+        return {'state': self._state, **self.stats.to_dict()}
+
+    def _check_after_error(self, error: Exception) -> bool:
+        """
+        操作出错后确认连接是否真的断了，断了就开始后台重连
+        :return: 连接断了（或已关闭）返回True，连接正常返回False
+        """
+        if self._state != STATE_CONNECTED:
+            return True
+        if self._probe():
+            return False
+        self._start_reconnect(error)
+        return True
+
+    def _start_reconnect(self, error: Exception):
+        with self._condition:
+            if self._state != STATE_CONNECTED:
+                # 其他线程已经开始重连了
+                return
+            self._state = STATE_RECONNECTING
+            self._lost_at = time.monotonic()
+        self.stats.add('disconnects')
+        self.stats.last_error = f"{type(error).__name__}: {error}"
+        metrics.inc('adb.disconnects', device=self.serial)
+        logger.warning("设备%s的adb连接已断开（%s），在后台重连，期间的操作会等待重连完成", self.serial, error)
+        threading.Thread(target=self._reconnect_loop, name=f"adb-reconnect-{self.serial}", daemon=True).start()
+
+    def _reconnect_loop(self):
+        delay = RECONNECT_INITIAL_DELAY
+        attempts = 0
+        while not self._closed.is_set():
+            attempts += 1
+            if self._try_connect():
+                with self._condition:
+                    if self._state != STATE_RECONNECTING:
+                        return
+                    downtime = time.monotonic() - self._lost_at
+                    self._state = STATE_CONNECTED
+                    self._last_success = time.monotonic()
+                    self._condition.notify_all()
+                self.stats.add('reconnects')
+                self.stats.add('downtime', downtime)
+                metrics.inc('adb.reconnects', device=self.serial)
+                logger.info("设备%s已重新连接（断开了%.1f秒，尝试了%d次）", self.serial, downtime, attempts)
+                return
+            # 加一点随机抖动，多台模拟器同时断开时不会一起重连
+            self._closed.wait(delay * random.uniform(0.5, 1.0))
+            delay = min(delay * 2, RECONNECT_MAX_DELAY)
+
+    def _health_loop(self):
+        while not self._closed.wait(self.health_check_interval / 2):
+            if self._state != STATE_CONNECTED:
+                continue
+            if time.monotonic() - self._last_success < self.health_check_interval:
+                # 最近有操作成功过，不用额外检查
+                continue
+            if self._probe():
+                self._last_success = time.monotonic()
+            else:
+                self._start_reconnect(ConnectionError("健康检查失败"))
+
+    def _try_connect(self) -> bool:
+        """连接一次，连上了返回True"""
+        self.client.server_version.cache_clear()
+        if ':' in self.serial:
+            # 网络设备（模拟器）在adb server重启或者被断开后，需要重新adb connect
+            try:
+                self.client.connect(self.serial, timeout=PROBE_TIMEOUT)
+            except (OSError, adbutils.AdbError) as e:
+                logger.debug("adb connect %s失败：%s", self.serial, e)
+                return False
+        return self._probe()
+
+    def _probe(self) -> bool:
+        """用一条echo命令检查设备是否能正常执行命令"""
+        start = time.perf_counter()
+        try:
+            output = self.device.shell("echo ok", timeout=PROBE_TIMEOUT)
+        except (OSError, EOFError, adbutils.AdbError) as e:
+            logger.debug("设备%s健康检查失败：%s", self.serial, e)
+            return False
+        if output.strip() != 'ok':
+            logger.debug("设备%s健康检查的输出不正确：%r", self.serial, output)
+            return False
+        self.stats.observe('health', time.perf_counter() - start)
+        return True
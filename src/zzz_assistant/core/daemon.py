@@ -0,0 +1,452 @@
+"""
+常驻模式
+
+`python main.py --daemon` 启动后一直运行：设备连接、模板缓存、每台设备的Navigator（页面跳转图、缩放校准）
+都保留在内存里，通过本机的HTTP接口接收任务，每台设备一个队列按顺序执行。定时任务只需要
+`python main.py --submit LoginTask`，提交完立刻返回，不用每次都重新加载配置、连接设备、预热模板。
+
+HTTP接口（只监听本机，请求和响应都是JSON）：
+    GET  /status           守护进程和每台设备的状态
+    GET  /jobs             最近的任务
+    GET  /jobs/<id>        某个任务的状态
+    POST /jobs             提交任务：{"task": "LoginTask", "device": "MuMu-1"}，不指定device时提交到所有设备
+    POST /shutdown         执行完正在运行的任务后退出
+    GET  /metrics          Prometheus文本格式的性能指标
+"""
+import itertools
+import json
+import queue
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import OrderedDict
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from src.zzz_assistant.core.device import Device
+from src.zzz_assistant.core.metrics import metrics
+from src.zzz_assistant.core.navigator import Navigator
+from src.zzz_assistant.core.orchestrator import DEFAULT_MAX_CONCURRENT_CAPTURES, DeviceSpec
+from src.zzz_assistant.core.recognition import DEFAULT_RECOGNITION_WORKERS, RecognitionEngine
+from src.zzz_assistant.core.template_registry import template_registry
+from src.zzz_assistant.tasks.base_task import BaseTask
+from src.zzz_assistant.tasks.login import LoginTask
+from src.zzz_assistant.utils.log import get_logger
+
+logger = get_logger(__name__)
+
+DEFAULT_DAEMON_HOST = '127.0.0.1'
+DEFAULT_DAEMON_PORT = 8765
+# 最多保留多少个已结束的任务供查询
+MAX_FINISHED_JOBS = 200
+# 客户端请求的超时时间（秒）
+CLIENT_TIMEOUT = 5.0
+# 请求体的最大长度（字节）
+MAX_REQUEST_SIZE = 64 * 1024
+
+# 【【【可以通过接口提交的任务类都注册到这里】】】
+TASK_CLASSES: dict[str, type[BaseTask]] = {task_class.__name__: task_class for task_class in [
+    LoginTask,
+]}
+
+# 任务状态
+JOB_QUEUED = 'queued'
+JOB_RUNNING = 'running'
+JOB_SUCCEEDED = 'succeeded'
+JOB_FAILED = 'failed'
+JOB_CANCELLED = 'cancelled'
+
+
+class Job:
+    """
+    提交给守护进程的一个任务
+
+    id(int): 任务编号
+    task(str): 任务类名，见TASK_CLASSES
+    device(str): 设备名称
+    status(str): 状态，JOB_QUEUED / JOB_RUNNING / JOB_SUCCEEDED / JOB_FAILED / JOB_CANCELLED
+    error(str | None): 失败原因
+    """
+    def __init__(self, job_id: int, task: str, device: str):
+        self.id = job_id
+        self.task = task
+        self.device = device
+        self.status = JOB_QUEUED
+        self.error: str | None = None
+        self.submitted_at = time.time()
+        self.started_at: float | None = None
+        self.finished_at: float | None = None
+
+    @property
+    def finished(self) -> bool:
+        return self.status in (JOB_SUCCEEDED, JOB_FAILED, JOB_CANCELLED)
+
+    def to_dict(self) -> dict:
+        return {
+            'id': self.id, 'task': self.task, 'device': self.device, 'status': self.status, 'error': self.error,
+            'submitted_at': self.submitted_at, 'started_at': self.started_at, 'finished_at': self.finished_at,
+        }
+
+
+class DeviceWorker:
+    """
+    一台设备的任务队列和执行线程
+
+    设备连接和Navigator（上一个任务停在哪个页面、页面跳转图、缩放校准）在多次任务之间一直保留；
+    连接断开（或一开始没连上）时，下一个任务开始前会重新连接。
+    """
+
+    def __init__(self, spec: DeviceSpec, config: dict, engine: RecognitionEngine,
+                 capture_limiter: threading.Semaphore):
+        self.spec = spec
+        self.config = config
+        self.engine = engine
+        self.device = Device(device_serial=spec.serial, capture_method=spec.capture, input_method=spec.input,
+                             maatouch_path=config.get('emulator', {}).get('maatouch_path'),
+                             adb_config=config.get('adb'))
+        self.device.capture_limiter = capture_limiter
+        self.navigator = Navigator(device=self.device, config=config, engine=engine)
+        self.current: Job | None = None
+        self._queue: queue.Queue[Job | None] = queue.Queue()
+        self._queued: list[Job] = []
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name=f"daemon-{spec.name}", daemon=True)
+
+    @property
+    def connected(self) -> bool:
+        return self.device.device is not None
+
+    def start(self):
+        self._thread.start()
+
+    def submit(self, job: Job):
+        """把任务放进队列"""
+        with self._lock:
+            self._queued.append(job)
+        self._queue.put(job)
+
+    def find_queued(self, task: str) -> Job | None:
+        """队列里还没开始的同名任务"""
+        with self._lock:
+            return next((job for job in self._queued if job.task == task), None)
+
+    def queued(self) -> list[Job]:
+        with self._lock:
+            return list(self._queued)
+
+    def stop(self):
+        """取消还没开始的任务，执行完当前任务后退出"""
+        with self._lock:
+            for job in self._queued:
+                job.status = JOB_CANCELLED
+                job.finished_at = time.time()
+            self._queued.clear()
+        self._queue.put(None)
+
+    def join(self):
+        self._thread.join()
+        self.device.close()
+        self.navigator.close()
+
+    def to_dict(self) -> dict:
+        return {
+            'name': self.spec.name, 'serial': self.spec.serial, 'connected': self.connected,
+            'current': self.current.to_dict() if self.current is not None else None,
+            'queued': [job.id for job in self.queued()],
+            'connection': self.device.connection.to_dict() if self.device.connection is not None else None,
+        }
+
+    def _run(self):
+        # 启动时先连上设备，第一个任务来的时候就不用再等
+        self._ensure_connected()
+        while (job := self._queue.get()) is not None:
+            with self._lock:
+                if job not in self._queued:
+                    # 已经被取消
+                    continue
+                self._queued.remove(job)
+            self._execute(job)
+
+    def _execute(self, job: Job):
+        self.current = job
+        job.status = JOB_RUNNING
+        job.started_at = time.time()
+        logger.info("【%s】开始执行任务#%d：%s", self.spec.name, job.id, job.task)
+        try:
+            if not self._ensure_connected():
+                job.status, job.error = JOB_FAILED, "无法连接设备"
+                return
+            task = TASK_CLASSES[job.task](device=self.device, config=self.config, engine=self.engine,
+                                          navigator=self.navigator)
+            job.status = JOB_SUCCEEDED if task.execute() else JOB_FAILED
+        except Exception as e:
+            logger.exception("【%s】执行任务#%d时发生错误：%s", self.spec.name, job.id, e)
+            job.status, job.error = JOB_FAILED, f"{type(e).__name__}: {e}"
+        finally:
+            job.finished_at = time.time()
+            self.current = None
+            metrics.inc('daemon.jobs', device=self.spec.serial, task=job.task, status=job.status)
+            logger.info("【%s】任务#%d（%s）结束：%s，耗时%.1f秒", self.spec.name, job.id, job.task, job.status,
+                        job.finished_at - job.started_at)
+
+    def _ensure_connected(self) -> bool:
+        if self.connected:
+            return True
+        if not self.device.connect():
+            logger.error("【%s】无法连接，稍后提交的任务会再次尝试。", self.spec.name)
+            return False
+        return True
+
+
+class AssistantDaemon:
+    """
+    常驻的任务守护进程：每台设备一个DeviceWorker，所有设备共用一个识别引擎，
+    再加一个只监听本机的HTTP服务器接收任务
+    """
+
+    def __init__(self, config: dict):
+        self.config = config
+        daemon_config = config.get('daemon', {}) or {}
+        self.host = daemon_config.get('host', DEFAULT_DAEMON_HOST)
+        self.port = daemon_config.get('port', DEFAULT_DAEMON_PORT)
+        self.started_at = time.time()
+
+        orchestrator_config = config.get('orchestrator', {})
+        max_captures = orchestrator_config.get('max_concurrent_captures', DEFAULT_MAX_CONCURRENT_CAPTURES)
+        vision_workers = config.get('vision', {}).get('recognition_workers', DEFAULT_RECOGNITION_WORKERS)
+        self.engine = RecognitionEngine(max_workers=vision_workers)
+        capture_limiter = threading.BoundedSemaphore(max(1, max_captures))
+        self.workers: OrderedDict[str, DeviceWorker] = OrderedDict(
+            (spec.name, DeviceWorker(spec, config, self.engine, capture_limiter))
+            for spec in DeviceSpec.from_config(config))
+
+        self._ids = itertools.count(1)
+        self._jobs: OrderedDict[int, Job] = OrderedDict()
+        self._lock = threading.Lock()
+        self._server: ThreadingHTTPServer | None = None
+
+    def serve_forever(self):
+        """启动设备线程和HTTP服务器，一直运行到收到/shutdown或Ctrl+C"""
+        self._server = ThreadingHTTPServer((self.host, self.port), _ApiHandler)
+        self._server.daemon_threads = True
+        self._server.assistant = self
+        # 预热：连接设备的同时在后台解码所有模板
+        threading.Thread(target=template_registry.preload, name="warm-start", daemon=True).start()
+        for worker in self.workers.values():
+            worker.start()
+        logger.info("守护进程已启动：http://%s:%d，%d台设备，可提交的任务：%s",
+                    self.host, self.port, len(self.workers), ", ".join(TASK_CLASSES))
+        try:
+            self._server.serve_forever()
+        except KeyboardInterrupt:
+            logger.info("收到Ctrl+C")
+        finally:
+            self._server.server_close()
+            self._stop_workers()
+
+    def shutdown(self):
+        """让serve_forever()返回（可以在任意线程里调用）"""
+        if self._server is not None:
+            threading.Thread(target=self._server.shutdown, name="daemon-shutdown", daemon=True).start()
+
+    def submit(self, task: str, device: str | None = None) -> list[Job]:
+        """
+        提交任务
+        :param task: 任务类名，见TASK_CLASSES
+        :param device: 设备名称或序列号，为None时提交到所有设备
+        :return: 每台设备上对应的任务。设备的队列里已经有一个还没开始的同名任务时，返回那个任务，
+                 定时任务重复触发时队列不会越积越多
+        :raise ValueError: 任务或设备不存在
+        """
+        if task not in TASK_CLASSES:
+            raise ValueError(f"未知的任务：{task}，可选：{', '.join(TASK_CLASSES)}")
+        if device is None:
+            workers = list(self.workers.values())
+        else:
+            workers = [worker for worker in self.workers.values() if device in (worker.spec.name, worker.spec.serial)]
+            if not workers:
+                raise ValueError(f"未知的设备：{device}，可选：{', '.join(self.workers)}")
+        jobs = []
+        for worker in workers:
+            with self._lock:
+                job = worker.find_queued(task)
+                if job is None:
+                    job = Job(next(self._ids), task, worker.spec.name)
+                    self._jobs[job.id] = job
+                    self._prune_jobs()
+                    worker.submit(job)
+            jobs.append(job)
+        return jobs
+
+    def job(self, job_id: int) -> Job | None:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def jobs(self) -> list[Job]:
+        with self._lock:
+            return list(self._jobs.values())
+
+    def status(self) -> dict:
+        return {
+            'started_at': self.started_at,
+            'uptime': time.time() - self.started_at,
+            'tasks': list(TASK_CLASSES),
+            'devices': [worker.to_dict() for worker in self.workers.values()],
+        }
+
+    def _stop_workers(self):
+        for worker in self.workers.values():
+            worker.stop()
+        running = [worker.spec.name for worker in self.workers.values() if worker.current is not None]
+        if running:
+            logger.info("等待正在执行的任务结束：%s", ", ".join(running))
+        for worker in self.workers.values():
+            worker.join()
+        self.engine.shutdown()
+        logger.info("守护进程已退出")
+
+    def _prune_jobs(self):
+        """只保留最近MAX_FINISHED_JOBS个已结束的任务，没结束的都保留"""
+        finished = [job_id for job_id, job in self._jobs.items() if job.finished]
+        for job_id in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+            del self._jobs[job_id]
+
+
+class _ApiHandler(BaseHTTPRequestHandler):
+    """守护进程的HTTP接口"""
+    server_version = "ZZZAssistant"
+
+    @property
+    def assistant(self) -> AssistantDaemon:
+        return self.server.assistant
+
+    def do_GET(self):
+        path = self.path.rstrip('/')
+        if path == '/status':
+            self._reply(HTTPStatus.OK, self.assistant.status())
+        elif path == '/jobs':
+            self._reply(HTTPStatus.OK, {'jobs': [job.to_dict() for job in self.assistant.jobs()]})
+        elif path.startswith('/jobs/') and path[len('/jobs/'):].isdigit():
+            job = self.assistant.job(int(path[len('/jobs/'):]))
+            if job is None:
+                self._reply(HTTPStatus.NOT_FOUND, {'error': f"任务{path[len('/jobs/'):]}不存在"})
+            else:
+                self._reply(HTTPStatus.OK, job.to_dict())
+        elif path == '/metrics':
+            self._reply_text(HTTPStatus.OK, metrics.to_prometheus())
+        else:
+            self._reply(HTTPStatus.NOT_FOUND, {'error': f"未知的接口：{self.path}"})
+
+    def do_POST(self):
+        path = self.path.rstrip('/')
+        # 只接受JSON：浏览器里的网页不能不经预检就发出这种请求，避免被本机打开的网页随意调用
+        if self.headers.get('Content-Type', '').split(';')[0].strip() != 'application/json':
+            self._reply(HTTPStatus.UNSUPPORTED_MEDIA_TYPE, {'error': "请求体必须是application/json"})
+            return
+        try:
+            length = int(self.headers.get('Content-Length') or 0)
+        except ValueError:
+            length = -1
+        if length < 0:
+            self._reply(HTTPStatus.BAD_REQUEST, {'error': "Content-Length无效"})
+            return
+        if length > MAX_REQUEST_SIZE:
+            self._reply(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, {'error': "请求体过大"})
+            return
+        try:
+            body = json.loads(self.rfile.read(length) or b'{}')
+        except ValueError as e:
+            self._reply(HTTPStatus.BAD_REQUEST, {'error': f"无法解析请求体：{e}"})
+            return
+        if not isinstance(body, dict):
+            self._reply(HTTPStatus.BAD_REQUEST, {'error': "请求体必须是JSON对象"})
+            return
+
+        if path == '/jobs':
+            task, device = body.get('task'), body.get('device')
+            if not isinstance(task, str) or not (device is None or isinstance(device, str)):
+                self._reply(HTTPStatus.BAD_REQUEST, {'error': "task必须是字符串，device必须是字符串或null"})
+                return
+            try:
+                jobs = self.assistant.submit(task, device)
+            except ValueError as e:
+                self._reply(HTTPStatus.BAD_REQUEST, {'error': str(e)})
+                return
+            self._reply(HTTPStatus.ACCEPTED, {'jobs': [job.to_dict() for job in jobs]})
+        elif path == '/shutdown':
+            self._reply(HTTPStatus.ACCEPTED, {})
+            self.assistant.shutdown()
+        else:
+            self._reply(HTTPStatus.NOT_FOUND, {'error': f"未知的接口：{self.path}"})
+
+    def log_message(self, format, *args):
+        # 默认写到stderr，改为走日志
+        logger.debug("%s %s", self.address_string(), format % args)
+
+    def _reply(self, status: HTTPStatus, body: dict):
+        self._send(status, json.dumps(body, ensure_ascii=False).encode('utf-8'), 'application/json; charset=utf-8')
+
+    def _reply_text(self, status: HTTPStatus, text: str):
+        self._send(status, text.encode('utf-8'), 'text/plain; version=0.0.4; charset=utf-8')
+
+    def _send(self, status: HTTPStatus, data: bytes, content_type: str):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+class DaemonClient:
+    """
+    守护进程的客户端（只用标准库，不导入OpenCV等，提交完立刻返回）
+    """
+
+    def __init__(self, config: dict):
+        daemon_config = config.get('daemon', {}) or {}
+        host = daemon_config.get('host', DEFAULT_DAEMON_HOST)
+        # 监听所有网卡时，从本机连接
+        if host in ('', '0.0.0.0'):
+            host = DEFAULT_DAEMON_HOST
+        self.base_url = f"http://{host}:{daemon_config.get('port', DEFAULT_DAEMON_PORT)}"
+
+    def submit(self, task: str, device: str | None = None) -> list[dict]:
+        """
+        :return: 每台设备上对应的任务（Job.to_dict()）
+        """
+        return self._request('POST', '/jobs', {'task': task, 'device': device})['jobs']
+
+    def status(self) -> dict:
+        return self._request('GET', '/status')
+
+    def job(self, job_id: int) -> dict:
+        return self._request('GET', f'/jobs/{job_id}')
+
+    def shutdown(self):
+        self._request('POST', '/shutdown', {})
+
+    def _request(self, method: str, path: str, body: dict | None = None) -> dict:
+        """
+        :raise ConnectionError: 守护进程没有运行
+        :raise ValueError: 守护进程拒绝了请求（例如任务或设备不存在）
+        """
+        data = json.dumps(body).encode('utf-8') if body is not None else None
+        request = urllib.request.Request(self.base_url + path, data=data, method=method,
+                                         headers={'Content-Type': 'application/json'})
+        try:
+            with urllib.request.urlopen(request, timeout=CLIENT_TIMEOUT) as response:
+                return json.loads(response.read() or b'{}')
+        except urllib.error.HTTPError as e:
+            try:
+                message = json.loads(e.read()).get('error', e.reason)
+            except ValueError:
+                message = e.reason
+            raise ValueError(message) from None
+        except (urllib.error.URLError, OSError) as e:
+            raise ConnectionError(f"无法连接守护进程{self.base_url}（是否已用--daemon启动？）：{e}") from None
+
+
+def run_daemon(config: dict):
+    """启动守护进程，一直运行到收到/shutdown或Ctrl+C"""
+    AssistantDaemon(config).serve_forever()
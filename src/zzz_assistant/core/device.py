@@ -1,7 +1,29 @@
-import adbutils
-from adbutils import AdbDevice, AdbError
+from __future__ import annotations
+
+import threading
 import time
 
+from src.zzz_assistant.core.capture import CAPTURE_METHODS, CaptureBackend, FrameProducer, ScreencapBackend, \
+    ScreencapStreamBackend
+from src.zzz_assistant.core.calibration import DeviceCalibration
+from src.zzz_assistant.core.connection import AdbConnection
+from src.zzz_assistant.core.flight_recorder import flight_recorder
+from src.zzz_assistant.core.frame import Frame
+from src.zzz_assistant.core.input import INPUT_METHODS, Gesture, InputChannel, create_input_channel
+from src.zzz_assistant.core.metrics import metrics
+from src.zzz_assistant.utils.lazy_import import lazy_import
+from src.zzz_assistant.utils.log import get_logger
+
+# adbutils导入较慢（会连带导入requests等），第一次连接设备时才导入
+adbutils = lazy_import('adbutils')
+
+# 启动游戏后最多等待多久让它切到前台（秒），切到前台后立刻返回
+START_GAME_TIMEOUT = 5.0
+# 检查前台应用的间隔（秒）
+FOREGROUND_POLL_INTERVAL = 0.2
+
+logger = get_logger(__name__)
+
 
 class Device:
     """
@@ -11,17 +33,49 @@ class Device:
     就能使用所有这些功能，而不用关心底层的adb命令细节
     """
 
-    def __init__(self, device_serial: str):
+    def __init__(self,
+                 device_serial: str,
+                 capture_method: str = 'screencap',
+                 input_method: str = 'shell',
+                 maatouch_path: str | None = None,
+                 adb_config: dict | None = None):
         """
         初始化设备控制器
 
         Args:
             device_serial (str): 设备的序列号（例如 '127.0.0.1:5555')。
                                 这个值我们从config.yaml文件中获取。
+            capture_method (str): 截图方式，'screencap'为每次截图单独请求，
+                                'stream'为常驻连接+后台线程持续截图。对应配置文件中的emulator.capture。
+            input_method (str): 输入方式，'adb'为每次点击单独执行input命令，'shell'为常驻shell连接，
+                                'maatouch'为常驻MaaTouch进程直接注入触摸事件。对应配置文件中的emulator.input。
+            maatouch_path (str | None): 本地的MaaTouch文件路径，只有maatouch输入方式需要。
+            adb_config (dict | None): 配置文件中的adb部分（adb server地址、健康检查间隔、重连等待时间），见connection.py。
         """
+        if capture_method not in CAPTURE_METHODS:
+            raise ValueError(f"未知的截图方式：{capture_method}，可选：{CAPTURE_METHODS}")
+        if input_method not in INPUT_METHODS:
+            raise ValueError(f"未知的输入方式：{input_method}，可选：{INPUT_METHODS}")
         self.serial: str = device_serial
-        self.device: AdbDevice | None = None
+        self.capture_method = capture_method
+        self.device: adbutils.AdbDevice | None = None
         # 用来存储连接后的设备对象，初始为None。
+        self.adb_config = adb_config
+        # 连接管理：所有adb操作都经过它，断线时自动重连（见connection.py）
+        self.connection: AdbConnection | None = None
+        self.capture: CaptureBackend | None = None
+        self.input_method = input_method
+        self.maatouch_path = maatouch_path
+        self.input: InputChannel | None = None
+        # 多设备运行时由Orchestrator设置，用来限制同一台主机上同时进行的截图数量
+        self.capture_limiter: threading.Semaphore | None = None
+        # 截图、点击次数，用于统计每台设备的吞吐
+        self.frames_captured = 0
+        self.clicks = 0
+        # 界面缩放校准：截图上的设计坐标和屏幕坐标怎么换算（见calibration.py）
+        self.calibration = DeviceCalibration(device_serial)
+        # 最近一次截图的屏幕尺寸 (宽, 高)，点击时用来换算坐标
+        self.screen_size: tuple[int, int] | None = None
 
 
 
@@ -32,87 +86,190 @@ class Device:
             bool: 连接成功返回True，失败返回False
         """
         try:
-            print(f"尝试连接设备：{self.serial}...")
+            logger.info("尝试连接设备：%s...", self.serial)
+            self.close()
+            self.connection = AdbConnection.from_config(self.serial, self.adb_config)
             # 后续self.device.* 就等价于adbutiles.device.*
-            self.device = adbutils.device(serial=self.serial)
+            self.device = self.connection.device
 
             # 检查设备是否真的在线
-            if self.device.prop.model:
-                print(f"成功连接到：{self.device.prop.model}")
+            model = self.connection.connect() and self.connection.call('getprop', lambda: self.device.prop.model)
+            if model:
+                logger.info("成功连接到：%s", model)
+                self.capture = self._create_capture()
+                self.input = create_input_channel(self.input_method, self.device, self.maatouch_path)
                 return True
             else:
-                print(f"Warning: 设备{self.serial}似乎离线。")
-                self.device = None
+                logger.warning("设备%s似乎离线。", self.serial)
+                self.close()
                 return False
 
-        except AdbError as e:
-            print(f"Error: 连接设备时发生ADB错误：{e}")
-            self.device = None
+        except (adbutils.AdbError, OSError) as e:
+            logger.error("连接设备时发生ADB错误：%s", e)
+            self.close()
             return False
         except Exception as e:
-            print(f"Error: 连接时发生未知错误：{e}")
-            self.device = None
+            logger.exception("连接时发生未知错误：%s", e)
+            self.close()
             return False
 
 
 
-    def screenshot(self) -> bytes | None:
+    def screenshot(self) -> Frame | None:
         """
         获取当前屏幕截图
-        :return: 截图的字节数据可用于OpenCV处理，如果失败则返回None
+        :return: 直接持有像素数组的Frame对象，如果失败则返回None
         """
         if not self.device:
-            print("Error: 设备未连接，无法截图！")
+            logger.error("设备未连接，无法截图！")
             return None
 
         try:
-            # Pillow Image -> bytes
-            # adbutils给的是一个Pillow对象，而我们后续的图像处理（用OpenCV）或者保存文件，
-            # 都需要的是纯粹的、格式化的图片字节流（bytes）。这个四步法就是个标准的“格式转换”流程
-            # 【固定流程，可作结论】
-            from io import BytesIO
+            # 直接读取screencap的原始像素（不带-p参数），省掉了
+            # “设备端PNG编码 -> PIL解码 -> 再编码PNG -> OpenCV再解码”这一整套来回转换
+            # 具体怎么截图由截图后端决定（见capture.py）
+            # 断线时会等重连成功后再截图（见connection.py）
+            with metrics.bind(device=self.serial), metrics.span('device.screenshot', method=self.capture_method):
+                if self.capture_limiter is not None:
+                    # 正在重连时先在名额外面等，不要占着名额挡住其他设备
+                    self.connection.wait_until_connected()
+                    # 等待主机级截图名额的时间单独统计，方便看出是不是被其他设备挤占了
+                    with metrics.span('device.capture_wait'):
+                        self.capture_limiter.acquire()
+                    try:
+                        frame = self.connection.call('screencap', self.capture.grab)
+                    finally:
+                        self.capture_limiter.release()
+                else:
+                    frame = self.connection.call('screencap', self.capture.grab)
+            if frame is not None:
+                self.frames_captured += 1
+                self.screen_size = frame.size
+                frame = frame.with_transform(self.calibration.transform_for(frame.size))
+            return frame
+
+        except (adbutils.AdbError, OSError, EOFError) as e:
+            logger.error("截图时发生ADB错误：%s", e)
+            return None
 
-            # 1. 从设备获取截图，得到一个 Pillow Image 对象
-            pil_image = self.device.screenshot()
+        # 后续会添加click等方法，MaaTouch也会在这里进行
 
-            # 2. 创建一个内存中的二进制流对象
-            img_buffer = BytesIO()
 
-            # 3. 使用Pillow的save方法，将图像以PNG格式写入到内存流中
-            pil_image.save(img_buffer, format='PNG')
 
-            # 4. 从内存流中获取完整的PNG文件的字节数据
-            png_bytes = img_buffer.getvalue()
-            return png_bytes
+    def close(self):
+        """
+        释放截图后端占用的连接和后台线程，停止健康检查和重连
+        """
+        if self.capture is not None:
+            self.capture.close()
+            self.capture = None
+        if self.input is not None:
+            self.input.close()
+            self.input = None
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+        self.device = None
 
-        except AdbError as e:
-            print(f"Error: 截图时发生ADB错误：{e}")
-            return None
 
-        # 后续会添加click等方法，MaaTouch也会在这里进行
+
+    def _create_capture(self) -> CaptureBackend:
+        """
+        按配置创建截图后端
+        """
+        if self.capture_method == 'stream':
+            logger.info("使用常驻连接+后台线程的流式截图。")
+            return FrameProducer(ScreencapStreamBackend(self.device), connection=self.connection)
+        return ScreencapBackend(self.device)
 
 
 
     def click(self, x: int, y: int):
         """
         点击操作
-        :param x: 点击位置的x坐标
-        :param y: 点击位置的y坐标
+        :param x: 点击位置的x坐标（设计分辨率，和模板匹配的结果一致）
+        :param y: 点击位置的y坐标（设计分辨率）
         """
         if not self.device:
-            print("Error: 设备未连接，无法点击！")
+            logger.error("设备未连接，无法点击！")
             return
 
         try:
-            print(f"在坐标({x}, {y})执行点击")
+            screen_x, screen_y = self.to_screen(x, y)
+            logger.debug("在坐标(%d, %d)执行点击（屏幕坐标(%d, %d)）", x, y, screen_x, screen_y)
+
+            # 具体怎么把点击送到设备上由输入通道决定（见input.py）
+            with metrics.span('device.click', device=self.serial, method=self.input_method):
+                self.connection.call('input', self.input.tap, screen_x, screen_y)
+            self.clicks += 1
+            flight_recorder.note('click', (x, y), device=self.serial)
+        except (adbutils.AdbError, OSError, EOFError) as e:
+            logger.error("点击时发生adb错误：%s", e)
+        except Exception as e:
+            logger.exception("点击时发生未知错误：%s", e)
+
+
+
+    def swipe(self, x1: int, y1: int, x2: int, y2: int, duration_ms: int = 300):
+        """
+        滑动操作（坐标都是设计分辨率下的）
+        :param x1: 起点x坐标
+        :param y1: 起点y坐标
+        :param x2: 终点x坐标
+        :param y2: 终点y坐标
+        :param duration_ms: 滑动时长（毫秒）
+        """
+        self.gesture(Gesture.swipe(*self.to_screen(x1, y1), *self.to_screen(x2, y2), duration_ms), 'swipe')
+
+
+
+    def long_press(self, x: int, y: int, duration_ms: int = 1000):
+        """
+        长按操作（坐标是设计分辨率下的）
+        :param x: 长按位置的x坐标
+        :param y: 长按位置的y坐标
+        :param duration_ms: 按住的时长（毫秒）
+        """
+        self.gesture(Gesture.long_press(*self.to_screen(x, y), duration_ms), 'long_press')
+
+
+
+    def gesture(self, gesture: Gesture, name: str = 'gesture'):
+        """
+        执行一段多步触控脚本（见input.Gesture），整段脚本一次性发给设备
+        :param gesture: 触控脚本，坐标是设备屏幕坐标（可以用to_screen()从设计坐标换算）
+        :param name: 操作名称，用于日志和指标
+        """
+        if not self.device:
+            logger.error("设备未连接，无法执行%s！", name)
+            return
 
-            # adbutils
-            self.device.click(x, y)
-            print("点击完成。")
-        except AdbError as e:
-            print(f"Error: 点击时发生adb错误：{e}")
+        try:
+            logger.debug("执行%s：%s", name, gesture)
+            with metrics.span('device.gesture', device=self.serial, method=self.input_method, gesture=name):
+                self.connection.call('input', self.input.run, gesture)
+            flight_recorder.note(name, device=self.serial)
+        except (adbutils.AdbError, OSError, EOFError) as e:
+            logger.error("执行%s时发生adb错误：%s", name, e)
         except Exception as e:
-            print(f"Error: 点击时发生未知错误：{e}")
+            logger.exception("执行%s时发生未知错误：%s", name, e)
+
+
+
+    def to_screen(self, x: int, y: int) -> tuple[int, int]:
+        """
+        把设计分辨率下的坐标换算成设备屏幕坐标（使用这台设备校准过的缩放比例）
+        还没截过图时先查询一次屏幕尺寸
+        """
+        if self.screen_size is None and self.device is not None:
+            try:
+                self.screen_size = tuple(self.connection.call('window_size', self.device.window_size))
+            except Exception as e:
+                logger.warning("获取屏幕尺寸失败，按设计分辨率点击：%s", e)
+                return x, y
+        if self.screen_size is None:
+            return x, y
+        return self.calibration.transform_for(self.screen_size).to_screen(x, y)
 
 
 
@@ -123,42 +280,71 @@ class Device:
         :return: 如果游戏在前台，返回True，否则返回False
         """
         if not self.device:
-            print("Error: 设备未连接，无法检查前台应用！")
+            logger.error("设备未连接，无法检查前台应用！")
             return False
 
         try:
-            current_app = self.device.app_current()
+            current_app = self.connection.call('app_current', self.device.app_current)
             if current_app.package == package_name:
-                print(f"游戏{package_name}正在前台运行。")
+                logger.info("游戏%s正在前台运行。", package_name)
                 return True
             else:
-                print(f"当前前台应用是{current_app.package}，不是{package_name}。")
+                logger.info("当前前台应用是%s，不是%s。", current_app.package, package_name)
                 return False
-        except AdbError as e:
-            print(f"Error: 检查前台应用时发生ADB错误：{e}")
+        except (adbutils.AdbError, OSError) as e:
+            logger.error("检查前台应用时发生ADB错误：%s", e)
             return False
         except Exception as e:
-            print(f"Error: 检查前台应用时发生未知错误：{e}")
+            logger.exception("检查前台应用时发生未知错误：%s", e)
             return False
 
 
 
-    def start_game(self, package_name: str) -> bool:
+    def start_game(self, package_name: str, timeout: float = START_GAME_TIMEOUT) -> bool:
         """
-        启动指定的应用
-        :param package_name:
+        启动指定的应用，并等待它切到前台
+        :param package_name: 游戏的包名
+        :param timeout: 最长等待时间（秒），游戏一切到前台就立刻返回
         :return:成功返回True，失败返回False
         """
         if not self.device:
-            print("Error: 设备未连接，无法启动游戏！")
+            logger.error("设备未连接，无法启动游戏！")
             return False
 
         try:
-            print(f"尝试启动游戏：{package_name}...")
-            self.device.app_start(package_name)
-            time.sleep(5)
-            print(f"启动命令已发送，等待5秒后检查游戏是否启动。")
+            logger.info("尝试启动游戏：%s...", package_name)
+            with metrics.span('device.start_game', device=self.serial) as span:
+                self.connection.call('app_start', self.device.app_start, package_name)
+                in_foreground = self.wait_for_app(package_name, timeout)
+                span.set(result='foreground' if in_foreground else 'timeout')
+            if in_foreground:
+                logger.info("游戏%s已切到前台。", package_name)
+            else:
+                logger.warning("启动命令已发送，但%s秒内游戏没有切到前台。", timeout)
             return True
-        except AdbError as e:
-            print(f"Error: 启动游戏时发生ADB错误：{e}")
+        except (adbutils.AdbError, OSError) as e:
+            logger.error("启动游戏时发生ADB错误：%s", e)
             return False
+
+
+
+    def wait_for_app(self, package_name: str, timeout: float, interval: float = FOREGROUND_POLL_INTERVAL) -> bool:
+        """
+        等待指定的应用切到前台
+        :param package_name: 应用包名
+        :param timeout: 最长等待时间（秒）
+        :param interval: 两次检查之间的间隔（秒）
+        :return: 超时前切到了前台返回True，否则False
+        """
+        deadline = time.time() + timeout
+        while True:
+            try:
+                if self.connection.call('app_current', self.device.app_current).package == package_name:
+                    return True
+            except adbutils.AdbError:
+                # 应用切换的瞬间可能取不到前台应用，下一次再试
+                pass
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                return False
+            time.sleep(min(interval, remaining))
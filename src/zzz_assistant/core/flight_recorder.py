@@ -0,0 +1,307 @@
+from __future__ import annotations
+
+import json
+import os
+import queue
+import shutil
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from pathlib import Path
+
+from src.zzz_assistant.core.frame import Frame
+from src.zzz_assistant.core.metrics import metrics
+from src.zzz_assistant.utils.lazy_import import lazy_import
+from src.zzz_assistant.utils.log import get_logger
+from src.zzz_assistant.utils.paths import PROJECT_ROOT
+
+cv2 = lazy_import('cv2')
+np = lazy_import('numpy')
+logger = get_logger(__name__)
+
+DEBUG_PATH = PROJECT_ROOT / "debug"
+
+# 每台设备的环形缓冲区默认保留最近多少帧（720P的BGR图每帧约2.6MB）
+DEFAULT_CAPACITY = 10
+# 同一个原因两次转储之间至少间隔多少秒，间隔内的转储请求直接丢弃
+DEFAULT_MIN_DUMP_INTERVAL = 30.0
+# debug/下最多保留多少次转储，超出后删除最旧的
+DEFAULT_MAX_DUMPS = 20
+# find_template的debug_mode单帧保存放在debug/下的这个子目录里，单独计数，不会挤掉出错时的转储
+FRAME_DUMP_DIR = "matches"
+# debug/matches/下最多保留多少帧
+DEFAULT_MAX_FRAME_DUMPS = 50
+# 每帧最多保留多少条匹配结果和操作，画面长时间不变（加载中）时只留最近的
+MAX_RECORDS_PER_FRAME = 64
+# 后台写盘队列的长度，写不过来时丢弃新的请求，不阻塞识别
+WRITER_QUEUE_SIZE = 4
+
+
+class FlightEntry:
+    """
+    环形缓冲区中的一帧画面，以及在这帧上做过的所有匹配和操作
+
+    timestamp(float): 第一次记录这帧的时间
+    device(str | None): 设备序列号（取自metrics.bind()绑定的device标签）
+    content_hash(bytes): 画面内容哈希（Frame.content_hash），像素完全相同的连续画面合并成同一条
+    image(np.ndarray): 画面（和Frame共享，不拷贝）
+    transform(ScreenTransform | None): image是原始截图时，写盘前用它取出设计画面；为None表示image已经是设计画面
+    matches(deque[tuple]): (模板键, 相似度, 左上角, 尺寸, 阈值)
+    notes(deque[tuple]): (时间, 说明, 坐标或None)，例如点击
+    """
+    __slots__ = ('timestamp', 'device', 'content_hash', 'image', 'transform', 'matches', 'notes')
+
+    def __init__(self, device: str | None, content_hash: bytes, frame: Frame):
+        self.timestamp = time.time()
+        self.device = device
+        self.content_hash = content_hash
+        # 保存两者中较小的那个：屏幕比设计分辨率大时匹配已经用过缩放图，否则直接保存原始截图，都不用额外计算
+        if frame.transform.scale > 1:
+            self.image, self.transform = frame.scaled, None
+        else:
+            self.image, self.transform = frame.image, frame.transform
+        self.matches: deque[tuple] = deque(maxlen=MAX_RECORDS_PER_FRAME)
+        self.notes: deque[tuple] = deque(maxlen=MAX_RECORDS_PER_FRAME)
+
+
+class FlightRecorder:
+    """
+    调试用的“黑匣子”
+
+    正常运行时只把最近的画面和匹配结果放进内存里的环形缓冲区（每台设备一个，只是保存引用，不编码、不写盘），
+    只有在出错时（登录失败、长时间停在未知页面等）才调用dump()，把缓冲区里的内容交给后台线程
+    画框、编码成PNG并写到debug/下的一个目录里，同时写一份index.json记录每帧的匹配分数和操作。
+    同一个原因的转储有最小间隔，debug/下也只保留最近的若干次转储，不会被调试图片塞满。
+    """
+
+    def __init__(self,
+                 capacity: int = DEFAULT_CAPACITY,
+                 output_dir: str | os.PathLike = DEBUG_PATH,
+                 min_dump_interval: float = DEFAULT_MIN_DUMP_INTERVAL,
+                 max_dumps: int = DEFAULT_MAX_DUMPS,
+                 max_frame_dumps: int = DEFAULT_MAX_FRAME_DUMPS):
+        self.enabled = True
+        self.output_dir = Path(output_dir)
+        self.min_dump_interval = min_dump_interval
+        self.max_dumps = max_dumps
+        self.max_frame_dumps = max_frame_dumps
+        self.dumps = 0
+        self.dropped = 0
+        self._capacity = max(1, capacity)
+        # 设备序列号 -> 这台设备的环形缓冲区，一台设备画面变化快也不会把其他设备的帧挤出去
+        self._entries: dict[str | None, deque[FlightEntry]] = {}
+        self._last_dump: dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._queue: queue.Queue = queue.Queue(maxsize=WRITER_QUEUE_SIZE)
+        self._writer: threading.Thread | None = None
+
+    @property
+    def capacity(self) -> int:
+        """每台设备保留的帧数"""
+        return self._capacity
+
+    @capacity.setter
+    def capacity(self, value: int):
+        with self._lock:
+            self._capacity = max(1, value)
+            self._entries = {device: deque(entries, maxlen=self._capacity)
+                             for device, entries in self._entries.items()}
+
+    def record_match(self, frame: Frame, match, threshold: float):
+        """
+        记录一次模板匹配（由vision.match_template调用）
+        :param match: MatchResult
+        :param threshold: 这次匹配使用的阈值，转储时用来区分是否匹配成功
+        """
+        if not self.enabled:
+            return
+        # 内容哈希在查匹配备忘录时已经算好缓存在帧上了，这里只是取引用
+        device = metrics.context_labels().get('device')
+        content_hash = frame.content_hash
+        with self._lock:
+            entry = self._entry(device, content_hash, frame)
+            entry.matches.append((match.key, match.score, match.top_left, match.size, threshold))
+
+    def note(self, text: str, point: tuple[int, int] | None = None, device: str | None = None):
+        """
+        在当前设备最近的一帧上记一笔操作，例如点击
+        :param point: 设计分辨率下的坐标，转储时会在图上标出来
+        :param device: 设备序列号，为None时取metrics.bind()绑定的device标签
+        """
+        if not self.enabled:
+            return
+        device = device if device is not None else metrics.context_labels().get('device')
+        with self._lock:
+            entries = self._entries.get(device)
+            if entries:
+                entries[-1].notes.append((time.time(), text, point))
+
+    def dump(self, reason: str, device: str | None = None) -> bool:
+        """
+        把缓冲区里的内容交给后台线程写盘
+        :param reason: 转储原因，也是目录名的一部分，例如 'login_failed'
+        :param device: 只转储这台设备的画面，为None时转储全部
+        :return: 是否真的安排了转储（关闭、缓冲区为空、间隔太短或写盘队列已满时返回False）
+        """
+        if not self.enabled:
+            return False
+        now = time.time()
+        with self._lock:
+            key = f"{reason}@{device}"
+            if now - self._last_dump.get(key, 0.0) < self.min_dump_interval:
+                return False
+            if device is None:
+                entries = sorted((entry for ring in self._entries.values() for entry in ring),
+                                 key=lambda entry: entry.timestamp)
+            else:
+                entries = list(self._entries.get(device, ()))
+            if not entries:
+                return False
+            self._last_dump[key] = now
+            # 拷贝列表，后台线程写盘时主线程还可以继续往里追加
+            snapshot = [(entry, list(entry.matches), list(entry.notes)) for entry in entries]
+        self._ensure_writer()
+        try:
+            self._queue.put_nowait((reason, device, now, snapshot, False))
+        except queue.Full:
+            self.dropped += 1
+            logger.warning("调试转储写不过来，丢弃了这次转储（%s）", reason)
+            return False
+        metrics.inc('flight_recorder.dumps', reason=reason)
+        logger.info("正在后台保存最近%d帧画面（%s）", len(snapshot), reason)
+        return True
+
+    def save_frame(self, frame: Frame, match, threshold: float):
+        """
+        立刻在后台保存一帧画面（find_template的debug_mode用），不受转储间隔限制，但写盘队列满时丢弃
+        保存到debug/matches/下，按max_frame_dumps单独清理
+        """
+        entry = FlightEntry(metrics.context_labels().get('device'), frame.content_hash, frame)
+        item = (match.key, match.score, match.top_left, match.size, threshold)
+        self._ensure_writer()
+        try:
+            self._queue.put_nowait((f"match_{match.key.split('/')[-1]}", entry.device, time.time(),
+                                    [(entry, [item], [])], True))
+        except queue.Full:
+            self.dropped += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._last_dump.clear()
+
+    def flush(self, timeout: float = 5.0):
+        """等待后台线程把已经安排的转储写完"""
+        deadline = time.time() + timeout
+        while self._queue.unfinished_tasks and time.time() < deadline:
+            time.sleep(0.05)
+
+    def _entry(self, device: str | None, content_hash: bytes, frame: Frame) -> FlightEntry:
+        """这台设备最近一帧的像素完全相同就合并进去，否则新建一条（调用方持有锁）"""
+        entries = self._entries.get(device)
+        if entries is None:
+            entries = self._entries[device] = deque(maxlen=self._capacity)
+        elif entries and entries[-1].content_hash == content_hash:
+            return entries[-1]
+        entry = FlightEntry(device, content_hash, frame)
+        entries.append(entry)
+        return entry
+
+    def _ensure_writer(self):
+        if self._writer is None:
+            with self._lock:
+                if self._writer is None:
+                    self._writer = threading.Thread(target=self._write_loop, name="flight-recorder", daemon=True)
+                    self._writer.start()
+
+    def _write_loop(self):
+        while True:
+            reason, device, timestamp, snapshot, single_frame = self._queue.get()
+            try:
+                if single_frame:
+                    output_dir, limit = self.output_dir / FRAME_DUMP_DIR, self.max_frame_dumps
+                else:
+                    output_dir, limit = self.output_dir, self.max_dumps
+                path = self._write(output_dir, reason, device, timestamp, snapshot)
+                self.dumps += 1
+                self._prune(output_dir, limit)
+                logger.info("已保存调试画面到%s", path)
+            except Exception as e:
+                logger.exception("保存调试画面时出错：%s", e)
+            finally:
+                self._queue.task_done()
+
+    def _write(self, output_dir: Path, reason: str, device: str | None, timestamp: float, snapshot: list) -> Path:
+        readable_time = datetime.fromtimestamp(timestamp).strftime("%Y-%m-%d_%H-%M-%S")
+        name = f"{readable_time}_{reason}" + (f"_{_safe_name(device)}" if device else "")
+        path = output_dir / _safe_name(name)
+        os.makedirs(path, exist_ok=True)
+        index = []
+        for i, (entry, matches, notes) in enumerate(snapshot):
+            image = entry.image if entry.transform is None else entry.transform.design_image(entry.image)
+            image = _annotate(image, matches, notes)
+            filename = f"{i:02d}_{datetime.fromtimestamp(entry.timestamp).strftime('%H-%M-%S.%f')[:-3]}.png"
+            # 使用imencode来处理中文路径问题
+            is_success, buffer = cv2.imencode('.png', image)
+            if is_success:
+                with open(path / filename, 'wb') as f:
+                    f.write(buffer)
+            index.append({
+                'file': filename,
+                'timestamp': entry.timestamp,
+                'device': entry.device,
+                'matches': [{'key': key, 'score': round(float(score), 4), 'top_left': list(top_left),
+                             'size': list(size), 'threshold': threshold}
+                            for key, score, top_left, size, threshold in matches],
+                'notes': [{'timestamp': t, 'text': text, 'point': list(point) if point else None}
+                          for t, text, point in notes],
+            })
+        with open(path / "index.json", 'w', encoding='utf-8') as f:
+            json.dump({'reason': reason, 'device': device, 'timestamp': timestamp, 'frames': index},
+                      f, ensure_ascii=False, indent=2)
+        return path
+
+    @staticmethod
+    def _prune(output_dir: Path, limit: int):
+        """output_dir下只保留最近limit次转储"""
+        if not output_dir.exists():
+            return
+        dumps = sorted(p for p in output_dir.iterdir() if p.is_dir() and (p / "index.json").exists())
+        for old in dumps[:max(0, len(dumps) - limit)]:
+            shutil.rmtree(old, ignore_errors=True)
+
+
+def _annotate(image: np.ndarray, matches: list[tuple], notes: list[tuple]) -> np.ndarray:
+    """在画面副本上画出匹配区域（成功为绿色，失败为红色）和操作位置"""
+    image = image.copy()
+    for key, score, top_left, size, threshold in matches:
+        color = (0, 255, 0) if score >= threshold else (0, 0, 255)
+        bottom_right = (top_left[0] + size[0], top_left[1] + size[1])
+        cv2.rectangle(image, top_left, bottom_right, color, 2)
+        cv2.putText(image, f"{key.split('/')[-1]} {score:.2f}", (top_left[0], max(12, top_left[1] - 4)),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.4, color, 1, cv2.LINE_AA)
+    for _, text, point in notes:
+        if point is not None:
+            cv2.circle(image, point, 12, (255, 0, 255), 2)
+            cv2.putText(image, text, (point[0] + 14, point[1]), cv2.FONT_HERSHEY_SIMPLEX, 0.4,
+                        (255, 0, 255), 1, cv2.LINE_AA)
+    return image
+
+
+def _safe_name(name: str) -> str:
+    return "".join(c if c.isalnum() or c in '-_.' else '_' for c in name)
+
+
+# 全局共享的调试黑匣子
+flight_recorder = FlightRecorder()
+
+
+def configure_flight_recorder(config: dict):
+    """按配置文件的debug部分设置黑匣子"""
+    debug_config = config.get('debug', {}) or {}
+    flight_recorder.enabled = debug_config.get('flight_recorder', True)
+    flight_recorder.capacity = debug_config.get('capacity', DEFAULT_CAPACITY)
+    flight_recorder.min_dump_interval = debug_config.get('min_dump_interval', DEFAULT_MIN_DUMP_INTERVAL)
+    flight_recorder.max_dumps = debug_config.get('max_dumps', DEFAULT_MAX_DUMPS)
+    flight_recorder.max_frame_dumps = debug_config.get('max_frame_dumps', DEFAULT_MAX_FRAME_DUMPS)
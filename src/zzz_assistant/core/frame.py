@@ -0,0 +1,320 @@
+from __future__ import annotations
+
+import hashlib
+import math
+import os
+import struct
+import threading
+import time
+
+from src.zzz_assistant.utils.lazy_import import lazy_import
+
+# OpenCV和numpy导入较慢，第一次真正处理画面时才导入
+cv2 = lazy_import('cv2')
+np = lazy_import('numpy')
+
+# 定义设计分辨率为720P，所有模板都是在这个分辨率下截取的
+DESIGN_RESOLUTION = (1280, 720) # 宽×高
+
+# 比较画面是否变化时使用的缩略图尺寸（宽×高），每个缩略图像素对应720P下20×20的区域
+THUMBNAIL_SIZE = (64, 36)
+# 判断画面是否变化时，单个缩略图像素允许的灰度差（截图本身的噪声在3以内，一个按钮出现或消失通常差几十）
+DEFAULT_CHANGE_TOLERANCE = 4.0
+
+# screencap原始输出中的像素格式（见Android的PixelFormat）
+PIXEL_FORMAT_RGBA_8888 = 1
+PIXEL_FORMAT_RGBX_8888 = 2
+PIXEL_FORMAT_BGRA_8888 = 5
+
+
+class ScreenTransform:
+    """
+    设计分辨率坐标和设备屏幕坐标之间的换算：屏幕坐标 = 设计坐标 × scale + offset
+
+    默认（fit）把1280×720的设计画面等比放大到刚好放进屏幕并居中，16:9的屏幕上offset为0，
+    16:10之类的屏幕上会在上下（或左右）留出空白。游戏的界面缩放和默认不一致时，
+    由calibration.py针对每台设备、每种分辨率校准出实际的scale。
+
+    scale(float): 设计画面上1像素对应屏幕上多少像素
+    offset(tuple[float, float]): 设计画面左上角在屏幕上的位置
+    """
+    __slots__ = ('scale', 'offset')
+
+    def __init__(self, scale: float, offset: tuple[float, float] = (0.0, 0.0)):
+        self.scale = scale
+        self.offset = offset
+
+    @classmethod
+    def fit(cls, screen_size: tuple[int, int], scale: float | None = None) -> "ScreenTransform":
+        """
+        居中放置设计画面
+        :param screen_size: 屏幕尺寸 (宽, 高)
+        :param scale: 缩放比例，为None时取刚好放进屏幕的比例
+        """
+        screen_w, screen_h = screen_size
+        design_w, design_h = DESIGN_RESOLUTION
+        if scale is None:
+            scale = min(screen_w / design_w, screen_h / design_h)
+        return cls(scale, ((screen_w - design_w * scale) / 2, (screen_h - design_h * scale) / 2))
+
+    def to_screen(self, x: float, y: float) -> tuple[int, int]:
+        """设计坐标 -> 屏幕坐标"""
+        return round(x * self.scale + self.offset[0]), round(y * self.scale + self.offset[1])
+
+    def to_design(self, x: float, y: float) -> tuple[int, int]:
+        """屏幕坐标 -> 设计坐标"""
+        return round((x - self.offset[0]) / self.scale), round((y - self.offset[1]) / self.scale)
+
+    def to_screen_rect(self, rect: tuple[int, int, int, int]) -> tuple[int, int, int, int]:
+        """设计坐标下的矩形 (x, y, 宽, 高) -> 屏幕坐标下的矩形（向外取整）"""
+        x, y, w, h = rect
+        left = math.floor(x * self.scale + self.offset[0])
+        top = math.floor(y * self.scale + self.offset[1])
+        right = math.ceil((x + w) * self.scale + self.offset[0])
+        bottom = math.ceil((y + h) * self.scale + self.offset[1])
+        return left, top, right - left, bottom - top
+
+    def design_image(self, image: np.ndarray, size: tuple[int, int] = DESIGN_RESOLUTION) -> np.ndarray:
+        """
+        从屏幕截图中取出设计画面，缩放到size
+        :param image: 屏幕截图
+        :param size: 输出尺寸 (宽, 高)，默认为设计分辨率；传入更小的尺寸可以一步得到缩略图
+        :return: 设计画面，超出屏幕的部分为黑色。屏幕本身就是设计画面且不需要缩放时直接返回原图，不拷贝
+        """
+        out_w, out_h = size
+        # 设计画面中1像素对应输出中的多少像素
+        factor = out_w / DESIGN_RESOLUTION[0]
+        screen_h, screen_w = image.shape[:2]
+        ox, oy = self.offset
+        design_w, design_h = DESIGN_RESOLUTION
+        # 设计画面在屏幕上覆盖的区域（和屏幕取交集）
+        left = max(0, round(ox))
+        top = max(0, round(oy))
+        right = min(screen_w, round(ox + design_w * self.scale))
+        bottom = min(screen_h, round(oy + design_h * self.scale))
+        # 这个区域在输出图上的位置
+        dst_left = round((left - ox) / self.scale * factor)
+        dst_top = round((top - oy) / self.scale * factor)
+        dst_right = min(out_w, round((right - ox) / self.scale * factor))
+        dst_bottom = min(out_h, round((bottom - oy) / self.scale * factor))
+
+        crop = image[top:bottom, left:right]
+        dst_size = (dst_right - dst_left, dst_bottom - dst_top)
+        if crop.shape[1::-1] != dst_size:
+            # 缩小到一半以下用INTER_AREA防止混叠；1080P -> 720P这种非整数的小幅缩小，INTER_AREA要20多毫秒，
+            # INTER_LINEAR只要4毫秒左右，模板匹配的相似度差别在0.005以内
+            interpolation = cv2.INTER_AREA if crop.shape[1] >= dst_size[0] * 2 else cv2.INTER_LINEAR
+            crop = cv2.resize(crop, dst_size, interpolation=interpolation)
+        if dst_size == (out_w, out_h):
+            return crop
+        canvas = np.zeros((out_h, out_w) + image.shape[2:], image.dtype)
+        canvas[dst_top:dst_bottom, dst_left:dst_right] = crop
+        return canvas
+
+    def __eq__(self, other):
+        return isinstance(other, ScreenTransform) and self.scale == other.scale and self.offset == other.offset
+
+    def __hash__(self):
+        return hash((self.scale, self.offset))
+
+    def __repr__(self):
+        return f"ScreenTransform(scale={self.scale:.3f}, offset=({self.offset[0]:.1f}, {self.offset[1]:.1f}))"
+
+
+class Frame:
+    """
+    一帧屏幕画面
+
+    直接持有BGR格式的像素数组（OpenCV的默认格式），从截图到模板匹配全程都不需要再编解码。
+    只有在真正需要保存到磁盘时（save / to_png_bytes）才会进行PNG编码。
+
+    缩放到设计分辨率的图像、灰度图和金字塔各层都是第一次用到时才计算，并缓存在这一帧上，
+    这样同一张截图被多个页面、多个模板检查时，整帧的预处理只做一次。
+
+    image(np.ndarray): BGR像素数组，形状为(高, 宽, 3)
+    timestamp(float): 截图时间（time.time()）
+    transform(ScreenTransform): 设计坐标和这帧屏幕坐标的换算，默认为居中放置（ScreenTransform.fit）
+    """
+
+    def __init__(self, image: np.ndarray, timestamp: float | None = None, transform: ScreenTransform | None = None):
+        self.image = image
+        self.timestamp = time.time() if timestamp is None else timestamp
+        self.transform = transform if transform is not None else ScreenTransform.fit(image.shape[1::-1])
+        self._derived: dict = {}
+        # 派生图像之间有依赖（灰度图依赖缩放图），所以用可重入锁
+        self._lock = threading.RLock()
+
+    @property
+    def width(self) -> int:
+        return self.image.shape[1]
+
+    @property
+    def height(self) -> int:
+        return self.image.shape[0]
+
+    @property
+    def size(self) -> tuple[int, int]:
+        """画面尺寸 (宽, 高)"""
+        return self.width, self.height
+
+    def __repr__(self):
+        return f"Frame({self.width}x{self.height}, timestamp={self.timestamp:.3f})"
+
+    def with_transform(self, transform: ScreenTransform) -> "Frame":
+        """
+        换一种坐标换算方式看同一张截图（派生图像都会重新计算）
+        :return: 换算方式相同时返回自己，否则返回共享像素数组的新Frame
+        """
+        if transform == self.transform:
+            return self
+        return Frame(self.image, self.timestamp, transform)
+
+    # --- 派生图像（每帧只计算一次） ---
+
+    def _cached(self, key, build):
+        """
+        取出缓存的派生图像，没有就调用build计算一次
+        多个线程同时请求同一个派生图像时，只有一个线程真正去计算
+        """
+        value = self._derived.get(key)
+        if value is None:
+            with self._lock:
+                value = self._derived.get(key)
+                if value is None:
+                    value = build()
+                    self._derived[key] = value
+        return value
+
+    @property
+    def scale_ratio(self) -> float:
+        """缩放到设计分辨率时使用的比例"""
+        return 1 / self.transform.scale
+
+    @property
+    def scaled(self) -> np.ndarray:
+        """
+        按transform取出、缩放到设计分辨率（1280×720）的BGR图像
+        这样无论玩家用1080P还是2K屏，都是同一尺寸的图像。本身就是720P时不做任何拷贝
+        注意：这是共享的缓存，不要在上面直接画图
+        """
+        return self._cached('scaled', lambda: self.transform.design_image(self.image))
+
+    @property
+    def gray(self) -> np.ndarray:
+        """设计分辨率下的灰度图"""
+        return self._cached('gray', lambda: cv2.cvtColor(self.scaled, cv2.COLOR_BGR2GRAY))
+
+    def pyramid(self, level: int) -> np.ndarray:
+        """
+        设计分辨率灰度图的金字塔层
+        :param level: 0为原始灰度图，每高一层宽高各缩小一半
+        :return: 对应层的灰度图
+        """
+        if level <= 0:
+            return self.gray
+        return self._cached(('pyramid', level), lambda: cv2.pyrDown(self.pyramid(level - 1)))
+
+    @property
+    def thumbnail(self) -> np.ndarray:
+        """
+        缩小到THUMBNAIL_SIZE的灰度缩略图，用于快速比较两帧是否不同
+        直接从原始截图缩小，不依赖（也不会触发）整帧缩放到设计分辨率
+        """
+        return self._cached('thumbnail', lambda: self.transform.design_image(
+            cv2.cvtColor(self.image, cv2.COLOR_BGR2GRAY), THUMBNAIL_SIZE))
+
+    @property
+    def content_hash(self) -> bytes:
+        """
+        画面内容的哈希（尺寸和全部原始像素），两帧哈希相同说明像素完全一样
+        用来判断能否直接复用之前的匹配和识别结果；720P的截图计算一次约2.5毫秒，每帧只算一次
+        """
+        def build():
+            digest = hashlib.sha256(repr(self.image.shape).encode())
+            digest.update(np.ascontiguousarray(self.image).data)
+            return digest.digest()
+        return self._cached('content_hash', build)
+
+    def differs_from(self, other: "Frame | None", tolerance: float = DEFAULT_CHANGE_TOLERANCE,
+                     min_pixels: int = 1) -> bool:
+        """
+        判断画面是否和另一帧不同
+
+        逐个比较缩略图像素（每个对应720P下20×20的区域），而不是看整张图的平均差：
+        一个按钮出现或消失只影响几个缩略图像素，平均到整张图上几乎看不出来。
+        :param other: 另一帧，为None时视为不同
+        :param tolerance: 单个缩略图像素允许的灰度差，超过它的像素算作变化了
+        :param min_pixels: 至少有多少个缩略图像素变化才认为画面变了
+        :return: 画面是否发生了变化
+        """
+        if other is None:
+            return True
+        if other is self or other.image is self.image:
+            return False
+        diff = cv2.absdiff(self.thumbnail, other.thumbnail)
+        return int(np.count_nonzero(diff > tolerance)) >= min_pixels
+
+    @classmethod
+    def from_screencap(cls, raw: bytes, timestamp: float | None = None) -> "Frame":
+        """
+        从 `adb shell screencap`（不带-p）的原始输出构造Frame
+        原始输出是一个小文件头（宽、高、格式，新版本Android还有一个色彩空间字段）加上未压缩的像素，
+        不需要经过任何PNG编解码
+        :param raw: screencap的原始字节
+        :return: Frame
+        """
+        if len(raw) < 12:
+            raise ValueError(f"screencap数据过短：{len(raw)}字节")
+        width, height, pixel_format = struct.unpack_from('<III', raw, 0)
+        pixel_bytes = width * height * 4
+        header_size = len(raw) - pixel_bytes
+        # Android 8及以前的文件头是12字节，之后多了4字节的色彩空间
+        if header_size not in (12, 16):
+            raise ValueError(f"无法解析的screencap数据：{width}x{height}，共{len(raw)}字节")
+
+        pixels = np.frombuffer(raw, np.uint8, count=pixel_bytes, offset=header_size).reshape(height, width, 4)
+        if pixel_format in (PIXEL_FORMAT_RGBA_8888, PIXEL_FORMAT_RGBX_8888):
+            image = cv2.cvtColor(pixels, cv2.COLOR_RGBA2BGR)
+        elif pixel_format == PIXEL_FORMAT_BGRA_8888:
+            image = cv2.cvtColor(pixels, cv2.COLOR_BGRA2BGR)
+        else:
+            raise ValueError(f"不支持的screencap像素格式：{pixel_format}")
+        return cls(image, timestamp)
+
+    @classmethod
+    def from_pil(cls, pil_image, timestamp: float | None = None) -> "Frame":
+        """
+        从Pillow图像构造Frame（adbutils的device.screenshot()返回的就是Pillow图像）
+        """
+        rgb = np.asarray(pil_image.convert('RGB'))
+        return cls(cv2.cvtColor(rgb, cv2.COLOR_RGB2BGR), timestamp)
+
+    @classmethod
+    def from_file(cls, path: str | os.PathLike, timestamp: float | None = None) -> "Frame":
+        """
+        从磁盘上的图片构造Frame，主要给离线调试用
+        """
+        # 使用imdecode来处理中文路径问题
+        with open(path, 'rb') as f:
+            data = np.frombuffer(f.read(), np.uint8)
+        image = cv2.imdecode(data, cv2.IMREAD_COLOR)
+        if image is None:
+            raise ValueError(f"无法解码图片：{path}")
+        return cls(image, timestamp)
+
+    def to_png_bytes(self) -> bytes:
+        """
+        编码为PNG字节，只应该在需要落盘或发送时调用
+        """
+        is_success, buffer = cv2.imencode('.png', self.image)
+        if not is_success:
+            raise ValueError("PNG编码失败")
+        return buffer.tobytes()
+
+    def save(self, path: str | os.PathLike):
+        """
+        把画面保存为PNG文件
+        """
+        # 使用imencode来处理中文路径问题
+        with open(path, 'wb') as f:
+            f.write(self.to_png_bytes())
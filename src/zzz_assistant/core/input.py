@@ -0,0 +1,374 @@
+from __future__ import annotations
+
+import os
+import threading
+import time
+
+from src.zzz_assistant.utils.lazy_import import lazy_import
+
+adbutils = lazy_import('adbutils')
+
+# 可选的输入方式（对应配置文件中的 emulator.input）
+INPUT_METHODS = ('adb', 'shell', 'maatouch')
+
+# 点击时按下和抬起之间的时间（毫秒）
+TAP_HOLD_MS = 50
+# 按住超过这个时间（毫秒）就算长按，shell方式下用 `input swipe x y x y 时长` 实现
+LONG_PRESS_MS = 500
+# 滑动时每一步移动之间的间隔（毫秒），大约一帧
+SWIPE_STEP_MS = 16
+# MaaTouch在设备上的路径和入口类
+MAATOUCH_REMOTE_PATH = "/data/local/tmp/maatouch"
+MAATOUCH_COMMAND = f"CLASSPATH={MAATOUCH_REMOTE_PATH} app_process / com.shxyke.MaaTouch.App"
+# MaaTouch的默认按压力度
+MAATOUCH_PRESSURE = 50
+# 常驻shell等待命令执行完成的最长时间（秒）
+SHELL_COMMAND_TIMEOUT = 10.0
+
+
+class Gesture:
+    """
+    一段多步触控脚本
+
+    由按下、移动、抬起、等待这几种步骤组成，整段脚本会一次性发给输入通道执行，
+    不需要每一步都和设备来回通信。坐标都是设备屏幕坐标。
+        Gesture().down(100, 200).wait(800).up()                 # 长按
+        Gesture.swipe(100, 500, 100, 100, duration_ms=300)      # 滑动
+    steps(list[tuple]): ('down', 触点, x, y) / ('move', 触点, x, y) / ('up', 触点) / ('wait', 毫秒)
+    """
+
+    def __init__(self):
+        self.steps: list[tuple] = []
+
+    def down(self, x: int, y: int, contact: int = 0) -> "Gesture":
+        self.steps.append(('down', contact, int(x), int(y)))
+        return self
+
+    def move(self, x: int, y: int, contact: int = 0) -> "Gesture":
+        self.steps.append(('move', contact, int(x), int(y)))
+        return self
+
+    def up(self, contact: int = 0) -> "Gesture":
+        self.steps.append(('up', contact))
+        return self
+
+    def wait(self, ms: int) -> "Gesture":
+        if ms > 0:
+            self.steps.append(('wait', int(ms)))
+        return self
+
+    def then(self, other: "Gesture") -> "Gesture":
+        """把另一段脚本接在后面"""
+        self.steps.extend(other.steps)
+        return self
+
+    @property
+    def duration_ms(self) -> int:
+        """脚本中所有等待加起来的时长"""
+        return sum(step[1] for step in self.steps if step[0] == 'wait')
+
+    @classmethod
+    def tap(cls, x: int, y: int, hold_ms: int = TAP_HOLD_MS) -> "Gesture":
+        return cls().down(x, y).wait(hold_ms).up()
+
+    @classmethod
+    def long_press(cls, x: int, y: int, duration_ms: int = LONG_PRESS_MS * 2) -> "Gesture":
+        return cls().down(x, y).wait(duration_ms).up()
+
+    @classmethod
+    def swipe(cls, x1: int, y1: int, x2: int, y2: int, duration_ms: int = 300) -> "Gesture":
+        """从(x1, y1)匀速滑到(x2, y2)，每隔SWIPE_STEP_MS移动一步"""
+        gesture = cls().down(x1, y1)
+        steps = max(1, duration_ms // SWIPE_STEP_MS)
+        for i in range(1, steps + 1):
+            gesture.wait(duration_ms * i // steps - duration_ms * (i - 1) // steps)
+            gesture.move(x1 + (x2 - x1) * i // steps, y1 + (y2 - y1) * i // steps)
+        return gesture.up()
+
+    def __repr__(self):
+        return f"Gesture({len(self.steps)}步, {self.duration_ms}ms)"
+
+
+class InputChannel:
+    """
+    输入通道的基类
+
+    Device的click、swipe等操作只和这个接口打交道，具体怎么把触控事件送到设备上由子类决定。
+    子类只需要实现run()，点击、滑动、长按都会转换成Gesture交给它执行。
+    """
+
+    def run(self, gesture: Gesture):
+        """执行一段触控脚本，返回时脚本已经发送（或执行）完毕"""
+        raise NotImplementedError("每个输入通道都必须实现自己的'run'方法")
+
+    def tap(self, x: int, y: int):
+        self.run(Gesture.tap(x, y))
+
+    def swipe(self, x1: int, y1: int, x2: int, y2: int, duration_ms: int = 300):
+        self.run(Gesture.swipe(x1, y1, x2, y2, duration_ms))
+
+    def long_press(self, x: int, y: int, duration_ms: int = LONG_PRESS_MS * 2):
+        self.run(Gesture.long_press(x, y, duration_ms))
+
+    def close(self):
+        """释放通道占用的连接、进程等资源"""
+
+
+def gesture_to_shell(gesture: Gesture) -> str:
+    """
+    把触控脚本翻译成一行shell命令（`input tap` / `input swipe` / `sleep`，用分号连接）
+
+    `input`命令只能模拟单指操作：每一次 按下…抬起 会变成一条命令，起点是按下的位置，终点是最后一次移动的位置，
+    按住的时长是中间所有等待的和。按住很短且没有移动的是点击，其余用swipe实现（起点终点相同就是长按）。
+    """
+    commands = []
+    stroke = None  # [起点x, 起点y, 终点x, 终点y, 时长]
+    for step in gesture.steps:
+        kind = step[0]
+        if kind == 'down':
+            if stroke is not None:
+                raise ValueError("shell输入方式不支持多指操作，请使用maatouch输入方式")
+            _, _, x, y = step
+            stroke = [x, y, x, y, 0]
+        elif kind == 'move':
+            if stroke is None:
+                raise ValueError("移动之前必须先按下")
+            stroke[2], stroke[3] = step[2], step[3]
+        elif kind == 'wait':
+            if stroke is not None:
+                stroke[4] += step[1]
+            else:
+                commands.append(f"sleep {step[1] / 1000:g}")
+        elif kind == 'up':
+            if stroke is None:
+                raise ValueError("抬起之前必须先按下")
+            x1, y1, x2, y2, duration = stroke
+            if (x1, y1) == (x2, y2) and duration < LONG_PRESS_MS:
+                commands.append(f"input tap {x1} {y1}")
+            else:
+                commands.append(f"input swipe {x1} {y1} {x2} {y2} {max(1, duration)}")
+            stroke = None
+    if stroke is not None:
+        raise ValueError("触控脚本结束时还有没抬起的触点")
+    return "; ".join(commands)
+
+
+class AdbInputChannel(InputChannel):
+    """
+    每次操作都发起一次 `adb shell input ...` 请求（原来Device.click的做法）
+    最简单，但每次点击都要重新建立adb连接、启动shell进程，一次点击要几百毫秒
+    """
+
+    def __init__(self, adb_device: adbutils.AdbDevice):
+        self.adb_device = adb_device
+
+    def run(self, gesture: Gesture):
+        script = gesture_to_shell(gesture)
+        if script:
+            self.adb_device.shell(script)
+
+
+class ShellInputChannel(InputChannel):
+    """
+    通过一条常驻的adb shell连接发送 `input` 命令
+
+    省掉了每次操作建立adb连接、启动shell的开销；一段触控脚本会合并成一行命令一次发送。
+    每条命令后面跟一个回显标记，读到标记就说明命令在设备上已经执行完，所以点击的耗时可以准确测量。
+    注意设备端的 `input` 命令本身每次还是要启动一个进程，想要更低的延迟请使用maatouch。
+    """
+
+    def __init__(self, adb_device: adbutils.AdbDevice):
+        self.adb_device = adb_device
+        self._connection = None
+        self._sequence = 0
+        self._lock = threading.Lock()
+
+    def run(self, gesture: Gesture):
+        script = gesture_to_shell(gesture)
+        if not script:
+            return
+        with self._lock:
+            if self._connection is None:
+                self._connection = self.adb_device.open_shell("sh")
+            self._sequence += 1
+            marker = f"__zzz_input_{self._sequence}__"
+            try:
+                self._connection.conn.sendall(f"{script}; echo {marker}\n".encode())
+                self._read_until(marker.encode())
+            except (OSError, adbutils.AdbError, EOFError):
+                # 连接断了，下次重新打开
+                self._close_connection()
+                raise
+
+    def close(self):
+        with self._lock:
+            self._close_connection()
+
+    def _read_until(self, marker: bytes):
+        sock = self._connection.conn
+        sock.settimeout(SHELL_COMMAND_TIMEOUT)
+        received = b''
+        while marker not in received:
+            chunk = sock.recv(4096)
+            if not chunk:
+                raise EOFError("输入shell连接已断开")
+            # 只保留末尾一段，足够找到标记即可
+            received = received[-len(marker):] + chunk
+
+    def _close_connection(self):
+        if self._connection is not None:
+            self._connection.close()
+        self._connection = None
+
+
+class MaaTouchChannel(InputChannel):
+    """
+    通过MaaTouch常驻进程注入触控事件
+
+    MaaTouch在设备上以app_process运行，从标准输入读取和minitouch相同的文本协议
+    （d 按下 / m 移动 / u 抬起 / c 提交 / w 等待），直接注入触摸事件，不需要每次启动input进程，
+    一次点击只需要往常驻连接里写几十个字节。支持多指操作，坐标和当前屏幕方向一致。
+    MaaTouch本身需要单独下载（https://github.com/MaaAssistantArknights/MaaTouch），
+    在配置文件的emulator.maatouch_path中填写本地路径，第一次连接时会推送到设备上。
+    """
+
+    def __init__(self, adb_device: adbutils.AdbDevice, local_path: str | os.PathLike | None = None):
+        """
+        :param adb_device: adb设备
+        :param local_path: 本地的MaaTouch文件路径，为None时假设设备上已经有了
+        """
+        self.adb_device = adb_device
+        self.local_path = local_path
+        self.max_contacts = 1
+        self.max_pressure = 0
+        self._connection = None
+        self._lock = threading.Lock()
+
+    def run(self, gesture: Gesture):
+        if not gesture.steps:
+            return
+        with self._lock:
+            if self._connection is None:
+                self._open()
+            # 压力值取决于MaaTouch启动时报告的最大压力，所以要在连接打开之后再生成脚本
+            script = self._script(gesture)
+            try:
+                self._connection.conn.sendall(script.encode())
+            except OSError:
+                self._close_connection()
+                raise
+        # 脚本由MaaTouch在设备上按顺序执行，等它执行完再返回，调用方之后截到的才是操作之后的画面
+        if gesture.duration_ms:
+            time.sleep(gesture.duration_ms / 1000)
+
+    def close(self):
+        with self._lock:
+            self._close_connection()
+
+    @property
+    def _pressure(self) -> int:
+        return min(MAATOUCH_PRESSURE, self.max_pressure) if self.max_pressure else MAATOUCH_PRESSURE
+
+    def _script(self, gesture: Gesture) -> str:
+        """把触控脚本翻译成MaaTouch的文本协议"""
+        pressure = self._pressure
+        lines = []
+        for step in gesture.steps:
+            kind = step[0]
+            if kind == 'down':
+                lines.append(f"d {step[1]} {step[2]} {step[3]} {pressure}")
+                lines.append("c")
+            elif kind == 'move':
+                lines.append(f"m {step[1]} {step[2]} {step[3]} {pressure}")
+                lines.append("c")
+            elif kind == 'up':
+                lines.append(f"u {step[1]}")
+                lines.append("c")
+            elif kind == 'wait':
+                lines.append(f"w {step[1]}")
+        return "\n".join(lines) + "\n"
+
+    def _open(self):
+        if self.local_path:
+            self.adb_device.sync.push(str(self.local_path), MAATOUCH_REMOTE_PATH)
+        self._connection = self.adb_device.open_shell(MAATOUCH_COMMAND)
+        # 启动后会先输出几行文件头：v 版本 / ^ 最大触点数 最大x 最大y 最大压力 / $ 进程号
+        reader = self._connection.conn.makefile('rb')
+        while True:
+            line = reader.readline().decode(errors='replace').strip()
+            if not line:
+                self._close_connection()
+                raise EOFError("MaaTouch没有正常启动，请检查emulator.maatouch_path")
+            if line.startswith('^'):
+                parts = line.split()
+                self.max_contacts = int(parts[1])
+                self.max_pressure = int(parts[4])
+            elif line.startswith('$'):
+                break
+
+    def _close_connection(self):
+        if self._connection is not None:
+            self._connection.close()
+        self._connection = None
+
+
+# --- 离线替身：不需要模拟器也能测试输入链路 ---
+
+class FakeInputChannel(InputChannel):
+    """
+    假的输入通道，记录收到的所有触控脚本，可以模拟每次操作的延迟
+
+    commands(list[tuple[float, str]]): (时间, shell命令) 每次run()翻译出的命令，方便检查操作是否符合预期
+    gestures(list[Gesture]): 收到的原始触控脚本
+    """
+
+    def __init__(self, latency: float = 0.0, screen_size: tuple[int, int] | None = None):
+        """
+        :param latency: 每次操作模拟的延迟（秒）
+        :param screen_size: 屏幕尺寸 (宽, 高)，给出时会检查坐标是否越界
+        """
+        self.latency = latency
+        self.screen_size = screen_size
+        self.commands: list[tuple[float, str]] = []
+        self.gestures: list[Gesture] = []
+
+    def run(self, gesture: Gesture):
+        if self.screen_size is not None:
+            width, height = self.screen_size
+            for step in gesture.steps:
+                if step[0] in ('down', 'move') and not (0 <= step[2] < width and 0 <= step[3] < height):
+                    raise ValueError(f"触控坐标({step[2]}, {step[3]})超出了屏幕范围{self.screen_size}")
+        if self.latency:
+            time.sleep(self.latency)
+        self.gestures.append(gesture)
+        self.commands.append((time.perf_counter(), gesture_to_shell(gesture)))
+
+
+def create_input_channel(method: str,
+                         adb_device: adbutils.AdbDevice,
+                         maatouch_path: str | None = None) -> InputChannel:
+    """
+    按配置创建输入通道
+    :param method: 输入方式，见INPUT_METHODS
+    :param adb_device: adb设备
+    :param maatouch_path: 本地的MaaTouch文件路径（只有maatouch方式需要）
+    """
+    if method == 'maatouch':
+        return MaaTouchChannel(adb_device, maatouch_path)
+    if method == 'shell':
+        return ShellInputChannel(adb_device)
+    if method == 'adb':
+        return AdbInputChannel(adb_device)
+    raise ValueError(f"未知的输入方式：{method}，可选：{INPUT_METHODS}")
+
+
+def measure_tap_latency(channel: InputChannel, x: int, y: int, count: int = 20) -> list[float]:
+    """
+    连续点击同一个位置，测量每次点击的耗时（秒）
+    """
+    samples = []
+    for _ in range(count):
+        start = time.perf_counter()
+        channel.tap(x, y)
+        samples.append(time.perf_counter() - start)
+    return samples
@@ -0,0 +1,328 @@
+import bisect
+import contextvars
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+from src.zzz_assistant.utils.log import get_logger
+from src.zzz_assistant.utils.paths import PROJECT_ROOT
+
+logger = get_logger(__name__)
+
+# 直方图的桶上界（秒），覆盖从一次小模板匹配（约1毫秒）到一次启动游戏（数秒）的范围
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# 导出为Prometheus文本格式时的指标名前缀
+PROMETHEUS_PREFIX = "zzz_assistant_"
+
+# 当前上下文（线程或线程池任务）中附加在每个指标上的标签，例如 {'device': '127.0.0.1:16384'}
+_context_labels: contextvars.ContextVar[dict] = contextvars.ContextVar('metrics_labels', default={})
+
+
+class Histogram:
+    """
+    一组标签下某个耗时的直方图
+
+    count(int): 观测次数
+    total(float): 耗时总和（秒）
+    max(float): 最大耗时（秒）
+    buckets(list[int]): 每个桶（不超过对应上界）内的观测次数，最后一个是超过所有上界的
+    """
+
+    def __init__(self, bounds: tuple[float, ...] = DEFAULT_BUCKETS):
+        self.bounds = bounds
+        self.buckets = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        self.buckets[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def quantile(self, q: float) -> float:
+        """
+        用桶估计分位数（取所在桶的上界，落在最后一个桶时取最大值）
+        """
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, n in zip(self.bounds, self.buckets):
+            seen += n
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+
+class Span:
+    """
+    一次计时，用with语句包住要计时的代码，退出时把耗时记进直方图
+
+    计时过程中可以用set()补充只有结束时才知道的标签，例如识别出的页面名
+    """
+    __slots__ = ('registry', 'name', 'labels', 'start')
+
+    def __init__(self, registry: "MetricsRegistry", name: str, labels: dict):
+        self.registry = registry
+        self.name = name
+        self.labels = labels
+        self.start = 0.0
+
+    def set(self, **labels):
+        self.labels.update(labels)
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.labels['error'] = exc_type.__name__
+        self.registry.observe(self.name, time.perf_counter() - self.start, self.labels)
+        return False
+
+
+class _NullSpan:
+    """关闭指标时使用的空计时，什么也不做"""
+    __slots__ = ()
+
+    def set(self, **labels):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _BoundLabels:
+    """MetricsRegistry.bind()返回的上下文管理器"""
+    __slots__ = ('labels', 'token')
+
+    def __init__(self, labels: dict):
+        self.labels = labels
+        self.token = None
+
+    def __enter__(self):
+        self.token = _context_labels.set({**_context_labels.get(), **self.labels})
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        _context_labels.reset(self.token)
+        return False
+
+
+class MetricsRegistry:
+    """
+    热路径上的计时和计数
+
+    所有耗时都按 (指标名, 标签) 聚合成直方图，计数按 (指标名, 标签) 累加，
+    可以导出成Prometheus的文本格式（给node_exporter的textfile收集器抓取）或JSON快照。
+    记录一次只需要一次perf_counter和一次加锁的字典更新；关闭后span()返回一个空对象，几乎没有开销。
+
+    标签除了调用时显式传入的，还会自动带上当前上下文中bind()绑定的标签（例如设备序列号），
+    这样模板匹配这类不知道自己在为哪台设备工作的代码，也能按设备统计。
+    """
+
+    def __init__(self, buckets: tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.enabled = True
+        self._histograms: dict[tuple, Histogram] = {}
+        self._counters: dict[tuple, float] = {}
+        self._lock = threading.Lock()
+        self._exporter: threading.Thread | None = None
+        self._exporter_stop = threading.Event()
+
+    def span(self, name: str, **labels) -> Span | _NullSpan:
+        """
+        计时一段代码
+        :param name: 指标名，用点分隔层级，例如 'vision.match'
+        :param labels: 标签，例如 template='login/CLICK_INTO_GAME'
+        """
+        if not self.enabled:
+            return _NULL_SPAN
+        context = _context_labels.get()
+        return Span(self, name, {**context, **labels} if context else labels)
+
+    def observe(self, name: str, seconds: float, labels: dict | None = None):
+        """直接记录一次耗时"""
+        if not self.enabled:
+            return
+        key = (name, _label_key(labels))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(self.buckets)
+            histogram.observe(seconds)
+
+    def inc(self, name: str, amount: float = 1, **labels):
+        """计数加一（或加amount）"""
+        if not self.enabled:
+            return
+        context = _context_labels.get()
+        key = (name, _label_key({**context, **labels} if context else labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    @staticmethod
+    def bind(**labels) -> _BoundLabels:
+        """
+        在with块内（包括从这里提交到识别引擎的任务）给所有指标附加标签
+            with metrics.bind(device=device.serial):
+                ...
+        """
+        return _BoundLabels(labels)
+
+    @staticmethod
+    def context_labels() -> dict:
+        """当前上下文中bind()绑定的标签（不要修改返回的dict）"""
+        return _context_labels.get()
+
+    @staticmethod
+    def current_context() -> contextvars.Context:
+        """复制当前上下文，提交到线程池时用它来传递bind()的标签"""
+        return contextvars.copy_context()
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+
+    def snapshot(self) -> dict:
+        """
+        所有指标的JSON快照
+        :return: {'timestamp':..., 'histograms': [...], 'counters': [...]}
+        """
+        with self._lock:
+            histograms = [{
+                'name': name, 'labels': dict(labels), 'count': h.count, 'sum': h.total, 'max': h.max,
+                'mean': h.total / h.count if h.count else 0.0,
+                'p50': h.quantile(0.5), 'p95': h.quantile(0.95),
+                'buckets': {**{str(bound): n for bound, n in zip(h.bounds, h.buckets)}, '+Inf': h.buckets[-1]},
+            } for (name, labels), h in self._histograms.items()]
+            counters = [{'name': name, 'labels': dict(labels), 'value': value}
+                        for (name, labels), value in self._counters.items()]
+        return {
+            'timestamp': time.time(),
+            'histograms': sorted(histograms, key=_sort_key),
+            'counters': sorted(counters, key=_sort_key),
+        }
+
+    def to_prometheus(self) -> str:
+        """导出为Prometheus文本格式（直方图的桶是累计的）"""
+        snapshot = self.snapshot()
+        lines = []
+        declared = set()
+        for item in snapshot['histograms']:
+            metric = _prometheus_name(item['name']) + "_seconds"
+            if metric not in declared:
+                declared.add(metric)
+                lines.append(f"# TYPE {metric} histogram")
+            cumulative = 0
+            for bound, n in item['buckets'].items():
+                cumulative += n
+                lines.append(f"{metric}_bucket{_prometheus_labels(item['labels'], le=bound)} {cumulative}")
+            lines.append(f"{metric}_sum{_prometheus_labels(item['labels'])} {item['sum']:.6f}")
+            lines.append(f"{metric}_count{_prometheus_labels(item['labels'])} {item['count']}")
+        for item in snapshot['counters']:
+            metric = _prometheus_name(item['name']) + "_total"
+            if metric not in declared:
+                declared.add(metric)
+                lines.append(f"# TYPE {metric} counter")
+            lines.append(f"{metric}{_prometheus_labels(item['labels'])} {item['value']:g}")
+        return "\n".join(lines) + "\n"
+
+    def export(self, path: str | os.PathLike):
+        """
+        把指标写到文件：.json结尾写JSON快照，其他（建议.prom）写Prometheus文本格式
+        先写临时文件再替换，抓取方不会读到写了一半的文件
+        """
+        path = Path(path)
+        if path.suffix == '.json':
+            content = json.dumps(self.snapshot(), ensure_ascii=False, indent=2)
+        else:
+            content = self.to_prometheus()
+        os.makedirs(path.parent, exist_ok=True)
+        tmp_path = path.with_name(path.name + '.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(content)
+        os.replace(tmp_path, path)
+
+    def start_exporter(self, path: str | os.PathLike, interval: float = 10.0):
+        """
+        启动一个后台线程，每隔interval秒导出一次指标
+        """
+        if self._exporter is not None:
+            return
+        self._exporter_stop.clear()
+
+        def run():
+            while not self._exporter_stop.wait(interval):
+                try:
+                    self.export(path)
+                except OSError as e:
+                    logger.warning("导出指标时出错：%s", e)
+
+        self._exporter = threading.Thread(target=run, name="metrics-exporter", daemon=True)
+        self._exporter.start()
+
+    def stop_exporter(self):
+        if self._exporter is not None:
+            self._exporter_stop.set()
+            self._exporter.join(timeout=1)
+            self._exporter = None
+
+
+def _label_key(labels: dict | None) -> tuple:
+    if not labels:
+        return ()
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _sort_key(item: dict) -> tuple:
+    return item['name'], sorted(item['labels'].items())
+
+
+def _prometheus_name(name: str) -> str:
+    return PROMETHEUS_PREFIX + "".join(c if c.isalnum() else '_' for c in name)
+
+
+def _prometheus_labels(labels: dict, **extra) -> str:
+    items = {**labels, **extra}
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape_label(v)}"' for k, v in items.items()) + "}"
+
+
+def _escape_label(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', ' ')
+
+
+# 全局共享的指标注册表
+metrics = MetricsRegistry()
+
+
+def configure_metrics(config: dict):
+    """
+    按配置文件的metrics部分开关指标、启动定时导出
+    :return: 导出文件路径，没有配置时返回None
+    """
+    metrics_config = config.get('metrics', {}) or {}
+    metrics.enabled = metrics_config.get('enabled', True)
+    export_path = metrics_config.get('export_path')
+    if not metrics.enabled or not export_path:
+        return None
+    if not os.path.isabs(export_path):
+        export_path = PROJECT_ROOT / export_path
+    metrics.start_exporter(export_path, metrics_config.get('export_interval', 10.0))
+    return export_path
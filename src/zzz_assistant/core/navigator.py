@@ -1,40 +1,212 @@
+import time
+
 from pages.ad_pages import AdPage
 from pages.base_page import BasePage
 from pages.main_pages import LoginPage, MainPage
 from src.zzz_assistant.core.device import Device
+from src.zzz_assistant.core.flight_recorder import flight_recorder
+from src.zzz_assistant.core.frame import Frame
+from src.zzz_assistant.core.metrics import metrics
+from src.zzz_assistant.core.recognition import DEFAULT_RECOGNITION_WORKERS, PageRecognition, RecognitionEngine
+from src.zzz_assistant.core.transitions import DEFAULT_TRANSITIONS_FILE, UNKNOWN_PAGE, PredictionStats, \
+    get_transition_graph
+from src.zzz_assistant.core.vision import DEFAULT_THRESHOLD
+from src.zzz_assistant.utils.helpers import wait_for_frame_change
+from src.zzz_assistant.utils.log import get_logger
+
+logger = get_logger(__name__)
+
+# 快速确认预测页面时使用更严格的阈值，避免因为先入为主把相似的画面误认为预测的页面
+FAST_CONFIRM_THRESHOLD = DEFAULT_THRESHOLD + 0.1
+
+# 【【【把所有已知的页面类都注册到这里】】】
+PAGE_CLASSES: list[type[BasePage]] = [
+    LoginPage,
+    MainPage,
+    AdPage,
+]
 
 
 class Navigator:
-    def __init__(self, device: Device):
+    def __init__(self, device: Device, config: dict | None = None, engine: RecognitionEngine | None = None):
         self.device = device
 
-        # 【【【把所有已知的页面都注册到这里】】】
-        self.known_pages: list[BasePage] = [
-            LoginPage(device),
-            MainPage(device),
-            AdPage(device),
-        ]
+        # 已知页面见PAGE_CLASSES
+        self.known_pages: list[BasePage] = [page_class(device) for page_class in PAGE_CLASSES]
+
+        # 并行识别引擎，线程数可以在配置文件的vision.recognition_workers中设置
+        # 多设备运行时会传入所有设备共用的引擎
+        vision_config = (config or {}).get('vision', {})
+        if engine is None:
+            workers = vision_config.get('recognition_workers', DEFAULT_RECOGNITION_WORKERS)
+            engine = RecognitionEngine(max_workers=workers)
+        self.engine = engine
+
+        # 页面跳转图：页面声明的跳转作为先验，实际观察到的跳转会被学习并保存下来
+        # 配置 vision.learn_transitions: false 可以关闭持久化；持久化时同一进程里的所有设备共用一张图
+        transitions_file = DEFAULT_TRANSITIONS_FILE if vision_config.get('learn_transitions', True) else None
+        self.transitions = get_transition_graph(
+            transitions_file,
+            declared={page.name: page.next_pages for page in self.known_pages})
+        self.prediction_stats = PredictionStats()
+
+        # 界面缩放校准（见calibration.py），只有真实设备才有；配置 vision.calibration: false 可以关闭
+        self.calibration = getattr(device, 'calibration', None) if vision_config.get('calibration', True) else None
+
+        # 最近一次的识别结果，里面有每个特征元素的相似度和坐标
+        self.last_recognition: PageRecognition | None = None
+        # 最近一次识别用的截图
+        self.last_frame: Frame | None = None
+
+
+    def recognize(self, frame: Frame | None = None) -> PageRecognition | None:
+        """
+        截一次图，识别当前页面
+
+        先根据上一个页面和跳转图，只检查最可能的那个页面，并使用更严格的阈值（快速确认）；
+        没有确认成功，再把所有页面按可能性从高到低交给识别引擎并行检查。
+        画面没变，所以预测页面在第二轮中的匹配会直接复用第一轮的结果。
+        :param frame: 已经截好的画面，为None时重新截一张
+        :return: PageRecognition，截图失败时返回None
+        """
+        if frame is None:
+            frame = self.device.screenshot()
+        if frame is None:
+            logger.error("获取当前页面截图失败。")
+            return None
+
+        # 画面和上一次识别时完全一样（像素相同），直接复用上一次的结果
+        if (self.last_recognition is not None and self.last_frame is not None
+                and frame.content_hash == self.last_frame.content_hash):
+            self.last_frame = frame
+            metrics.inc('navigator.reused', device=self.device.serial)
+            return self.last_recognition
+
+        with metrics.bind(device=self.device.serial), metrics.span('navigator.recognize') as span:
+            recognition = self._recognize(frame)
+            if self.calibration is not None:
+                # 第一次认出页面时校准缩放比例；一直认不出时重新搜索比例，比例变了就用新比例再识别一次
+                recalibrated = self.calibration.after_recognition(frame, recognition.page, self.known_pages)
+                if recalibrated is not None:
+                    recognition = self._recognize(recalibrated)
+            span.set(page=recognition.page.name if recognition.page is not None else UNKNOWN_PAGE)
+        return recognition
+
+    def _recognize(self, frame: Frame) -> PageRecognition:
+        """先快速确认预测的页面，不是的话再并行检查所有页面，并记录这次跳转"""
+        previous = self.last_recognition.page.name \
+            if self.last_recognition is not None and self.last_recognition.page is not None else UNKNOWN_PAGE
+        pages_by_name = {page.name: page for page in self.known_pages}
+        ranked = self.transitions.rank(previous, list(pages_by_name))
+        ordered_pages = [pages_by_name[name] for name, _ in ranked]
+
+        stats = self.prediction_stats
+        stats.recognitions += 1
+        predicted_name, probability = ranked[0] if ranked else (None, 0.0)
+        recognition = None
+        if predicted_name is not None and probability > 0:
+            # 快速确认：只匹配预测页面的特征元素
+            stats.predictions += 1
+            recognition = self.engine.recognize(frame, [pages_by_name[predicted_name]], FAST_CONFIRM_THRESHOLD)
+            stats.template_matches += recognition.match_count
+            metrics.inc('navigator.predictions', result='hit' if recognition.page is not None else 'miss')
+            if recognition.page is not None:
+                stats.hits += 1
+            else:
+                fast_path = recognition
+                recognition = self.engine.recognize(frame, ordered_pages)
+                stats.template_matches += recognition.match_count
+                recognition.match_count += fast_path.match_count
+        else:
+            recognition = self.engine.recognize(frame, ordered_pages)
+            stats.template_matches += recognition.match_count
+
+        current = recognition.page.name if recognition.page is not None else UNKNOWN_PAGE
+        self.transitions.record(previous, current)
+
+        self.last_recognition = recognition
+        self.last_frame = frame
+        return recognition
 
 
     def get_current_page(self) -> BasePage | None:
         """
         识别当前屏幕处于哪个已知页面。
 
-        只截一次图，供所有页面检查。调用它们的 is_on_page 方法。
-        但由于直接传了screenshot_bytes，wait_for_template会忽略，所以设计timeout没什么用
-        第一个返回True的页面就是当前页面。
+        只截一次图，供所有页面检查。先快速确认跳转图预测的页面，
+        不是的话再把其余页面的所有特征元素交给识别引擎并行匹配，
+        确认了某个页面后立刻取消剩下的匹配。
         """
-        print("\n--- 开始识别当前页面 ---")
-        screenshot_bytes = self.device.screenshot()
-        if not screenshot_bytes:
-            print("Error: 获取当前页面截图失败。")
+        logger.debug("开始识别当前页面")
+        recognition = self.recognize()
+        if recognition is None:
             return None
 
+        if recognition.page is not None:
+            logger.info("当前页面：%s（%s）", recognition.page.name,
+                        ", ".join(f"{key}={score:.2f}" for key, score in recognition.scores.items()))
+            return recognition.page
 
-        for page in self.known_pages:
-            if page.is_on_page(screenshot_bytes=screenshot_bytes):
-                print(f"当前页面：{page.name}")
-                return page
-
-        print("Warning: 未能识别出当前属于任何已知页面。")
+        logger.info("未能识别出当前属于任何已知页面。")
         return None
+
+
+    def locate(self, key: str) -> tuple[int, int] | None:
+        """
+        最近一次识别出的页面上某个特征元素的位置（见PageRecognition.location），
+        例如识别出登录页后直接拿到登录按钮的坐标去点击
+        :return: 中心点坐标，最近一次没有识别出页面或者不是这个页面的元素时返回None
+        """
+        if self.last_recognition is None:
+            return None
+        return self.last_recognition.location(key)
+
+
+    def wait_for_page(self,
+                      timeout: float,
+                      expected: tuple[type[BasePage], ...] | None = None) -> BasePage | None:
+        """
+        等待屏幕进入某个已知页面，识别出来就立刻返回，timeout只是上限
+
+        画面不变时不会重复识别，而是等到画面发生变化再识别下一次，
+        所以等待加载、转场时几乎不占CPU，画面一到位就能马上发现。
+        :param timeout: 最长等待时间（秒）
+        :param expected: 只接受这些类型的页面，为None时任何已知页面都可以
+        :return: 识别出的页面，超时返回None
+        """
+        deadline = time.time() + timeout
+        with metrics.bind(device=self.device.serial), metrics.span('navigator.wait_for_page') as span:
+            frame = None
+            while True:
+                recognition = self.recognize(frame)
+                page = recognition.page if recognition is not None else None
+                if page is not None and (expected is None or isinstance(page, expected)):
+                    span.set(page=page.name)
+                    return page
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    span.set(page=UNKNOWN_PAGE)
+                    self._dump_timeout(page)
+                    return None
+                if self.last_frame is not None:
+                    frame = wait_for_frame_change(self.device, self.last_frame, timeout=remaining)
+                    if frame is None:
+                        span.set(page=UNKNOWN_PAGE)
+                        self._dump_timeout(page)
+                        return None
+                else:
+                    # 截图失败了，稍等再试
+                    frame = None
+                    time.sleep(min(0.5, remaining))
+
+
+    def _dump_timeout(self, page: BasePage | None):
+        """等待页面超时：把黑匣子里这台设备最近的画面保存下来"""
+        flight_recorder.dump('unknown_page' if page is None else 'unexpected_page', device=self.device.serial)
+
+    def close(self):
+        """
+        保存学到的页面跳转图，并打印预测统计
+        """
+        self.transitions.save()
+        logger.info("页面预测统计：%s", self.prediction_stats)
@@ -0,0 +1,168 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from src.zzz_assistant.core.device import Device
+from src.zzz_assistant.core.recognition import DEFAULT_RECOGNITION_WORKERS, RecognitionEngine
+from src.zzz_assistant.tasks.base_task import BaseTask
+from src.zzz_assistant.utils.log import get_logger
+
+logger = get_logger(__name__)
+
+# 同一台主机上默认最多同时进行几次截图（MuMu多开时截图是最吃资源的操作）
+DEFAULT_MAX_CONCURRENT_CAPTURES = 2
+
+
+class DeviceSpec:
+    """
+    多设备配置中的一台设备
+
+    name(str): 设备的显示名称
+    serial(str): adb序列号，例如 '127.0.0.1:16384'
+    capture(str): 截图方式，见Device
+    input(str): 输入方式，见Device
+    """
+    def __init__(self, name: str, serial: str, capture: str = 'screencap', input: str = 'shell'):
+        self.name = name
+        self.serial = serial
+        self.capture = capture
+        self.input = input
+
+    @classmethod
+    def from_config(cls, config: dict) -> list["DeviceSpec"]:
+        """
+        从配置中读取设备列表。没有配置devices时，退回到单台的emulator.device_serial
+        """
+        emulator = config.get('emulator', {})
+        default_capture = emulator.get('capture', 'screencap')
+        default_input = emulator.get('input', 'shell')
+        devices = config.get('devices') or []
+        if not devices:
+            return [cls(emulator.get('name', emulator['device_serial']), emulator['device_serial'],
+                        default_capture, default_input)]
+        return [
+            cls(item.get('name', item['serial']), item['serial'],
+                item.get('capture', default_capture), item.get('input', default_input))
+            for item in devices
+        ]
+
+
+class DeviceReport:
+    """
+    一台设备的运行报告
+
+    tasks_succeeded / tasks_failed(int): 成功、失败的任务数
+    elapsed(float): 这台设备从连接到跑完所有任务的总耗时（秒）
+    frames / clicks(int): 截图、点击次数
+    """
+    def __init__(self, spec: DeviceSpec):
+        self.spec = spec
+        self.connected = False
+        self.tasks_succeeded = 0
+        self.tasks_failed = 0
+        self.elapsed = 0.0
+        self.frames = 0
+        self.clicks = 0
+
+    @property
+    def frames_per_second(self) -> float:
+        return self.frames / self.elapsed if self.elapsed else 0.0
+
+    @property
+    def tasks_per_minute(self) -> float:
+        total = self.tasks_succeeded + self.tasks_failed
+        return total / self.elapsed * 60 if self.elapsed else 0.0
+
+    def __str__(self):
+        if not self.connected:
+            return f"【{self.spec.name}】连接失败"
+        return (f"【{self.spec.name}】成功{self.tasks_succeeded}个任务，失败{self.tasks_failed}个，"
+                f"耗时{self.elapsed:.1f}秒，截图{self.frames}次（{self.frames_per_second:.2f}帧/秒），"
+                f"点击{self.clicks}次，{self.tasks_per_minute:.2f}个任务/分钟")
+
+
+class Orchestrator:
+    """
+    多设备调度器
+
+    用asyncio同时在多台模拟器上运行任务：每台设备按顺序执行任务列表，不同设备之间并发。
+    现有的任务（BaseTask子类）都是同步、阻塞的代码，所以每个任务整体放进一个有上限的adb线程池里执行；
+    所有设备共用一个识别引擎（有上限的识别线程池），并用一个主机级的信号量限制同时进行的截图数量。
+    """
+
+    def __init__(self, config: dict, task_classes: list[type[BaseTask]]):
+        """
+        :param config: 全局配置字典，多设备相关的配置在devices和orchestrator下
+        :param task_classes: 每台设备上依次执行的任务类
+        """
+        self.config = config
+        self.task_classes = task_classes
+        self.specs = DeviceSpec.from_config(config)
+
+        orchestrator_config = config.get('orchestrator', {})
+        max_captures = orchestrator_config.get('max_concurrent_captures', DEFAULT_MAX_CONCURRENT_CAPTURES)
+        # 每台设备同一时间只跑一个任务，所以adb线程数默认和设备数相同
+        adb_workers = orchestrator_config.get('adb_workers', len(self.specs))
+        vision_workers = config.get('vision', {}).get('recognition_workers', DEFAULT_RECOGNITION_WORKERS)
+
+        self.capture_limiter = threading.BoundedSemaphore(max(1, max_captures))
+        self.adb_executor = ThreadPoolExecutor(max_workers=max(1, adb_workers), thread_name_prefix="adb")
+        self.engine = RecognitionEngine(max_workers=vision_workers)
+
+    async def run(self) -> list[DeviceReport]:
+        """
+        在所有设备上并发执行任务
+        :return: 每台设备的运行报告
+        """
+        try:
+            reports = await asyncio.gather(*(self._run_device(spec) for spec in self.specs))
+        finally:
+            self.adb_executor.shutdown(wait=False)
+            self.engine.shutdown()
+        return list(reports)
+
+    async def _run_device(self, spec: DeviceSpec) -> DeviceReport:
+        loop = asyncio.get_running_loop()
+        report = DeviceReport(spec)
+        start = time.perf_counter()
+
+        device = Device(device_serial=spec.serial, capture_method=spec.capture, input_method=spec.input,
+                        maatouch_path=self.config.get('emulator', {}).get('maatouch_path'),
+                        adb_config=self.config.get('adb'))
+        device.capture_limiter = self.capture_limiter
+        report.connected = await loop.run_in_executor(self.adb_executor, device.connect)
+        if not report.connected:
+            logger.error("【%s】无法连接，跳过这台设备。", spec.name)
+            return report
+
+        try:
+            for task_class in self.task_classes:
+                task = task_class(device=device, config=self.config, engine=self.engine)
+                logger.info("【%s】开始执行任务：%s", spec.name, task_class.__name__)
+                try:
+                    success = await loop.run_in_executor(self.adb_executor, task.execute)
+                except Exception as e:
+                    logger.exception("【%s】执行%s时发生错误：%s", spec.name, task_class.__name__, e)
+                    success = False
+                if success:
+                    report.tasks_succeeded += 1
+                else:
+                    report.tasks_failed += 1
+        finally:
+            await loop.run_in_executor(self.adb_executor, device.close)
+            report.elapsed = time.perf_counter() - start
+            report.frames = device.frames_captured
+            report.clicks = device.clicks
+        return report
+
+
+def run_on_all_devices(config: dict, task_classes: list[type[BaseTask]]) -> list[DeviceReport]:
+    """
+    同步入口：在配置中的所有设备上运行任务，并打印每台设备的吞吐报告
+    """
+    orchestrator = Orchestrator(config, task_classes)
+    logger.info("共%d台设备，开始并发执行任务...", len(orchestrator.specs))
+    reports = asyncio.run(orchestrator.run())
+    logger.info("多设备运行报告：\n%s", "\n".join(str(report) for report in reports))
+    return reports
@@ -0,0 +1,102 @@
+from __future__ import annotations
+
+from src.zzz_assistant.core.frame import Frame, ScreenTransform
+from src.zzz_assistant.utils.lazy_import import lazy_import
+
+np = lazy_import('numpy')
+
+# 颜色探针默认的容差：每个通道（0-255）允许和期望颜色相差多少
+DEFAULT_PROBE_TOLERANCE = 24
+# 默认至少要有这个比例的探针通过，页面才算通过，给偶尔被特效、动画挡住的点留一点余地
+DEFAULT_PROBE_MIN_RATIO = 0.8
+# 每个ProbeSet最多缓存多少种坐标换算下的屏幕坐标
+_MAX_CACHED_TRANSFORMS = 8
+
+
+class ColorProbe:
+    """
+    页面上固定位置的一个颜色
+
+    x(int), y(int): 设计分辨率（1280×720）下的坐标，应该选在一片纯色区域的中间，这样界面缩放、
+        轻微的位置偏移都不会影响取到的颜色（dev_tools/create_probes.py会自动挑选这样的点）
+    color(tuple[int, int, int]): 期望的颜色 (B, G, R)
+    tolerance(int): 每个通道允许的最大差值
+    """
+    __slots__ = ('x', 'y', 'color', 'tolerance')
+
+    def __init__(self, x: int, y: int, color: tuple[int, int, int], tolerance: int = DEFAULT_PROBE_TOLERANCE):
+        self.x = x
+        self.y = y
+        self.color = tuple(color)
+        self.tolerance = tolerance
+
+    def __repr__(self):
+        # 和构造代码一致，dev_tools/create_probes.py直接输出repr，可以粘贴到页面定义里
+        return f"ColorProbe({self.x}, {self.y}, {self.color}, tolerance={self.tolerance})"
+
+
+class ProbeSet:
+    """
+    一个页面的颜色探针签名，用来在模板匹配之前快速排除页面
+
+    检查时按帧的坐标换算（frame.transform）把所有探针换算成屏幕坐标，用numpy的高级索引一次从原始截图上
+    取出所有像素和期望颜色比较：不缩放整帧、不转灰度，也不会触发帧上任何派生图像的计算，只要几微秒。
+    探针没通过的页面不再做模板匹配；通过了也只是“可能是”，仍然要用特征元素的模板匹配确认。
+    """
+
+    def __init__(self, probes: list[ColorProbe], min_ratio: float = DEFAULT_PROBE_MIN_RATIO):
+        """
+        :param probes: 颜色探针
+        :param min_ratio: 至少要有这个比例的探针通过
+        """
+        self.probes = list(probes)
+        self.min_ratio = min_ratio
+        # 期望颜色和容差（第一次检查时才构造，创建页面时不导入numpy）
+        self._expected: tuple[np.ndarray, np.ndarray] | None = None
+        # (坐标换算, 屏幕尺寸) -> (xs, ys, 是否在屏幕内)
+        self._screen_points: dict[tuple, tuple[np.ndarray, np.ndarray, np.ndarray]] = {}
+
+    def __len__(self):
+        return len(self.probes)
+
+    def match_ratio(self, frame: Frame) -> float:
+        """
+        :return: 通过的探针占所有探针的比例，没有探针时为1
+        """
+        if not self.probes:
+            return 1.0
+        colors, tolerances = self._expected_colors()
+        xs, ys, inside = self._points_for(frame.transform, frame.size)
+        pixels = frame.image[ys, xs].astype(np.int16)
+        passed = (np.abs(pixels - colors).max(axis=1) <= tolerances) & inside
+        return float(passed.mean())
+
+    def check(self, frame: Frame) -> bool:
+        """帧上是否有可能是这个页面（通过的探针比例达到min_ratio）"""
+        return self.match_ratio(frame) >= self.min_ratio
+
+    def __repr__(self):
+        return f"ProbeSet({len(self.probes)} probes, min_ratio={self.min_ratio})"
+
+    def _expected_colors(self) -> tuple[np.ndarray, np.ndarray]:
+        if self._expected is None:
+            self._expected = (np.array([probe.color for probe in self.probes], np.int16),
+                              np.array([probe.tolerance for probe in self.probes], np.int16))
+        return self._expected
+
+    def _points_for(self, transform: ScreenTransform, screen_size: tuple[int, int]):
+        """探针在屏幕上的坐标，每种坐标换算只计算一次"""
+        key = (transform, screen_size)
+        points = self._screen_points.get(key)
+        if points is None:
+            width, height = screen_size
+            screen = [transform.to_screen(probe.x, probe.y) for probe in self.probes]
+            xs = np.array([x for x, _ in screen], np.intp)
+            ys = np.array([y for _, y in screen], np.intp)
+            # 超出屏幕的探针（界面比屏幕大时可能发生）算作不通过
+            inside = (xs >= 0) & (xs < width) & (ys >= 0) & (ys < height)
+            points = (np.clip(xs, 0, width - 1), np.clip(ys, 0, height - 1), inside)
+            if len(self._screen_points) >= _MAX_CACHED_TRANSFORMS:
+                self._screen_points.clear()
+            self._screen_points[key] = points
+        return points
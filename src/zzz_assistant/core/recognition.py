@@ -0,0 +1,161 @@
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+
+from pages.base_page import BasePage, CheckElement
+from src.zzz_assistant.core.frame import Frame
+from src.zzz_assistant.core.metrics import metrics
+from src.zzz_assistant.core.vision import DEFAULT_THRESHOLD, MatchResult, match_template
+from src.zzz_assistant.utils.log import get_logger
+
+logger = get_logger(__name__)
+
+# 默认的识别线程数
+DEFAULT_RECOGNITION_WORKERS = 4
+
+
+class PageRecognition:
+    """
+    一次页面识别的结果
+
+    page(BasePage | None): 识别出的页面，没有识别出任何页面时为None
+    scores(dict[str, float]): 识别出的页面每个特征元素的相似度
+    matches(dict[str, MatchResult]): 识别出的页面每个特征元素的匹配结果（含坐标）
+    all_scores(dict[str, dict[str, float]]): 本次识别中所有已完成检查的 页面名 -> {元素键: 相似度}
+    match_count(int): 本次识别实际执行了多少次模板匹配（被取消的不算）
+    probe_rejected(list[str]): 颜色探针没通过、没有做模板匹配就排除的页面名
+    """
+    def __init__(self,
+                 page: BasePage | None,
+                 matches: dict[str, MatchResult],
+                 all_scores: dict[str, dict[str, float]],
+                 match_count: int = 0,
+                 probe_rejected: list[str] | None = None):
+        self.page = page
+        self.matches = matches
+        self.scores = {key: match.score for key, match in matches.items()}
+        self.all_scores = all_scores
+        self.match_count = match_count
+        self.probe_rejected = probe_rejected or []
+
+    def location(self, key: str) -> tuple[int, int] | None:
+        """
+        识别出的页面上某个特征元素的中心点坐标（设计分辨率），识别时已经匹配过，不用再截图、再匹配
+        :return: 不是识别出的页面的元素时返回None
+        """
+        match = self.matches.get(key)
+        return match.center if match is not None else None
+
+    def __repr__(self):
+        name = self.page.name if self.page else None
+        return f"PageRecognition(page={name!r}, scores={self.scores})"
+
+
+class RecognitionEngine:
+    """
+    并行页面识别引擎
+
+    先用颜色探针（BasePage.probes）排除不可能的页面，这一步在调用线程里直接做，只要几微秒；
+    然后把一帧截图上剩下的所有 (页面, 特征元素) 的组合同时丢进线程池里匹配。
+    OpenCV的matchTemplate执行时会释放GIL，所以多线程可以真正并行。
+    某个页面的所有元素都匹配成功后就确认该页面，取消其余还没开始的匹配；
+    某个页面只要有一个元素低于阈值，就取消这个页面剩下的匹配。
+    """
+
+    def __init__(self, max_workers: int = DEFAULT_RECOGNITION_WORKERS, threshold: float = DEFAULT_THRESHOLD):
+        """
+        :param max_workers: 线程池的最大线程数，可以在config.default.yaml的vision.recognition_workers中配置
+        :param threshold: 判断元素存在的相似度阈值
+        """
+        self.max_workers = max(1, max_workers)
+        self.threshold = threshold
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="recognition")
+
+    def recognize(self, frame: Frame, pages: list[BasePage], threshold: float | None = None) -> PageRecognition:
+        """
+        识别截图属于哪个页面
+        :param frame: 截图帧
+        :param pages: 候选页面列表，排在前面的页面先匹配
+        :param threshold: 本次识别使用的阈值，为None时使用引擎的默认阈值；设置了自己阈值的元素（CheckElement.threshold）以元素的为准
+        :return: PageRecognition。如果同时有多个页面确认成功，返回平均相似度最高的那个
+        """
+        threshold = self.threshold if threshold is None else threshold
+        # 颜色探针不通过的页面不做模板匹配
+        probe_rejected = [page.name for page in pages if not page.might_be_on_page(frame)]
+        if probe_rejected:
+            metrics.inc('recognition.probe_rejects', len(probe_rejected))
+            pages = [page for page in pages if page.name not in probe_rejected]
+        futures: dict[Future, tuple[BasePage, CheckElement]] = {}
+        pending_by_page: dict[str, set[Future]] = {}
+        for page in pages:
+            page_futures = set()
+            for element in page.check_elements:
+                # 带上调用方的上下文，识别线程里记录的指标才会有设备等标签
+                future = self._executor.submit(metrics.current_context().run, match_template, frame, element.key,
+                                               element.roi, element.margin, page.strategy,
+                                               self._element_threshold(element, threshold))
+                futures[future] = (page, element)
+                page_futures.add(future)
+            pending_by_page[page.name] = page_futures
+
+        page_matches: dict[str, dict[str, MatchResult]] = {page.name: {} for page in pages}
+        all_scores: dict[str, dict[str, float]] = {page.name: {} for page in pages}
+        confirmed: list[BasePage] = []
+        rejected: set[str] = set()
+
+        not_done = set(futures)
+        while not_done and not confirmed:
+            done, not_done = wait(not_done, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.cancelled():
+                    continue
+                page, element = futures[future]
+                pending_by_page[page.name].discard(future)
+                if page.name in rejected:
+                    continue
+
+                try:
+                    match = future.result()
+                except Exception as e:
+                    logger.error("识别【%s】的特征【%s】时发生错误：%s", page.name, element.key, e)
+                    match = None
+
+                if match is None or match.score < self._element_threshold(element, threshold):
+                    if match is not None:
+                        all_scores[page.name][element.key] = match.score
+                    # 只要有一个元素没找到，这个页面剩下的匹配就没必要做了
+                    rejected.add(page.name)
+                    self._cancel(pending_by_page[page.name])
+                    continue
+
+                all_scores[page.name][element.key] = match.score
+                page_matches[page.name][element.key] = match
+                if len(page_matches[page.name]) == len(page.check_elements):
+                    confirmed.append(page)
+
+        # 已经确认了页面，剩下还没开始的匹配全部取消
+        self._cancel(not_done)
+        match_count = sum(1 for future in futures if not future.cancelled())
+
+        if not confirmed:
+            return PageRecognition(None, {}, all_scores, match_count, probe_rejected)
+
+        best = max(confirmed, key=lambda p: self._mean_score(page_matches[p.name]))
+        return PageRecognition(best, page_matches[best.name], all_scores, match_count, probe_rejected)
+
+    def shutdown(self):
+        """关闭线程池"""
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    @staticmethod
+    def _element_threshold(element: CheckElement, threshold: float) -> float:
+        return threshold if element.threshold is None else element.threshold
+
+    @staticmethod
+    def _cancel(futures):
+        for future in futures:
+            future.cancel()
+
+    @staticmethod
+    def _mean_score(matches: dict[str, MatchResult]) -> float:
+        if not matches:
+            return 0.0
+        return sum(match.score for match in matches.values()) / len(matches)
@@ -0,0 +1,243 @@
+from __future__ import annotations
+
+import bisect
+import json
+import os
+import threading
+import time
+import zipfile
+
+from src.zzz_assistant.core.frame import Frame
+from src.zzz_assistant.utils.lazy_import import lazy_import
+from src.zzz_assistant.utils.log import get_logger
+
+cv2 = lazy_import('cv2')
+np = lazy_import('numpy')
+logger = get_logger(__name__)
+
+# 会话文件的格式版本，格式不兼容地修改时加一
+SESSION_VERSION = 1
+# 录制时PNG的压缩等级：录制发生在运行过程中，用较快的压缩
+RECORD_PNG_COMPRESSION = 1
+
+
+class SessionRecorder:
+    """
+    会话录制器
+
+    包装一个Device，接口和Device完全一样（screenshot、click、is_game_running、start_game……），
+    所有调用照常转发给真正的设备，同时把带时间戳的画面和输入操作记录到一个会话文件里。
+    会话文件是一个zip：events.json记录所有调用，frames/下是去重后的PNG画面（像素完全相同的帧只存一次）。
+    之后可以用ReplayDevice离线回放，对Navigator、任务和find_template做可重复的基准测试。
+    """
+
+    def __init__(self, device, path: str | os.PathLike):
+        """
+        :param device: 要录制的设备（Device或者任何接口相同的对象）
+        :param path: 会话文件路径，建议以.session.zip结尾
+        """
+        self.device = device
+        self.path = path
+        self._zip = zipfile.ZipFile(path, 'w', compression=zipfile.ZIP_STORED)
+        self._events: list[dict] = []
+        self._frame_ids: dict[bytes, int] = {}
+        self._start = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def __getattr__(self, name):
+        # 没有录制需要的属性（serial、frames_captured等）直接转发给真正的设备
+        return getattr(self.device, name)
+
+    def connect(self) -> bool:
+        return self._record('connect', self.device.connect())
+
+    def screenshot(self) -> Frame | None:
+        frame = self.device.screenshot()
+        if frame is None:
+            self._record('screenshot', None, frame=None)
+            return None
+        # 按完整像素内容去重，不能用缩略图比较：小的界面变化（数字、红点）在缩略图上几乎看不出来
+        content_hash = frame.content_hash
+        with self._lock:
+            frame_id = self._frame_ids.get(content_hash)
+            if frame_id is None:
+                frame_id = len(self._frame_ids)
+                self._frame_ids[content_hash] = frame_id
+                is_success, buffer = cv2.imencode('.png', frame.image,
+                                                  [cv2.IMWRITE_PNG_COMPRESSION, RECORD_PNG_COMPRESSION])
+                if is_success:
+                    self._zip.writestr(f"frames/{frame_id}.png", buffer.tobytes())
+        self._record('screenshot', True, frame=frame_id)
+        return frame
+
+    def click(self, x: int, y: int):
+        self._record('click', None, x=int(x), y=int(y))
+        return self.device.click(x, y)
+
+    def swipe(self, x1: int, y1: int, x2: int, y2: int, duration_ms: int = 300):
+        self._record('swipe', None, points=[int(x1), int(y1), int(x2), int(y2)], duration_ms=duration_ms)
+        return self.device.swipe(x1, y1, x2, y2, duration_ms)
+
+    def long_press(self, x: int, y: int, duration_ms: int = 1000):
+        self._record('long_press', None, points=[int(x), int(y)], duration_ms=duration_ms)
+        return self.device.long_press(x, y, duration_ms)
+
+    def gesture(self, gesture, name: str = 'gesture'):
+        self._record('gesture', None, steps=[list(step) for step in gesture.steps])
+        return self.device.gesture(gesture, name)
+
+    def is_game_running(self, package_name: str) -> bool:
+        return self._record('is_game_running', self.device.is_game_running(package_name), package=package_name)
+
+    def start_game(self, package_name: str) -> bool:
+        return self._record('start_game', self.device.start_game(package_name), package=package_name)
+
+    def close(self):
+        """
+        写入事件列表并关闭会话文件，同时关闭被包装的设备
+        """
+        with self._lock:
+            if self._zip is not None:
+                meta = {
+                    'version': SESSION_VERSION,
+                    'serial': getattr(self.device, 'serial', None),
+                    'duration': time.perf_counter() - self._start,
+                    'frames': len(self._frame_ids),
+                    'events': self._events,
+                }
+                self._zip.writestr('events.json', json.dumps(meta, ensure_ascii=False))
+                self._zip.close()
+                self._zip = None
+                logger.info("会话已保存到%s：%d个事件，%d帧不同的画面。", self.path, len(self._events), len(self._frame_ids))
+        self.device.close()
+
+    def _record(self, event_type: str, result, **fields):
+        event = {'t': round(time.perf_counter() - self._start, 4), 'type': event_type, 'result': result}
+        event.update(fields)
+        with self._lock:
+            self._events.append(event)
+        return result
+
+
+class ReplayDevice:
+    """
+    会话回放设备
+
+    接口和Device一样（screenshot、click、swipe、is_game_running、start_game……），数据来自SessionRecorder录制的会话文件。
+    默认按顺序回放：第n次screenshot()返回录制时第n次截到的画面，不需要等待，所以比实时快得多；
+    指定speed时按录制的时间轴回放（speed=10表示10倍速）。
+    回放时的点击会和录制时的点击做对比，不一致的记录在divergences里，方便发现行为上的变化。
+    """
+
+    def __init__(self, path: str | os.PathLike, speed: float | None = None, serial: str = 'replay'):
+        """
+        :param path: 会话文件路径
+        :param speed: 按时间轴回放的倍速，为None时按调用顺序回放
+        :param serial: 回放设备的序列号（仅用于显示）
+        """
+        self.serial = serial
+        self.speed = speed
+        self.device = None
+        self.capture = None
+        self.capture_limiter = None
+        self.frames_captured = 0
+        self.clicks = 0
+        self.divergences: list[str] = []
+
+        with zipfile.ZipFile(path, 'r') as zf:
+            meta = json.loads(zf.read('events.json'))
+            if meta.get('version') != SESSION_VERSION:
+                raise ValueError(f"不支持的会话文件版本：{meta.get('version')}")
+            self._images: dict[int, np.ndarray] = {}
+            for name in zf.namelist():
+                if name.startswith('frames/') and name.endswith('.png'):
+                    frame_id = int(name[len('frames/'):-len('.png')])
+                    data = np.frombuffer(zf.read(name), np.uint8)
+                    self._images[frame_id] = cv2.imdecode(data, cv2.IMREAD_COLOR)
+
+        self.recorded_duration = meta.get('duration', 0.0)
+        self._events_by_type: dict[str, list[dict]] = {}
+        for event in meta['events']:
+            self._events_by_type.setdefault(event['type'], []).append(event)
+        self._screenshots = self._events_by_type.get('screenshot', [])
+        self._screenshot_times = [e['t'] for e in self._screenshots]
+        self._cursors: dict[str, int] = {}
+        self._start: float | None = None
+
+    @property
+    def finished(self) -> bool:
+        """录制的画面是否已经全部回放完"""
+        if self.speed:
+            return self._start is not None and \
+                (time.perf_counter() - self._start) * self.speed >= self.recorded_duration
+        return self._cursors.get('screenshot', 0) >= len(self._screenshots)
+
+    def connect(self) -> bool:
+        self.device = self
+        self._start = time.perf_counter()
+        return True
+
+    def close(self):
+        pass
+
+    def screenshot(self) -> Frame | None:
+        if self._start is None:
+            self._start = time.perf_counter()
+        if not self._screenshots:
+            return None
+
+        if self.speed:
+            # 按时间轴：取录制时间不晚于当前回放时间的最后一帧
+            now = (time.perf_counter() - self._start) * self.speed
+            index = max(0, bisect.bisect_right(self._screenshot_times, now) - 1)
+        else:
+            # 按顺序：放完后一直停在最后一帧
+            index = min(self._cursors.get('screenshot', 0), len(self._screenshots) - 1)
+            self._cursors['screenshot'] = index + 1
+
+        frame_id = self._screenshots[index].get('frame')
+        if frame_id is None:
+            return None
+        self.frames_captured += 1
+        return Frame(self._images[frame_id])
+
+    def click(self, x: int, y: int):
+        self.clicks += 1
+        expected = self._next_event('click')
+        if expected is None:
+            self.divergences.append(f"多出的点击({x}, {y})")
+        elif (expected['x'], expected['y']) != (int(x), int(y)):
+            self.divergences.append(f"第{self.clicks}次点击位置不同：录制时({expected['x']}, {expected['y']})，回放时({x}, {y})")
+
+    def swipe(self, x1: int, y1: int, x2: int, y2: int, duration_ms: int = 300):
+        self._check_input('swipe', points=[int(x1), int(y1), int(x2), int(y2)])
+
+    def long_press(self, x: int, y: int, duration_ms: int = 1000):
+        self._check_input('long_press', points=[int(x), int(y)])
+
+    def gesture(self, gesture, name: str = 'gesture'):
+        self._check_input('gesture', steps=[list(step) for step in gesture.steps])
+
+    def is_game_running(self, package_name: str) -> bool:
+        event = self._next_event('is_game_running')
+        return bool(event['result']) if event else True
+
+    def start_game(self, package_name: str) -> bool:
+        event = self._next_event('start_game')
+        return bool(event['result']) if event else True
+
+    def _check_input(self, event_type: str, **fields):
+        """和录制时同类型的下一个输入操作对比，不一致的记到divergences里"""
+        expected = self._next_event(event_type)
+        if expected is None:
+            self.divergences.append(f"多出的{event_type}：{fields}")
+        elif any(expected.get(key) != value for key, value in fields.items()):
+            recorded = {key: expected.get(key) for key in fields}
+            self.divergences.append(f"{event_type}不同：录制时{recorded}，回放时{fields}")
+
+    def _next_event(self, event_type: str) -> dict | None:
+        """按顺序取出下一个指定类型的录制事件"""
+        events = self._events_by_type.get(event_type, [])
+        index = self._cursors.get(event_type, 0)
+        self._cursors[event_type] = index + 1
+        return events[index] if index < len(events) else None
@@ -0,0 +1,264 @@
+from __future__ import annotations
+
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+from src.zzz_assistant.core.asset_pack import DEFAULT_PACK_PATH, AssetPack
+from src.zzz_assistant.utils.lazy_import import lazy_import
+from src.zzz_assistant.utils.log import get_logger
+from src.zzz_assistant.utils.paths import ASSETS_PATH
+
+cv2 = lazy_import('cv2')
+np = lazy_import('numpy')
+logger = get_logger(__name__)
+
+# LRU中最多保留的模板数量，超出后淘汰最久未使用的模板
+DEFAULT_MAX_TEMPLATES = 64
+
+
+class Template:
+    """
+    一张已经解码、预处理好，可以直接拿去匹配的模板
+
+    key(str): 模板的键，即相对于assets/的路径（不带扩展名），例如 'login/CLICK_INTO_GAME'
+    path(Path): 模板图片在磁盘上的路径
+    mtime(float): 加载时文件的修改时间，用于判断缓存是否过期
+    bgr(np.ndarray): BGR三通道图像
+    gray(np.ndarray): 灰度图像
+    mask(np.ndarray | None): 如果PNG带透明通道，则为由alpha生成的掩码，否则为None
+    从模板包加载时，gray和金字塔各层直接使用包里预先算好的数组（只读）
+    """
+    def __init__(self,
+                 key: str,
+                 path: Path,
+                 mtime: float,
+                 bgr: np.ndarray,
+                 mask: np.ndarray | None,
+                 gray: np.ndarray | None = None,
+                 pyramid: dict[int, np.ndarray] | None = None):
+        self.key = key
+        self.path = path
+        self.mtime = mtime
+        self.bgr = bgr
+        self.gray = cv2.cvtColor(bgr, cv2.COLOR_BGR2GRAY) if gray is None else gray
+        self.mask = mask
+        self._pyramid: dict[int, np.ndarray] = {**(pyramid or {}), 0: self.gray}
+        self._rescaled: dict[float, tuple[np.ndarray, np.ndarray | None]] = {}
+
+    @property
+    def name(self) -> str:
+        """模板的短名称（文件名，不带扩展名）"""
+        return self.key.split('/')[-1]
+
+    @property
+    def size(self) -> tuple[int, int]:
+        """模板尺寸 (宽, 高)"""
+        h, w = self.bgr.shape[:2]
+        return w, h
+
+    def rescaled(self, scale: float) -> tuple[np.ndarray, np.ndarray | None]:
+        """
+        缩放到设备屏幕尺寸的模板，用来直接在原始截图上匹配（见vision.match_template_at）
+        每个比例只缩放一次
+        :param scale: 缩放比例（ScreenTransform.scale）
+        :return: (BGR图像, 掩码或None)
+        """
+        scale = round(scale, 4)
+        rescaled = self._rescaled.get(scale)
+        if rescaled is None:
+            w, h = self.size
+            size = (max(1, round(w * scale)), max(1, round(h * scale)))
+            interpolation = cv2.INTER_AREA if scale < 1 else cv2.INTER_LINEAR
+            bgr = cv2.resize(self.bgr, size, interpolation=interpolation)
+            mask = cv2.resize(self.mask, size, interpolation=cv2.INTER_NEAREST) if self.mask is not None else None
+            rescaled = self._rescaled[scale] = (bgr, mask)
+        return rescaled
+
+    def pyramid(self, level: int) -> np.ndarray:
+        """
+        灰度图的金字塔层，和Frame.pyramid()一一对应
+        :param level: 0为原始灰度图，每高一层宽高各缩小一半
+        """
+        image = self._pyramid.get(level)
+        if image is None:
+            image = cv2.pyrDown(self.pyramid(level - 1))
+            self._pyramid[level] = image
+        return image
+
+
+class TemplateRegistry:
+    """
+    模板注册表
+
+    每张模板只从磁盘读取、解码一次，之后都从内存中取。
+    使用有上限的LRU保存，并在文件的mtime变化时自动重新加载，
+    这样在开发时替换了assets/里的图片也不用重启程序。
+
+    如果存在模板包（见asset_pack.py，由dev_tools/create_template.py生成），
+    没有改动过的模板直接从包里映射，不用解码PNG；包里没有或已过期的模板仍然从PNG加载。
+    """
+
+    def __init__(self,
+                 assets_root: Path = ASSETS_PATH,
+                 max_size: int = DEFAULT_MAX_TEMPLATES,
+                 pack_path: Path | None = DEFAULT_PACK_PATH):
+        """
+        :param pack_path: 模板包路径，为None时不使用模板包
+        """
+        self.assets_root = Path(assets_root)
+        self.max_size = max_size
+        self.pack_path = pack_path
+        self._pack: AssetPack | None = None
+        self._pack_opened = False
+        self._stale_warned: set[str] = set()
+        self._cache: OrderedDict[str, Template] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def resolve_path(self, key: str) -> Path:
+        """
+        把模板键解析为磁盘路径
+        :param key: 例如 'login/CLICK_INTO_GAME'，没有扩展名时默认为.png
+        :return: 模板文件路径
+        """
+        path = Path(key)
+        if not path.suffix:
+            path = path.with_suffix('.png')
+        if not path.is_absolute():
+            path = self.assets_root / path
+        return path
+
+    def get(self, key: str) -> Template | None:
+        """
+        按键获取模板，必要时从磁盘加载
+        :param key: 模板键
+        :return: Template对象，文件不存在或无法解码时返回None
+        """
+        path = self.resolve_path(key)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            logger.error("模板文件不存在：%s", path)
+            with self._lock:
+                self._cache.pop(key, None)
+            return None
+
+        mtime = stat.st_mtime
+        with self._lock:
+            template = self._cache.get(key)
+            if template is not None and template.mtime == mtime:
+                self._cache.move_to_end(key)
+                return template
+
+        # 锁外解码，避免一张大图阻塞其他线程的查询
+        template = self._load_from_pack(key, path, stat)
+        if template is None:
+            template = self._load(key, path, mtime)
+        if template is None:
+            return None
+
+        with self._lock:
+            self._cache[key] = template
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.max_size:
+                self._cache.popitem(last=False)
+        return template
+
+    def keys(self) -> list[str]:
+        """assets目录下所有模板的键"""
+        return sorted(path.relative_to(self.assets_root).with_suffix('').as_posix()
+                      for path in self.assets_root.rglob('*.png'))
+
+    def preload(self, keys: list[str] | None = None) -> int:
+        """
+        预先加载模板（预热），一般放在后台线程里和连接设备同时进行，
+        这样第一次识别页面时不用再等OpenCV导入和模板解码
+        :param keys: 要加载的模板键，为None时加载assets下的所有模板
+        :return: 成功加载的模板数量
+        """
+        keys = self.keys() if keys is None else keys
+        return sum(1 for key in keys if self.get(key) is not None)
+
+    @property
+    def pack(self) -> AssetPack | None:
+        """模板包，第一次用到时打开；不存在或无法读取时为None"""
+        if not self._pack_opened:
+            with self._lock:
+                if not self._pack_opened:
+                    self._pack = self._open_pack()
+                    self._pack_opened = True
+        return self._pack
+
+    def invalidate(self, key: str | None = None):
+        """
+        手动让缓存失效
+        :param key: 要失效的模板键，为None时清空全部缓存
+        """
+        with self._lock:
+            if key is None:
+                self._cache.clear()
+            else:
+                self._cache.pop(key, None)
+
+    def __len__(self) -> int:
+        return len(self._cache)
+
+    def _open_pack(self) -> AssetPack | None:
+        if self.pack_path is None or not os.path.exists(self.pack_path):
+            return None
+        try:
+            return AssetPack(self.pack_path)
+        except (OSError, ValueError) as e:
+            logger.warning("无法读取模板包，将直接加载PNG：%s", e)
+            return None
+
+    def _load_from_pack(self, key: str, path: Path, stat: os.stat_result) -> Template | None:
+        pack = self.pack
+        entry = pack.get(key) if pack is not None else None
+        if entry is None:
+            return None
+        if not entry.matches_source(stat):
+            if key not in self._stale_warned:
+                self._stale_warned.add(key)
+                logger.warning("模板包中的%s已过期，改为加载PNG（可以重新运行dev_tools/create_template.py）", key)
+            return None
+        pyramid = {}
+        level = 1
+        while (image := pack.array(entry, f"pyramid{level}")) is not None:
+            pyramid[level] = image
+            level += 1
+        return Template(key, path, stat.st_mtime, pack.array(entry, 'bgr'), pack.array(entry, 'mask'),
+                        gray=pack.array(entry, 'gray'), pyramid=pyramid)
+
+    @staticmethod
+    def _load(key: str, path: Path, mtime: float) -> Template | None:
+        # 使用imdecode来处理中文路径问题
+        with open(path, 'rb') as f:
+            data = np.frombuffer(f.read(), np.uint8)
+        image = cv2.imdecode(data, cv2.IMREAD_UNCHANGED)
+        if image is None:
+            logger.error("无法加载图片：%s", path)
+            return None
+
+        mask = None
+        if image.ndim == 2:
+            bgr = cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)
+        elif image.shape[2] == 4:
+            alpha = image[:, :, 3]
+            bgr = np.ascontiguousarray(image[:, :, :3])
+            # 完全不透明的模板不需要掩码，走更快的无掩码匹配
+            if alpha.min() < 255:
+                mask = cv2.merge([alpha, alpha, alpha])
+        else:
+            bgr = image
+        return Template(key, path, mtime, bgr, mask)
+
+
+# 全局共享的模板注册表
+template_registry = TemplateRegistry()
+
+
+def get_template(key: str) -> Template | None:
+    """从全局注册表中获取模板"""
+    return template_registry.get(key)
@@ -0,0 +1,181 @@
+import json
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from src.zzz_assistant.utils.log import get_logger
+from src.zzz_assistant.utils.paths import CACHE_PATH
+
+logger = get_logger(__name__)
+
+# 页面跳转图的默认保存位置
+DEFAULT_TRANSITIONS_FILE = CACHE_PATH / "page_transitions.json"
+
+# 表示“未识别出任何页面”的状态名
+UNKNOWN_PAGE = "<unknown>"
+
+# 页面自己声明的跳转（next_pages）相当于预先观察到了这么多次
+DECLARED_PRIOR = 1.0
+# 停留在同一个页面也是一种跳转，同样给一个先验
+SELF_PRIOR = 1.0
+# 两次保存之间至少间隔多少秒，避免在识别循环里频繁写盘
+SAVE_INTERVAL = 10.0
+
+
+class PageTransitionGraph:
+    """
+    页面跳转图
+
+    记录 “上一个页面 -> 当前页面” 出现的次数，加上页面声明的先验（BasePage.next_pages），
+    用来估计从某个页面出发，下一次最可能看到哪个页面。学到的次数会保存到磁盘，下次运行时继续使用。
+    """
+
+    def __init__(self, path: Path | None = DEFAULT_TRANSITIONS_FILE, declared: dict[str, list[str]] | None = None):
+        """
+        :param path: 保存学习结果的json文件，为None时不持久化
+        :param declared: 页面声明的跳转 页面名 -> [可能的下一个页面名]
+        """
+        self.path = Path(path) if path else None
+        self.declared = declared or {}
+        self.counts: dict[str, dict[str, int]] = {}
+        self._dirty = False
+        self._last_save = 0.0
+        self._lock = threading.Lock()
+        # 保证同一时间只有一个线程在写文件
+        self._save_lock = threading.Lock()
+        self.load()
+
+    def record(self, previous: str, current: str):
+        """
+        记录一次观察到的跳转
+        :param previous: 上一个页面名（未识别时为UNKNOWN_PAGE）
+        :param current: 当前页面名（未识别时为UNKNOWN_PAGE）
+        """
+        with self._lock:
+            row = self.counts.setdefault(previous, {})
+            row[current] = row.get(current, 0) + 1
+            self._dirty = True
+        if time.time() - self._last_save >= SAVE_INTERVAL:
+            self.save()
+
+    def weight(self, previous: str, candidate: str) -> float:
+        """从previous跳到candidate的（未归一化的）可能性"""
+        weight = float(self.counts.get(previous, {}).get(candidate, 0))
+        if candidate in self.declared.get(previous, ()):
+            weight += DECLARED_PRIOR
+        if candidate == previous:
+            weight += SELF_PRIOR
+        return weight
+
+    def rank(self, previous: str, candidates: list[str]) -> list[tuple[str, float]]:
+        """
+        按可能性从高到低给候选页面排序
+        :param previous: 上一个页面名
+        :param candidates: 候选页面名（顺序作为可能性相同时的次序）
+        :return: [(页面名, 概率)]，概率为0表示从没见过也没声明过这个跳转
+        """
+        weights = [(name, self.weight(previous, name)) for name in candidates]
+        total = sum(w for _, w in weights)
+        order = sorted(range(len(weights)), key=lambda i: -weights[i][1])
+        return [(weights[i][0], weights[i][1] / total if total else 0.0) for i in order]
+
+    def load(self):
+        """从磁盘加载之前学到的跳转次数"""
+        if not self.path or not self.path.exists():
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            self.counts = {prev: {cur: int(n) for cur, n in row.items()} for prev, row in data.get('counts', {}).items()}
+        except Exception as e:
+            logger.warning("加载页面跳转图时出错：%s，将重新学习。", e)
+            self.counts = {}
+
+    def save(self):
+        """把学到的跳转次数写到磁盘（没有变化时什么也不做）"""
+        if not self.path or not self._dirty:
+            return
+        with self._save_lock:
+            with self._lock:
+                if not self._dirty:
+                    return
+                # 在锁内复制一份，json.dump时其他线程还可能在record
+                data = {'counts': {prev: dict(row) for prev, row in self.counts.items()}}
+                self._dirty = False
+                self._last_save = time.time()
+            tmp_path = None
+            try:
+                os.makedirs(self.path.parent, exist_ok=True)
+                # 每次写入使用唯一的临时文件，再原子替换，避免多个写入者共用同一个临时文件
+                with tempfile.NamedTemporaryFile('w', encoding='utf-8', dir=self.path.parent,
+                                                 prefix=self.path.stem + '.', suffix='.tmp', delete=False) as f:
+                    tmp_path = f.name
+                    json.dump(data, f, ensure_ascii=False, indent=2)
+                os.replace(tmp_path, self.path)
+            except OSError as e:
+                logger.warning("保存页面跳转图时出错：%s", e)
+                if tmp_path and os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+
+
+# 同一个文件对应的跳转图，进程内所有Navigator共用一份
+_shared_graphs: dict[Path, PageTransitionGraph] = {}
+_shared_graphs_lock = threading.Lock()
+
+
+def get_transition_graph(path: Path | None = DEFAULT_TRANSITIONS_FILE,
+                         declared: dict[str, list[str]] | None = None) -> PageTransitionGraph:
+    """
+    获取进程内共用的页面跳转图
+
+    多设备运行时每台设备都有自己的Navigator，如果各自加载、各自保存同一个文件，
+    后写入的会覆盖其他设备学到的次数。这里按文件路径返回同一个实例，所有设备的观察都记在一起。
+    :param path: 保存学习结果的json文件，为None时不持久化（每次返回新的实例）
+    :param declared: 页面声明的跳转，会合并到共用实例已有的声明中
+    :return: PageTransitionGraph
+    """
+    if not path:
+        return PageTransitionGraph(None, declared)
+    key = Path(path).resolve()
+    with _shared_graphs_lock:
+        graph = _shared_graphs.get(key)
+        if graph is None:
+            graph = _shared_graphs[key] = PageTransitionGraph(key, declared)
+        elif declared:
+            for name, next_pages in declared.items():
+                known = graph.declared.setdefault(name, [])
+                known.extend(p for p in next_pages if p not in known)
+        return graph
+
+
+class PredictionStats:
+    """
+    页面预测的统计
+
+    predictions(int): 做出预测的次数
+    hits(int): 预测的页面被快速确认的次数
+    recognitions(int): 识别总次数
+    template_matches(int): 实际执行的模板匹配总次数
+    """
+
+    def __init__(self):
+        self.predictions = 0
+        self.hits = 0
+        self.recognitions = 0
+        self.template_matches = 0
+
+    @property
+    def hit_rate(self) -> float:
+        """预测命中率"""
+        return self.hits / self.predictions if self.predictions else 0.0
+
+    @property
+    def matches_per_recognition(self) -> float:
+        """平均每次识别执行多少次模板匹配"""
+        return self.template_matches / self.recognitions if self.recognitions else 0.0
+
+    def __repr__(self):
+        return (f"PredictionStats(预测{self.predictions}次, 命中{self.hits}次, 命中率{self.hit_rate:.0%}, "
+                f"平均每次识别{self.matches_per_recognition:.1f}次模板匹配)")
@@ -1,104 +1,516 @@
-import os
-from datetime import datetime
-import cv2
-import numpy as np
+from __future__ import annotations
 
-from src.zzz_assistant.utils.paths import PROJECT_ROOT
+import threading
+from collections import OrderedDict
+from typing import TYPE_CHECKING
 
-# 定义设计分辨率为720P
-DESIGN_RESOLUTION = (1280, 720) # 宽×高
+from src.zzz_assistant.core.flight_recorder import flight_recorder
+from src.zzz_assistant.core.frame import DESIGN_RESOLUTION, Frame, ScreenTransform
+from src.zzz_assistant.core.metrics import metrics
+from src.zzz_assistant.core.template_registry import Template, get_template
+from src.zzz_assistant.utils.lazy_import import lazy_import
+from src.zzz_assistant.utils.log import get_logger
 
-def find_template(screen_image_bytes: bytes,
-                  template_path: str,
-                  threshold: float = 0.8,
-                  debug_mode: bool = False) -> tuple[int, int] | None:
+if TYPE_CHECKING:
+    from src.zzz_assistant.core.vision_workers import VisionWorkerPool
+
+cv2 = lazy_import('cv2')
+np = lazy_import('numpy')
+logger = get_logger(__name__)
+
+def crop_roi(screen_size: tuple[int, int],
+             roi: tuple[int, int, int, int] | None,
+             margin: int = 0) -> tuple[int, int, int, int]:
+    """
+    计算实际要搜索的矩形区域
+    :param screen_size: 设计分辨率下的画面尺寸 (宽, 高)
+    :param roi: 搜索区域 (x, y, 宽, 高)，为None时搜索全屏
+    :param margin: 在搜索区域四周额外扩展的像素
+    :return: 裁剪到画面范围内的 (x, y, 宽, 高)
+    """
+    screen_w, screen_h = screen_size
+    if roi is None:
+        return 0, 0, screen_w, screen_h
+    x, y, w, h = roi
+    left = max(0, x - margin)
+    top = max(0, y - margin)
+    right = min(screen_w, x + w + margin)
+    bottom = min(screen_h, y + h + margin)
+    return left, top, max(0, right - left), max(0, bottom - top)
+
+
+# 默认的匹配阈值
+DEFAULT_THRESHOLD = 0.8
+
+# 匹配策略
+MATCH_FULL = 'full'          # 在全分辨率（720P）BGR图像上直接匹配
+MATCH_PYRAMID = 'pyramid'    # 先在缩小的灰度图上粗匹配，再在候选点附近精确匹配
+MATCH_STRATEGIES = (MATCH_FULL, MATCH_PYRAMID)
+
+# 金字塔匹配的参数
+PYRAMID_LEVEL = 2                # 粗匹配所在的层，2表示缩小到1/4
+PYRAMID_MIN_TEMPLATE_SIZE = 8    # 模板在粗匹配层上的最短边不能小于这个值，否则换用更低的层
+PYRAMID_COARSE_DROP = 0.1        # 粗匹配的阈值比正式阈值低多少
+PYRAMID_MAX_CANDIDATES = 3       # 最多精确匹配多少个候选点
+
+# find_all的参数
+FIND_ALL_MAX_RESULTS = 50    # 最多返回多少个实例
+NMS_OVERLAP = 0.3            # 两个匹配区域的重叠比例（交并比）超过它就算同一个实例，只保留相似度高的
+
+# 屏幕比设计分辨率小（缩放比例小于1）时，把模板缩小后直接在原始截图上匹配，
+# 比把整帧放大到720P再匹配更快也更清晰；屏幕更大时匹配的开销随比例的四次方增长，还是缩小整帧更划算
+TEMPLATE_RESCALE_MAX_SCALE = 1.0
+
+
+class MatchResult:
+    """
+    一次模板匹配的结果（无论是否超过阈值）
+
+    key(str): 模板键
+    score(float): 最高相似度，0-1
+    top_left(tuple[int, int]): 最佳匹配区域左上角在整个画面（设计分辨率）中的坐标
+    size(tuple[int, int]): 模板尺寸 (宽, 高)
+    """
+    def __init__(self, key: str, score: float, top_left: tuple[int, int], size: tuple[int, int]):
+        self.key = key
+        self.score = score
+        self.top_left = top_left
+        self.size = size
+
+    @property
+    def center(self) -> tuple[int, int]:
+        """匹配区域中心点坐标"""
+        return self.top_left[0] + self.size[0] // 2, self.top_left[1] + self.size[1] // 2
+
+    def __repr__(self):
+        return f"MatchResult({self.key!r}, score={self.score:.3f}, center={self.center})"
+
+
+class MatchMemo:
+    """
+    匹配结果备忘录
+
+    以 (画面内容哈希, 模板, 搜索区域, 策略, 阈值) 为键缓存MatchResult（find_all缓存的是MatchResult的列表）。
+    加载画面、等待界面时截到的大多是一模一样的画面，像素完全相同就直接复用上一次的匹配结果，
+    不用再跑一遍matchTemplate。使用有上限的LRU保存。
+    """
+
+    def __init__(self, max_size: int = 512):
+        self.max_size = max_size
+        self.enabled = True
+        self.hits = 0
+        self.misses = 0
+        self._cache: OrderedDict[tuple, MatchResult | list[MatchResult]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: tuple) -> MatchResult | list[MatchResult] | None:
+        with self._lock:
+            result = self._cache.get(key)
+            if result is None:
+                self.misses += 1
+                return None
+            self._cache.move_to_end(key)
+            self.hits += 1
+            return result
+
+    def put(self, key: tuple, result: MatchResult | list[MatchResult]):
+        with self._lock:
+            self._cache[key] = result
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.max_size:
+                self._cache.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+# 全局共享的匹配结果备忘录
+match_memo = MatchMemo()
+
+# 多进程视觉工作池（见vision_workers.py），为None时在本进程里匹配
+_worker_pool: VisionWorkerPool | None = None
+
+
+def set_worker_pool(pool: VisionWorkerPool | None, only_if: VisionWorkerPool | None = None):
+    """
+    让match_template把匹配交给工作池（传None恢复在本进程里匹配）
+    :param only_if: 不为None时，只有当前的工作池是它才替换，关闭旧工作池时不会误把新的卸掉
+    """
+    global _worker_pool
+    if only_if is None or _worker_pool is only_if:
+        _worker_pool = pool
+
+
+def match_template(frame: Frame,
+                   template_key: str,
+                   roi: tuple[int, int, int, int] | None = None,
+                   margin: int = 0,
+                   strategy: str = MATCH_FULL,
+                   threshold: float = DEFAULT_THRESHOLD) -> MatchResult | None:
+    """
+    在截图中匹配模板，返回最佳匹配位置和相似度，不做阈值判断
+    这是find_template和页面识别引擎共用的底层函数
+    :param frame: 截图帧
+    :param template_key: 模板键
+    :param roi: 设计分辨率下的搜索区域 (x, y, 宽, 高)，为None时搜索全屏
+    :param margin: 在搜索区域四周额外扩展的像素
+    :param strategy: 匹配策略，MATCH_FULL为全分辨率匹配，MATCH_PYRAMID为先粗后精的金字塔匹配
+    :param threshold: 匹配阈值，只有金字塔匹配会用它来决定粗匹配的候选点
+    :return: MatchResult，模板无法加载时返回None
+    """
+    # 1. 从模板注册表中取出已解码的模板（只有第一次或文件被修改时才会读盘）
+    template = get_template(template_key)
+    if template is None:
+        return None
+
+    # 2. 画面没变就直接复用之前的匹配结果（模板文件被修改过的话mtime不同，不会误用旧结果）
+    # 只有金字塔匹配的结果和阈值有关，全分辨率匹配不把阈值放进键里，不同阈值也能共用结果
+    memo_key = None
+    if match_memo.enabled:
+        memo_threshold = threshold if strategy == MATCH_PYRAMID else None
+        memo_key = (frame.content_hash, frame.transform, template_key, template.mtime, roi, margin, strategy,
+                    memo_threshold)
+        memoized = match_memo.get(memo_key)
+        metrics.inc('vision.memo_lookups', template=template_key, result='hit' if memoized is not None else 'miss')
+        if memoized is not None:
+            flight_recorder.record_match(frame, memoized, threshold)
+            return memoized
+    # 3. 配置了工作进程时交给工作池匹配，工作池不可用时返回None，在本进程里匹配
+    pool = _worker_pool
+    match = pool.match(frame, template_key, roi, margin, strategy, threshold) if pool is not None else None
+    if match is None:
+        match = _match(frame, template, roi, margin, strategy, threshold)
+    if memo_key is not None:
+        match_memo.put(memo_key, match)
+    # 只是把结果放进黑匣子的内存缓冲区，出错时才会写盘
+    flight_recorder.record_match(frame, match, threshold)
+    return match
+
+
+def _match(frame: Frame,
+           template: Template,
+           roi: tuple[int, int, int, int] | None,
+           margin: int,
+           strategy: str,
+           threshold: float) -> MatchResult:
+    # --- 多分辨率适配 ---
+    # 4. 屏幕比设计分辨率小时，缩小模板直接在原始截图上匹配，整帧不需要缩放
+    transform = frame.transform
+    if strategy == MATCH_FULL and transform.scale != 1 and transform.scale <= TEMPLATE_RESCALE_MAX_SCALE:
+        match = _match_screen(frame, template, roi, margin, transform)
+        if match is not None:
+            return match
+
+    # 否则取出缩放到设计分辨率的截图
+    # 截图帧会缓存缩放结果，同一帧被多个页面、多个模板检查时只缩放一次
+    with metrics.span('vision.resize'):
+        resized_screen = frame.scaled
+    template_w, template_h = template.size
+
+    # 5. 只在搜索区域内匹配
+    screen_h, screen_w = resized_screen.shape[:2]
+    search_area = crop_roi((screen_w, screen_h), roi, margin)
+    if search_area[2] < template_w or search_area[3] < template_h:
+        # 搜索区域比模板还小，说明区域声明有误，退回全屏搜索
+        logger.warning("模板%s的搜索区域%s比模板还小，改为全屏搜索。", template.key, roi)
+        search_area = (0, 0, screen_w, screen_h)
+
+    # 6. 执行模板匹配（matchTemplate执行期间会释放GIL，可以放心在多线程里调用）
+    if strategy not in MATCH_STRATEGIES:
+        raise ValueError(f"未知的匹配策略：{strategy}，可选：{MATCH_STRATEGIES}")
+    with metrics.span('vision.match', template=template.key, strategy=strategy):
+        if strategy == MATCH_PYRAMID:
+            level = _pyramid_level(template)
+            if level > 0:
+                return _match_pyramid(frame, template, search_area, level, threshold)
+        return _match_full(resized_screen, template, search_area)
+
+
+def _match_full(screen, template: Template, search_area: tuple[int, int, int, int]) -> MatchResult:
+    """
+    在设计分辨率的BGR图像上做一次完整的模板匹配
+    """
+    roi_x, roi_y, roi_w, roi_h = search_area
+    search_img = screen[roi_y:roi_y + roi_h, roi_x:roi_x + roi_w]
+    result = cv2.matchTemplate(search_img, template.bgr, cv2.TM_CCORR_NORMED, mask=template.mask)
+    min_val, max_val, min_loc, max_loc = cv2.minMaxLoc(result)
+    # 把搜索区域内的坐标映射回整个画面
+    top_left = (max_loc[0] + roi_x, max_loc[1] + roi_y)
+    return MatchResult(template.key, float(max_val), top_left, template.size)
+
+
+def _match_screen(frame: Frame,
+                  template: Template,
+                  roi: tuple[int, int, int, int] | None,
+                  margin: int,
+                  transform: ScreenTransform) -> MatchResult | None:
+    """
+    把模板按transform缩放后，直接在原始截图上匹配，结果换算回设计坐标
+    :return: MatchResult，搜索区域在屏幕上比缩放后的模板还小时返回None
+    """
+    bgr, mask = template.rescaled(transform.scale)
+    x, y, w, h = transform.to_screen_rect(crop_roi(DESIGN_RESOLUTION, roi, margin))
+    screen_h, screen_w = frame.image.shape[:2]
+    left, top = max(0, x), max(0, y)
+    right, bottom = min(screen_w, x + w), min(screen_h, y + h)
+    tpl_h, tpl_w = bgr.shape[:2]
+    if right - left < tpl_w or bottom - top < tpl_h:
+        return None
+    with metrics.span('vision.match', template=template.key, strategy='screen'):
+        result = cv2.matchTemplate(frame.image[top:bottom, left:right], bgr, cv2.TM_CCORR_NORMED, mask=mask)
+        min_val, max_val, min_loc, max_loc = cv2.minMaxLoc(result)
+    top_left = transform.to_design(left + max_loc[0], top + max_loc[1])
+    return MatchResult(template.key, float(max_val), top_left, template.size)
+
+
+def match_template_at(frame: Frame,
+                      template_key: str,
+                      transform: ScreenTransform,
+                      roi: tuple[int, int, int, int] | None = None,
+                      margin: int = 0) -> MatchResult | None:
+    """
+    假设设计坐标和屏幕坐标按transform换算，在原始截图上匹配模板（不走匹配缓存），用于缩放校准
+    :return: MatchResult，模板无法加载或搜索区域太小时返回None
+    """
+    template = get_template(template_key)
+    if template is None:
+        return None
+    return _match_screen(frame, template, roi, margin, transform)
+
+
+def _pyramid_level(template: Template) -> int:
+    """
+    决定模板在金字塔的第几层做粗匹配
+    模板缩得太小就没有区分度了，所以小模板会用更低的层，太小的模板（或带透明掩码的模板）直接返回0，即不走金字塔
+    """
+    if template.mask is not None:
+        return 0
+    level = PYRAMID_LEVEL
+    while level > 0 and min(template.size) // (2 ** level) < PYRAMID_MIN_TEMPLATE_SIZE:
+        level -= 1
+    return level
+
+
+def _match_pyramid(frame: Frame,
+                   template: Template,
+                   search_area: tuple[int, int, int, int],
+                   level: int,
+                   threshold: float) -> MatchResult:
+    """
+    先粗后精的金字塔匹配
+
+    1. 在缩小了2^level倍的灰度图上粗匹配，阈值比正式阈值低一些
+    2. 粗匹配没有任何候选点就直接判定不存在（提前拒绝）
+    3. 只在几个候选点附近的小窗口里用全分辨率BGR图像精确匹配，得到和全分辨率匹配可比的相似度
+    """
+    scale = 2 ** level
+    roi_x, roi_y, roi_w, roi_h = search_area
+    coarse_screen = frame.pyramid(level)
+    coarse_template = template.pyramid(level)
+    coarse_h, coarse_w = coarse_screen.shape[:2]
+    tpl_h, tpl_w = coarse_template.shape[:2]
+
+    # 把搜索区域换算到粗匹配层（向外取整，保证不会漏掉边缘）
+    left, top = roi_x // scale, roi_y // scale
+    right = min(coarse_w, -(-(roi_x + roi_w) // scale))
+    bottom = min(coarse_h, -(-(roi_y + roi_h) // scale))
+    if right - left < tpl_w or bottom - top < tpl_h:
+        return _match_full(frame.scaled, template, search_area)
+
+    result = cv2.matchTemplate(coarse_screen[top:bottom, left:right], coarse_template, cv2.TM_CCORR_NORMED)
+    coarse_threshold = threshold - PYRAMID_COARSE_DROP
+
+    candidates = []
+    best_coarse = None
+    for _ in range(PYRAMID_MAX_CANDIDATES):
+        min_val, max_val, min_loc, max_loc = cv2.minMaxLoc(result)
+        if best_coarse is None:
+            best_coarse = (max_val, max_loc)
+        if max_val < coarse_threshold:
+            break
+        candidates.append(max_loc)
+        # 抑制这个候选点周围的区域，下一轮找别处的峰值
+        x, y = max_loc
+        result[max(0, y - tpl_h // 2):y + tpl_h // 2 + 1, max(0, x - tpl_w // 2):x + tpl_w // 2 + 1] = 0
+
+    template_w, template_h = template.size
+    if not candidates:
+        # 提前拒绝：返回粗匹配的最高分，它一定低于阈值
+        max_val, (x, y) = best_coarse
+        top_left = ((left + x) * scale, (top + y) * scale)
+        return MatchResult(template.key, float(max_val), top_left, template.size)
+
+    # 在每个候选点附近精确匹配，窗口四周留出粗匹配的量化误差
+    pad = scale * 2
+    best = None
+    for x, y in candidates:
+        full_x, full_y = (left + x) * scale, (top + y) * scale
+        win_left = max(roi_x, full_x - pad)
+        win_top = max(roi_y, full_y - pad)
+        win_right = min(roi_x + roi_w, full_x + template_w + pad)
+        win_bottom = min(roi_y + roi_h, full_y + template_h + pad)
+        if win_right - win_left < template_w or win_bottom - win_top < template_h:
+            continue
+        match = _match_full(frame.scaled, template, (win_left, win_top, win_right - win_left, win_bottom - win_top))
+        if best is None or match.score > best.score:
+            best = match
+    if best is None:
+        return _match_full(frame.scaled, template, search_area)
+    return best
+
+
+def find_template(frame: Frame,
+                  template_key: str,
+                  threshold: float = DEFAULT_THRESHOLD,
+                  debug_mode: bool = False,
+                  roi: tuple[int, int, int, int] | None = None,
+                  margin: int = 0,
+                  strategy: str = MATCH_FULL) -> tuple[int, int] | None:
     """
     在截图中找模板图片
-    :param screen_image_bytes: 从device.screenshot()获取的原始截图字节
-    :param template_path: 模板图片在assets/中的路径
+    :param frame: 从device.screenshot()获取的截图帧
+    :param template_key: 模板的键，即模板在assets/中的相对路径（不带扩展名），例如 'login/CLICK_INTO_GAME'
     :param threshold: 匹配的相似度阈值，0-1，越高越严格
     :param debug_mode: 是否开启debug模式
-    :return: 如果找到，返回匹配区域中心点的坐标xy，否则返回none
+    :param roi: 设计分辨率下的搜索区域 (x, y, 宽, 高)，为None时搜索全屏
+    :param margin: 在搜索区域四周额外扩展的像素，用来容忍按钮位置的轻微偏移
+    :param strategy: 匹配策略，MATCH_FULL或MATCH_PYRAMID
+    :return: 如果找到，返回匹配区域中心点在整个画面（设计分辨率）中的坐标xy，否则返回none
     """
 
     try:
-        # 1.将截图字节流解码为OpenCV图像格式
-        screen_np = np.frombuffer(screen_image_bytes, np.uint8)
-        screen_img = cv2.imdecode(screen_np, cv2.IMREAD_COLOR)
-
-
-        # --- 多分辨率适配 ---
-        # 2. 将实时截图缩放到我们的设计分辨率
-        # 这样无论玩家用1080P还是2K屏，都是同一尺寸的图像
-        h, w = screen_img.shape[:2]
-        scale_ratio = DESIGN_RESOLUTION[1] / h # 按高度比例缩放
-        # 把原图按计算好的比例进行缩放
-        resized_screen = cv2.resize(screen_img, (int(w * scale_ratio), int(h * scale_ratio)), interpolation=cv2.INTER_AREA)
-
-
-        # 3. 加载模板图片 
-        with open(template_path, 'rb') as f:
-            template_bytes = f.read()
-        template_np = np.frombuffer(template_bytes, np.uint8)
-        template_img = cv2.imdecode(template_np, cv2.IMREAD_COLOR)
-        if template_img is None:
-            print(f"Error: 无法加载图片at {template_path}")
+        with metrics.span('vision.find_template', template=template_key):
+            match = match_template(frame, template_key, roi=roi, margin=margin, strategy=strategy,
+                                   threshold=threshold)
+        if match is None:
             return None
 
-        # 4. 执行模板匹配
-        result = cv2.matchTemplate(resized_screen, template_img, cv2.TM_CCORR_NORMED)
-        min_val, max_val, min_loc, max_loc = cv2.minMaxLoc(result)
-
-        if max_val >= threshold:
-            # 5.如果找到了，计算中心点坐标并返回
-            template_h, template_w = template_img.shape[:2]
-            center_x = max_loc[0] + template_w // 2
-            center_y = max_loc[1] + template_h // 2
+        if match.score >= threshold:
+            # 如果找到了，计算中心点坐标并返回
+            center_x, center_y = match.center
 
             # <<< 如果开启了debug模式，就保存证据 >>>
             if debug_mode:
-                print(f"[Debug]找到匹配！相似度为{max_val:.2f}，正在保存调试图片")
-
-                # 在截图上画出匹配区域
-                top_left = max_loc
-                bottom_right = (top_left[0] + template_w, top_left[1] + template_h)
-
-                # 用一个鲜艳的绿色矩形框标记出匹配区域，厚度为2
-                cv2.rectangle(resized_screen, top_left, bottom_right, (0, 255, 0), 2)
-
-                # 创建debug文件夹用于保存调试图片（如果不存在）
-                debug_dir = os.path.join(PROJECT_ROOT, "debug")
-                os.makedirs(debug_dir, exist_ok=True)
-
-                # 生成一个独一无二的文件名
-                readable_time = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
-                template_name = os.path.basename(template_path).split('.')[0]
-                debug_filename = f"debug_match_{template_name}_{readable_time}.png"
-                debug_filepath = os.path.join(debug_dir, debug_filename)
-
-                # 保存带有标记的截图
-                # 使用imencode来处理中文路径问题
-                is_success, buffer = cv2.imencode('.png', resized_screen)
-                if is_success:
-                    with open(debug_filepath, 'wb') as f:
-                        f.write(buffer)
-                    print(f"[Debug]已保存调试图片到{debug_filepath}")
+                save_debug_image(frame, match, threshold)
             # <<< 调试代码结束 >>>
 
 
-            print(f"在坐标{(center_x, center_y)}找到模板{template_path}, 相似度：{max_val:.2f}")
+            logger.debug("在坐标(%d, %d)找到模板%s，相似度：%.2f", center_x, center_y, template_key, match.score)
             return center_x, center_y
         else:
             return None
 
 
     except Exception as e:
-        print(f"Error: 匹配模板时发生错误：{e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("匹配模板%s时发生错误：%s", template_key, e)
         return None
 
 
+def find_all(frame: Frame,
+             template_key: str,
+             threshold: float = DEFAULT_THRESHOLD,
+             roi: tuple[int, int, int, int] | None = None,
+             margin: int = 0,
+             max_results: int = FIND_ALL_MAX_RESULTS,
+             overlap: float = NMS_OVERLAP) -> list[MatchResult]:
+    """
+    在截图中找出模板的所有实例（例如数一数画面上有几个相同的道具）
+    整个搜索区域只做一次matchTemplate，从同一张相似度图里取出所有超过阈值的峰值，
+    再做非极大值抑制，去掉和相似度更高的实例重叠太多的峰值
+    :param frame: 截图帧
+    :param template_key: 模板键
+    :param threshold: 相似度阈值
+    :param roi: 设计分辨率下的搜索区域 (x, y, 宽, 高)，为None时搜索全屏
+    :param margin: 在搜索区域四周额外扩展的像素
+    :param max_results: 最多返回多少个实例
+    :param overlap: 重叠比例（交并比）超过它的两个实例只保留相似度高的
+    :return: 所有实例的MatchResult，按相似度从高到低排序；模板无法加载时返回空列表
+    """
+    template = get_template(template_key)
+    if template is None:
+        return []
+
+    memo_key = None
+    if match_memo.enabled:
+        memo_key = ('find_all', frame.content_hash, frame.transform, template_key, template.mtime, roi, margin,
+                    threshold, max_results, overlap)
+        memoized = match_memo.get(memo_key)
+        if memoized is not None:
+            return memoized
+
+    with metrics.span('vision.resize'):
+        screen = frame.scaled
+    screen_h, screen_w = screen.shape[:2]
+    template_w, template_h = template.size
+    roi_x, roi_y, roi_w, roi_h = crop_roi((screen_w, screen_h), roi, margin)
+    if roi_w < template_w or roi_h < template_h:
+        logger.warning("模板%s的搜索区域%s比模板还小，改为全屏搜索。", template.key, roi)
+        roi_x, roi_y, roi_w, roi_h = 0, 0, screen_w, screen_h
+    with metrics.span('vision.find_all', template=template.key):
+        result = cv2.matchTemplate(screen[roi_y:roi_y + roi_h, roi_x:roi_x + roi_w], template.bgr,
+                                   cv2.TM_CCORR_NORMED, mask=template.mask)
+        peaks = _find_peaks(result, threshold, template.size, max_results, overlap)
+    matches = [MatchResult(template.key, score, (x + roi_x, y + roi_y), template.size) for score, x, y in peaks]
+    logger.debug("找到%d个模板%s", len(matches), template_key)
+    if memo_key is not None:
+        match_memo.put(memo_key, matches)
+    return matches
+
+
+def _find_peaks(result,
+                threshold: float,
+                size: tuple[int, int],
+                max_results: int,
+                overlap: float) -> list[tuple[float, int, int]]:
+    """
+    从matchTemplate的相似度图中取出所有超过阈值的局部峰值，再做非极大值抑制
+    :param result: matchTemplate的结果
+    :param size: 模板尺寸 (宽, 高)
+    :return: [(相似度, x, y)]，按相似度从高到低排序，坐标是相似度图（搜索区域）内的
+    """
+    # 带掩码的模板在纯色区域可能算出nan/inf
+    result = np.nan_to_num(result, nan=0.0, posinf=0.0, neginf=0.0)
+    # 一个实例周围通常有一片点都超过阈值，先只留下不小于3×3邻域最大值的点（局部峰值），候选点少得多
+    peaks = (result >= threshold) & (result >= cv2.dilate(result, np.ones((3, 3), np.uint8)))
+    ys, xs = np.nonzero(peaks)
+    if not len(xs):
+        return []
+    scores = result[ys, xs]
+    order = np.argsort(-scores, kind='stable')
+    xs, ys, scores = xs[order], ys[order], scores[order]
+
+    # 所有实例都和模板一样大，两个实例的重叠面积可以直接由左上角的偏移算出来
+    width, height = size
+    area = width * height
+    suppressed = np.zeros(len(xs), dtype=bool)
+    keep = []
+    for i in range(len(xs)):
+        if suppressed[i]:
+            continue
+        keep.append(i)
+        if len(keep) >= max_results:
+            break
+        intersection = (np.clip(width - np.abs(xs - xs[i]), 0, None)
+                        * np.clip(height - np.abs(ys - ys[i]), 0, None))
+        suppressed |= intersection > overlap * (2 * area - intersection)
+    return [(float(scores[i]), int(xs[i]), int(ys[i])) for i in keep]
+
+
+def save_debug_image(frame: Frame, match: MatchResult, threshold: float = DEFAULT_THRESHOLD):
+    """
+    保存一张标出了匹配区域的调试图片到debug/
+    画框、编码和写盘都交给黑匣子的后台线程，不会拖慢匹配本身（见flight_recorder.py）
+    :param frame: 截图帧
+    :param match: 匹配结果
+    :param threshold: 匹配阈值，决定框的颜色
+    """
+    logger.debug("找到匹配！相似度为%.2f，正在后台保存调试图片", match.score)
+    flight_recorder.save_frame(frame, match, threshold)
+
+
 #后续我们会在这里添加颜色检测、OCR等函数
 
 
@@ -0,0 +1,349 @@
+from __future__ import annotations
+
+import itertools
+import multiprocessing
+import os
+import queue
+import threading
+import time
+import weakref
+from concurrent.futures import Future
+from multiprocessing import shared_memory
+
+from src.zzz_assistant.core.frame import Frame, ScreenTransform
+from src.zzz_assistant.core.metrics import metrics
+from src.zzz_assistant.core.vision import MatchResult, set_worker_pool
+from src.zzz_assistant.utils.lazy_import import lazy_import
+from src.zzz_assistant.utils.log import get_logger
+
+np = lazy_import('numpy')
+logger = get_logger(__name__)
+
+# 共享内存里默认有几个画面槽位（同时在匹配的画面数，一般和设备数相当）
+DEFAULT_SHARED_FRAME_SLOTS = 8
+# 每个槽位能放下的最大画面 (宽, 高)，更大的画面在本进程里匹配
+SHARED_FRAME_MAX_SIZE = (1920, 1080)
+# 等一次匹配结果最多等多久（秒），超时后在本进程里重新匹配
+WORKER_MATCH_TIMEOUT = 5.0
+# 关闭时等工作进程退出的时间（秒），超时后强制结束
+WORKER_STOP_TIMEOUT = 2.0
+# 后台线程检查工作进程是否还活着的间隔（秒）
+WORKER_CHECK_INTERVAL = 1.0
+
+# 工作进程加载完模板后发回的消息
+_READY = 'ready'
+
+
+class SharedFrameRing:
+    """
+    共享内存里的一圈画面槽位
+
+    每个槽位能放一帧BGR画面。同一帧（同一个像素数组）只拷贝进来一次，之后对它的所有匹配请求都用同一个槽位；
+    槽位上还有请求没完成时不会被覆盖，都没完成就返回None，由调用方在本进程里匹配。
+    每次写入新画面时槽位的代数加一，工作进程据此判断自己缓存的画面是否还有效。
+    """
+
+    def __init__(self, slots: int, max_size: tuple[int, int] = SHARED_FRAME_MAX_SIZE):
+        """
+        :param slots: 槽位数
+        :param max_size: 每个槽位能放下的最大画面 (宽, 高)
+        """
+        width, height = max_size
+        self.slot_bytes = width * height * 3
+        self.shm = shared_memory.SharedMemory(create=True, size=max(1, slots) * self.slot_bytes)
+        self._images: list[weakref.ref | None] = [None] * max(1, slots)
+        self._generations = [0] * len(self._images)
+        self._in_flight = [0] * len(self._images)
+        self._last_used = [0.0] * len(self._images)
+        self._lock = threading.Lock()
+
+    @property
+    def name(self) -> str:
+        return self.shm.name
+
+    def acquire(self, image: np.ndarray) -> tuple[int, int] | None:
+        """
+        把画面放进一个槽位（已经在某个槽位里的话直接用那个槽位），并占用它直到release
+        :param image: 画面的BGR像素数组
+        :return: (槽位, 代数)，画面放不下或者所有槽位都被占用时返回None
+        """
+        if image.dtype != np.uint8 or image.ndim != 3 or image.shape[2] != 3 or image.nbytes > self.slot_bytes:
+            return None
+        with self._lock:
+            for slot, ref in enumerate(self._images):
+                if ref is not None and ref() is image:
+                    return self._take(slot)
+
+            free = [slot for slot, count in enumerate(self._in_flight) if count == 0]
+            if not free:
+                return None
+            # 优先用画面已经被回收的槽位，其次是最久没用过的
+            slot = min(free, key=lambda s: (self._images[s] is not None and self._images[s]() is not None,
+                                            self._last_used[s]))
+            self.view(slot, image.shape)[...] = image
+            self._images[slot] = weakref.ref(image)
+            self._generations[slot] += 1
+            return self._take(slot)
+
+    def release(self, slot: int):
+        with self._lock:
+            self._in_flight[slot] -= 1
+
+    def view(self, slot: int, shape: tuple[int, ...]) -> np.ndarray:
+        """槽位上的画面（直接指向共享内存，不拷贝）"""
+        return np.ndarray(shape, np.uint8, buffer=self.shm.buf, offset=slot * self.slot_bytes)
+
+    def close(self):
+        """释放共享内存（只能由创建它的进程调用）"""
+        self.shm.close()
+        self.shm.unlink()
+
+    def _take(self, slot: int) -> tuple[int, int]:
+        self._in_flight[slot] += 1
+        self._last_used[slot] = time.monotonic()
+        return slot, self._generations[slot]
+
+
+class VisionWorkerPool:
+    """
+    多进程的模板匹配工作池
+
+    多台设备在同一个进程里跑时，matchTemplate本身会释放GIL，但裁剪、缩放判断、取结果这些Python代码
+    都要抢同一把GIL，设备一多就上不去了。工作池把模板匹配交给几个独立的工作进程：
+    1. 画面拷贝进共享内存的槽位（SharedFrameRing），每帧只拷贝一次，请求里只有槽位号和几个参数
+    2. 每个工作进程都从内存映射的模板包（asset_pack.py）加载模板，像素数据在操作系统的页缓存里只有一份
+    3. 工作进程只发回 (相似度, 左上角, 尺寸) 这样的小元组
+
+    启动后通过vision.set_worker_pool()接管match_template，所以find_template、RecognitionEngine、
+    Navigator的用法都不用改。工作进程还没准备好、画面放不进槽位、工作进程出错或超时时，
+    都会退回在本进程里匹配，结果完全一样。
+    """
+
+    def __init__(self,
+                 processes: int,
+                 slots: int = DEFAULT_SHARED_FRAME_SLOTS,
+                 max_frame_size: tuple[int, int] = SHARED_FRAME_MAX_SIZE):
+        """
+        :param processes: 工作进程数
+        :param slots: 共享内存里的画面槽位数
+        :param max_frame_size: 每个槽位能放下的最大画面 (宽, 高)
+        """
+        self.processes = max(1, processes)
+        self.ring = SharedFrameRing(slots, max_frame_size)
+        # Windows上只能用spawn，其他平台也统一用spawn，避免fork时复制OpenCV的线程状态
+        context = multiprocessing.get_context('spawn')
+        self._tasks = context.Queue()
+        self._results = context.Queue()
+        self._workers = [
+            context.Process(target=_worker_main, args=(self.ring.name, self.ring.slot_bytes, self._tasks, self._results),
+                            name=f"vision-worker-{i}", daemon=True)
+            for i in range(self.processes)
+        ]
+        self._ids = itertools.count()
+        # 请求号 -> (Future, 槽位)
+        self._pending: dict[int, tuple[Future, int]] = {}
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+        self._ready_count = 0
+        self._closed = False
+        self._reader = threading.Thread(target=self._read_results, name="vision-worker-results", daemon=True)
+
+    @property
+    def ready(self) -> bool:
+        """所有工作进程是否都已经加载好模板"""
+        return self._ready.is_set()
+
+    def start(self) -> "VisionWorkerPool":
+        """启动工作进程（不等它们准备好，准备好之前的匹配都在本进程里做）"""
+        for worker in self._workers:
+            worker.start()
+        self._reader.start()
+        logger.info("已启动%d个视觉工作进程", self.processes)
+        return self
+
+    def wait_ready(self, timeout: float | None = None) -> bool:
+        """等所有工作进程准备好"""
+        return self._ready.wait(timeout)
+
+    def submit(self,
+               frame: Frame,
+               template_key: str,
+               roi: tuple[int, int, int, int] | None,
+               margin: int,
+               strategy: str,
+               threshold: float) -> Future | None:
+        """
+        把一次匹配交给工作进程，参数和vision.match_template相同
+        :return: 结果为MatchResult（模板无法加载时为None）的Future；工作池不可用或画面放不进槽位时返回None
+        """
+        if not self._ready.is_set():
+            return None
+        acquired = self.ring.acquire(frame.image)
+        if acquired is None:
+            metrics.inc('vision.worker_fallbacks', reason='no_slot')
+            return None
+        slot, generation = acquired
+        future = Future()
+        request_id = next(self._ids)
+        with self._lock:
+            self._pending[request_id] = (future, slot)
+        transform = frame.transform
+        self._tasks.put((request_id, slot, generation, frame.image.shape, frame.timestamp,
+                         (transform.scale, transform.offset), template_key, roi, margin, strategy, threshold))
+        return future
+
+    def match(self,
+              frame: Frame,
+              template_key: str,
+              roi: tuple[int, int, int, int] | None,
+              margin: int,
+              strategy: str,
+              threshold: float) -> MatchResult | None:
+        """
+        在工作进程里匹配并等待结果
+        :return: MatchResult；工作池不可用、出错或超时时返回None，由调用方在本进程里匹配
+        """
+        future = self.submit(frame, template_key, roi, margin, strategy, threshold)
+        if future is None:
+            return None
+        try:
+            with metrics.span('vision.worker_match', template=template_key):
+                return future.result(timeout=WORKER_MATCH_TIMEOUT)
+        except TimeoutError:
+            metrics.inc('vision.worker_fallbacks', reason='timeout')
+            logger.warning("视觉工作进程匹配%s超时，改为在本进程里匹配", template_key)
+        except Exception as e:
+            metrics.inc('vision.worker_fallbacks', reason='error')
+            logger.warning("视觉工作进程匹配%s时出错，改为在本进程里匹配：%s", template_key, e)
+        return None
+
+    def close(self):
+        """让工作进程退出，并释放共享内存"""
+        if self._closed:
+            return
+        self._closed = True
+        self._ready.clear()
+        set_worker_pool(None, only_if=self)
+        for _ in self._workers:
+            self._tasks.put(None)
+        for worker in self._workers:
+            if worker.pid is None:
+                continue
+            worker.join(WORKER_STOP_TIMEOUT)
+            if worker.is_alive():
+                worker.terminate()
+                worker.join()
+        if self._reader.is_alive():
+            self._results.put(None)
+            self._reader.join(WORKER_STOP_TIMEOUT)
+        self._fail_pending("视觉工作池已关闭")
+        self._tasks.close()
+        self._results.close()
+        self.ring.close()
+
+    def _read_results(self):
+        """后台线程：把工作进程发回的结果交给对应的Future"""
+        while True:
+            try:
+                message = self._results.get(timeout=WORKER_CHECK_INTERVAL)
+            except queue.Empty:
+                if self._closed:
+                    return
+                self._check_workers()
+                continue
+            if message is None:
+                return
+            request_id, record, error = message
+            if request_id == _READY:
+                self._ready_count += 1
+                if self._ready_count == self.processes:
+                    logger.info("视觉工作进程已全部就绪")
+                    self._ready.set()
+                continue
+            with self._lock:
+                pending = self._pending.pop(request_id, None)
+            if pending is None:
+                continue
+            future, slot = pending
+            self.ring.release(slot)
+            if error is not None:
+                future.set_exception(RuntimeError(error))
+            elif record is None:
+                future.set_result(None)
+            else:
+                key, score, top_left, size = record
+                future.set_result(MatchResult(key, score, top_left, size))
+
+    def _check_workers(self):
+        """有工作进程意外退出时停用整个工作池，之后的匹配都在本进程里做"""
+        dead = [worker for worker in self._workers if worker.pid is not None and not worker.is_alive()]
+        if not dead or not self._ready.is_set():
+            return
+        self._ready.clear()
+        logger.error("视觉工作进程%s意外退出（退出码%s），之后改为在本进程里匹配",
+                     dead[0].name, dead[0].exitcode)
+        self._fail_pending(f"视觉工作进程{dead[0].name}已退出")
+
+    def _fail_pending(self, reason: str):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        for future, slot in pending.values():
+            self.ring.release(slot)
+            future.set_exception(RuntimeError(reason))
+
+
+def start_worker_pool(config: dict) -> VisionWorkerPool | None:
+    """
+    按配置文件的vision.worker_processes启动工作池，并让match_template使用它
+    :return: 工作池，没有配置工作进程时返回None
+    """
+    vision_config = (config or {}).get('vision', {})
+    processes = vision_config.get('worker_processes', 0)
+    if not processes:
+        return None
+    pool = VisionWorkerPool(processes, vision_config.get('shared_frame_slots', DEFAULT_SHARED_FRAME_SLOTS))
+    set_worker_pool(pool.start())
+    return pool
+
+
+def _worker_main(shm_name: str, slot_bytes: int, tasks, results):
+    """工作进程的入口"""
+    from src.zzz_assistant.core.flight_recorder import flight_recorder
+    from src.zzz_assistant.core.template_registry import template_registry
+    from src.zzz_assistant.core.vision import match_memo
+
+    # 匹配缓存和黑匣子都留在主进程里，工作进程只管匹配；工作进程里的指标不会被导出
+    match_memo.enabled = False
+    flight_recorder.enabled = False
+    metrics.enabled = False
+    shm = shared_memory.SharedMemory(name=shm_name)
+    # 槽位 -> ((代数, 坐标换算), Frame)：同一帧的多次匹配共用缩放、灰度图等派生图像
+    frames: dict[int, tuple[tuple, Frame]] = {}
+    try:
+        template_registry.preload()
+        results.put((_READY, os.getpid(), None))
+        while (request := tasks.get()) is not None:
+            results.put(_serve(request, shm, slot_bytes, frames))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        # 指向共享内存的数组都释放之后才能关闭
+        frames.clear()
+        shm.close()
+
+
+def _serve(request: tuple, shm: shared_memory.SharedMemory, slot_bytes: int, frames: dict) -> tuple:
+    from src.zzz_assistant.core.vision import match_template
+
+    request_id, slot, generation, shape, timestamp, transform, key, roi, margin, strategy, threshold = request
+    try:
+        cached = frames.get(slot)
+        if cached is None or cached[0] != (generation, transform):
+            image = np.ndarray(shape, np.uint8, buffer=shm.buf, offset=slot * slot_bytes)
+            cached = frames[slot] = ((generation, transform), Frame(image, timestamp, ScreenTransform(*transform)))
+        match = match_template(cached[1], key, roi, margin, strategy, threshold)
+    except Exception as e:
+        return request_id, None, f"{type(e).__name__}: {e}"
+    if match is None:
+        return request_id, None, None
+    return request_id, (match.key, match.score, match.top_left, match.size), None
@@ -1,4 +1,7 @@
 from src.zzz_assistant.core.device import Device
+from src.zzz_assistant.core.metrics import metrics
+from src.zzz_assistant.core.navigator import Navigator
+from src.zzz_assistant.core.recognition import RecognitionEngine
 
 
 class BaseTask:
@@ -10,15 +13,39 @@ class BaseTask:
     2. 一个 `run` 方法的框架，所有子任务都需要去具体实现这个方法。
     """
 
-    def __init__(self, device: Device, config: dict):
+    def __init__(self,
+                 device: Device,
+                 config: dict,
+                 engine: RecognitionEngine | None = None,
+                 navigator: Navigator | None = None):
         """
         初始化任务
 
         :param device: 已经连接好的设备控制器对象
         :param config: 从yaml加载的全局配置字典
+        :param engine: 共享的页面识别引擎。多设备运行时所有任务共用一个有上限的识别线程池，为None时由Navigator自己创建
+        :param navigator: 这台设备上一直保留的导航器（常驻模式下多个任务共用，上一个任务停在哪个页面、
+                          缩放校准的结果都不用重新来），为None时由任务自己创建
         """
         self.device = device
         self.config = config
+        self.engine = engine
+        self.navigator = navigator
+
+    def get_navigator(self) -> Navigator:
+        """传入的导航器，没有的话新建一个"""
+        if self.navigator is None:
+            self.navigator = Navigator(device=self.device, config=self.config, engine=self.engine)
+        return self.navigator
+
+    def execute(self):
+        """
+        在绑定了设备和任务标签的上下文里执行run()，任务中所有的日志和性能指标都会带上这两个标签
+        调度器和main.py都通过它来启动任务
+        :return: run()的返回值
+        """
+        with metrics.bind(device=self.device.serial, task=type(self).__name__):
+            return self.run()
 
     def run(self):
         """
@@ -3,10 +3,26 @@ import time
 
 from pages.ad_pages import AdPage
 from pages.main_pages import MainPage, LoginPage
-from src.zzz_assistant.core.navigator import Navigator
+from src.zzz_assistant.core.flight_recorder import flight_recorder
+from src.zzz_assistant.core.metrics import metrics
+from src.zzz_assistant.core.transitions import UNKNOWN_PAGE
 from src.zzz_assistant.tasks.base_task import BaseTask
-from src.zzz_assistant.utils.helpers import wait_for_template
-from src.zzz_assistant.utils.paths import ASSETS_PATH
+from src.zzz_assistant.utils.helpers import wait_for_frame_change, wait_for_frame_stable, wait_for_template
+from src.zzz_assistant.utils.log import get_logger
+
+logger = get_logger(__name__)
+
+# 下面这些时间都只是上限：等待的条件一满足（识别出页面、画面变化或稳定下来）就立刻继续
+# 启动游戏后最多等多久出现第一个已知页面（秒）
+GAME_LAUNCH_TIMEOUT = 15
+# 整个登录流程的总时限（秒），相当于原来15次尝试 × 每次5秒
+LOGIN_TIMEOUT = 75
+# 在未知页面（加载中）最多等多久出现已知页面（秒）
+UNKNOWN_PAGE_TIMEOUT = 5
+# 点击登录后最多等多久画面开始变化（秒）
+LOGIN_CLICK_TIMEOUT = 5
+# 关闭广告后最多等多久画面稳定下来（秒）
+AD_CLOSE_TIMEOUT = 3
 
 
 class LoginTask(BaseTask):
@@ -19,17 +35,17 @@ class LoginTask(BaseTask):
         """
         重写run方法，实现登录的具体逻辑
         """
-        print("开始执行【登录任务】...")
-        navigator = Navigator(device=self.device)
+        logger.info("开始执行【登录任务】...")
+        navigator = self.get_navigator()
 
         # 检查游戏是否运行
-        print("检查游戏是否运行")
+        logger.debug("检查游戏是否运行")
         game_package_name = self.config["game"]["package_name"]
         if not self.device.is_game_running(game_package_name):
-            print(f"游戏不在前台，正在尝试启动...")
+            logger.info("游戏不在前台，正在尝试启动...")
             self.device.start_game(game_package_name)
-            print("游戏已启动，等待15秒后检查游戏是否启动成功...")
-            time.sleep(15)
+            logger.info("游戏已启动，等待进入已知页面（最多%s秒）...", GAME_LAUNCH_TIMEOUT)
+            navigator.wait_for_page(timeout=GAME_LAUNCH_TIMEOUT)
 
 
         # 从配置中获取广告处理策略
@@ -38,46 +54,64 @@ class LoginTask(BaseTask):
         ad_template_name = ad_config.get('template_name', '')
 
         if ad_enabled:
-            print(f"正在处理广告：{ad_template_name}")
+            logger.info("正在处理广告：%s", ad_template_name)
         else:
-            print("当前版本无广告处理。如有请反馈。")
+            logger.info("当前版本无广告处理。如有请反馈。")
 
 
         # --- 状态机核心循环 ---
         # 设置一个总的超过时间，防止无限循环
-        max_attempts = 15
-        for attempt in range(max_attempts):
-            print(f"\n---尝试第 {attempt + 1}/{max_attempts} 次登录---")
+        deadline = time.time() + LOGIN_TIMEOUT
+        previous_state = UNKNOWN_PAGE
+        attempt = 0
+        while time.time() < deadline:
+            attempt += 1
+            logger.debug("尝试第%d次登录（剩余%.0f秒）", attempt, deadline - time.time())
             current_page = navigator.get_current_page()
 
-            if isinstance(current_page, MainPage):
-                print("当前页面是主界面，登录成功！")
-                return True
-
-            elif isinstance(current_page, LoginPage):
-                print("当前页面是登录界面，开始登录...")
-                # 假设 LoginPage 知道如何点击自己页面上的按钮
-                # self.device.click(...) 我们后续会把点击操作也封装到Page类里
-                location = wait_for_template(self.device, current_page.check_elements[0])
-                if location:
-                    self.device.click(*location)
-
-            elif ad_enabled and isinstance(current_page, AdPage):
-                print(f"当前页面是广告界面，开始处理...")
-                ad_button_path = os.path.join(ASSETS_PATH, 'login', ad_template_name)
-                location = wait_for_template(self.device, ad_button_path, timeout=3)
-                if location:
-                    self.device.click(*location)
-                    time.sleep(3)
-
-
-
-            else: #未知界面
-                print(f"当前在未知界面，可能正在加载或卡死，等待5秒后重试...")
-                time.sleep(5)
-                # 可以在这里加入更复杂的逻辑，比如重新启动游戏等
-
-        print(f"Error: 经过多次尝试，仍未能到达主界面。")
+            # 每个状态（当前页面）的处理耗时记成指标，状态变化时计数
+            state = current_page.name if current_page is not None else UNKNOWN_PAGE
+            if state != previous_state:
+                metrics.inc('task.transitions', device=self.device.serial, task='LoginTask', source=previous_state, target=state)
+                previous_state = state
+            with metrics.span('task.state', device=self.device.serial, task='LoginTask', state=state):
+                if isinstance(current_page, MainPage):
+                    logger.info("当前页面是主界面，登录成功！")
+                    navigator.close()
+                    return True
+
+                elif isinstance(current_page, LoginPage):
+                    logger.info("当前页面是登录界面，开始登录...")
+                    # 识别页面时已经在这一帧上找到了登录按钮，直接用它的坐标，不用再截图、再匹配
+                    login_button = current_page.check_elements[0]
+                    location = navigator.locate(login_button.key)
+                    if location:
+                        self.device.click(*location)
+                        # 等按钮有反应（画面开始变化）再识别，避免同一个画面重复点击
+                        if navigator.last_frame is not None:
+                            wait_for_frame_change(self.device, navigator.last_frame, timeout=LOGIN_CLICK_TIMEOUT)
+
+                elif ad_enabled and isinstance(current_page, AdPage):
+                    logger.info("当前页面是广告界面，开始处理...")
+                    ad_button_key = f"login/{os.path.splitext(ad_template_name)[0]}"
+                    # 配置的关闭按钮就是广告页的特征元素时，识别页面时已经找到了它
+                    location = navigator.locate(ad_button_key) or wait_for_template(self.device, ad_button_key, timeout=3)
+                    if location:
+                        self.device.click(*location)
+                        # 等广告关闭的动画结束
+                        wait_for_frame_stable(self.device, timeout=AD_CLOSE_TIMEOUT)
+
+
+
+                else: #未知界面
+                    logger.info("当前在未知界面，可能正在加载或卡死，等待进入已知页面（最多%s秒）...", UNKNOWN_PAGE_TIMEOUT)
+                    navigator.wait_for_page(timeout=UNKNOWN_PAGE_TIMEOUT)
+                    # 可以在这里加入更复杂的逻辑，比如重新启动游戏等
+
+        logger.error("经过多次尝试，仍未能到达主界面。")
+        # 把最近的画面和匹配结果保存下来，方便排查卡在了哪里
+        flight_recorder.dump('login_failed', device=self.device.serial)
+        navigator.close()
         return False
 
 
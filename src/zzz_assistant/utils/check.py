@@ -0,0 +1,138 @@
+import logging
+import os
+import struct
+
+from src.zzz_assistant.core.asset_pack import AssetPack
+from src.zzz_assistant.core.capture import CAPTURE_METHODS
+from src.zzz_assistant.core.frame import DESIGN_RESOLUTION
+from src.zzz_assistant.core.input import INPUT_METHODS
+from src.zzz_assistant.core.navigator import PAGE_CLASSES
+from src.zzz_assistant.core.template_registry import template_registry
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+# PNG文件头中的颜色类型：灰度、RGB、调色板、灰度+透明、RGBA
+PNG_COLOR_TYPES = {0, 2, 3, 4, 6}
+
+
+def read_png_size(path: str | os.PathLike) -> tuple[int, int]:
+    """
+    只读取PNG文件头，得到图片尺寸 (宽, 高)，不需要OpenCV
+    :raise ValueError: 不是有效的PNG文件
+    """
+    with open(path, 'rb') as f:
+        header = f.read(26)
+    if len(header) < 26 or not header.startswith(PNG_SIGNATURE) or header[12:16] != b'IHDR':
+        raise ValueError("不是有效的PNG文件")
+    width, height, _, color_type = struct.unpack('>IIBB', header[16:26])
+    if width == 0 or height == 0 or color_type not in PNG_COLOR_TYPES:
+        raise ValueError(f"PNG文件头异常：{width}x{height}，颜色类型{color_type}")
+    return width, height
+
+
+def check_config(config: dict) -> list[str]:
+    """
+    检查配置是否完整、取值是否合法
+    :return: 发现的问题，没有问题时为空列表
+    """
+    problems = []
+    emulator = config.get('emulator') or {}
+    if not emulator.get('device_serial'):
+        problems.append("缺少emulator.device_serial")
+    if not (config.get('game') or {}).get('package_name'):
+        problems.append("缺少game.package_name")
+
+    devices = [('emulator', emulator)]
+    for i, item in enumerate(config.get('devices') or []):
+        if not item.get('serial'):
+            problems.append(f"devices[{i}]缺少serial")
+        devices.append((f"devices[{i}]", item))
+    for name, item in devices:
+        capture = item.get('capture', emulator.get('capture', 'screencap'))
+        if capture not in CAPTURE_METHODS:
+            problems.append(f"{name}.capture的值{capture!r}无效，可选：{CAPTURE_METHODS}")
+        input_method = item.get('input', emulator.get('input', 'shell'))
+        if input_method not in INPUT_METHODS:
+            problems.append(f"{name}.input的值{input_method!r}无效，可选：{INPUT_METHODS}")
+        elif input_method == 'maatouch':
+            maatouch_path = emulator.get('maatouch_path')
+            if maatouch_path and not os.path.exists(maatouch_path):
+                problems.append(f"emulator.maatouch_path指向的文件不存在：{maatouch_path}")
+
+    workers = (config.get('vision') or {}).get('recognition_workers', 1)
+    if not isinstance(workers, int) or workers < 1:
+        problems.append(f"vision.recognition_workers必须是正整数，当前为{workers!r}")
+    vision_config = config.get('vision') or {}
+    processes = vision_config.get('worker_processes', 0)
+    if not isinstance(processes, int) or processes < 0:
+        problems.append(f"vision.worker_processes必须是非负整数，当前为{processes!r}")
+    slots = vision_config.get('shared_frame_slots', 1)
+    if not isinstance(slots, int) or slots < 1:
+        problems.append(f"vision.shared_frame_slots必须是正整数，当前为{slots!r}")
+    captures = (config.get('orchestrator') or {}).get('max_concurrent_captures', 1)
+    if not isinstance(captures, int) or captures < 1:
+        problems.append(f"orchestrator.max_concurrent_captures必须是正整数，当前为{captures!r}")
+
+    adb_config = config.get('adb') or {}
+    adb_port = adb_config.get('port', 5037)
+    if not isinstance(adb_port, int) or not 0 < adb_port < 65536:
+        problems.append(f"adb.port必须是1-65535之间的整数，当前为{adb_port!r}")
+    for name in ('health_check_interval', 'reconnect_timeout'):
+        value = adb_config.get(name, 0)
+        if not isinstance(value, (int, float)) or value < 0:
+            problems.append(f"adb.{name}必须是非负数，当前为{value!r}")
+
+    port = (config.get('daemon') or {}).get('port', 8765)
+    if not isinstance(port, int) or not 0 < port < 65536:
+        problems.append(f"daemon.port必须是1-65535之间的整数，当前为{port!r}")
+
+    log_config = config.get('logging') or {}
+    levels = {'logging.level': log_config.get('level', 'INFO')}
+    levels.update({f"logging.levels.{name}": level for name, level in (log_config.get('levels') or {}).items()})
+    for name, level in levels.items():
+        if not isinstance(level, int) and not isinstance(logging.getLevelName(str(level).upper()), int):
+            problems.append(f"{name}的值{level!r}无效，可选：DEBUG、INFO、WARNING、ERROR")
+
+    ad = config.get('ad') or {}
+    if ad.get('enabled'):
+        ad_key = f"login/{os.path.splitext(ad.get('template_name', ''))[0]}"
+        if not template_registry.resolve_path(ad_key).exists():
+            problems.append(f"ad.template_name对应的模板不存在：{template_registry.resolve_path(ad_key)}")
+    return problems
+
+
+def check_assets() -> list[str]:
+    """
+    检查assets下的模板：文件是不是有效的PNG、尺寸是否超过设计分辨率，所有页面用到的模板是否都存在，
+    以及模板包（如果有）是否和PNG一致
+    :return: 发现的问题，没有问题时为空列表
+    """
+    problems = []
+    design_w, design_h = DESIGN_RESOLUTION
+    for key in template_registry.keys():
+        path = template_registry.resolve_path(key)
+        try:
+            width, height = read_png_size(path)
+        except (OSError, ValueError) as e:
+            problems.append(f"模板{key}无法读取：{e}")
+            continue
+        if width > design_w or height > design_h:
+            problems.append(f"模板{key}的尺寸{width}x{height}超过了设计分辨率{design_w}x{design_h}")
+
+    for page_class in PAGE_CLASSES:
+        # 只是读取页面声明的特征元素，不需要设备
+        page = page_class(None)
+        for element in page.check_elements:
+            if not template_registry.resolve_path(element.key).exists():
+                problems.append(f"页面【{page.name}】的特征{element.key}对应的模板不存在")
+
+    pack_path = template_registry.pack_path
+    if pack_path is not None and os.path.exists(pack_path):
+        try:
+            pack = AssetPack(pack_path)
+        except (OSError, ValueError) as e:
+            problems.append(f"模板包无法读取：{e}")
+        else:
+            stale = pack.stale_keys(template_registry.assets_root)
+            if stale:
+                problems.append(f"模板包已过期（{', '.join(stale)}），请重新运行dev_tools/create_template.py")
+    return problems
@@ -1,7 +1,10 @@
 import yaml
 import os
+from .log import get_logger
 from .paths import CONFIG_PATH
 
+logger = get_logger(__name__)
+
 def load_config() -> dict:
     """
     加载配置。先加载默认配置，然后用用户配置覆盖
@@ -13,13 +16,13 @@ def load_config() -> dict:
     try:
         with open(default_config_path, 'r', encoding='utf-8') as f:
             config = yaml.safe_load(f)
-        print("成功加载默认配置文件。")
+        logger.debug("成功加载默认配置文件。")
 
     except FileNotFoundError:
-        print("Error: 默认配置文件config.default.yaml未找到，程序无法运行。")
+        logger.critical("默认配置文件config.default.yaml未找到，程序无法运行。")
         exit()
     except Exception as e:
-        print(f"Error: 加载默认配置时出错：{e}")
+        logger.critical("加载默认配置时出错：%s", e)
         exit()
 
     # 2. 然后加载用户配置并覆盖
@@ -31,10 +34,10 @@ def load_config() -> dict:
             # 使用字典的update方法来合并配置
             if user_config:
                 config.update(user_config)
-                print("成功加载用户配置文件，并覆盖默认设置。")
+                logger.info("成功加载用户配置文件，并覆盖默认设置。")
         except Exception as e:
-            print(f"Warning: 加载用户配置时出错：{e}。将使用默认配置。")
+            logger.warning("加载用户配置时出错：%s。将使用默认配置。", e)
     else:
-        print("Warning: 用户配置文件未找到，将使用默认配置。")
+        logger.info("用户配置文件未找到，将使用默认配置。")
 
     return config
\ No newline at end of file
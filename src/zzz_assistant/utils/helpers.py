@@ -1,25 +1,44 @@
 import time
+from typing import TYPE_CHECKING, Sequence
+
 from src.zzz_assistant.core.device import Device
-from src.zzz_assistant.core.vision import find_template
+from src.zzz_assistant.core.frame import DEFAULT_CHANGE_TOLERANCE, Frame
+from src.zzz_assistant.core.metrics import metrics
+from src.zzz_assistant.core.vision import MATCH_FULL, find_template
+from src.zzz_assistant.utils.log import get_logger
+
+if TYPE_CHECKING:
+    # pages.base_page导入了这个模块
+    from pages.base_page import CheckElement
+
+logger = get_logger(__name__)
 
 
 def wait_for_template(device: Device,
-                      template_path: str,
+                      template_key: str,
                       timeout: float = 20.0,
                       interval: float = 1,
                       threshold: float = 0.9,
                       debug_mode: bool = False,
-                      pre_captured_image: bytes | None = None) -> tuple[int, int] | None:
+                      pre_captured_image: Frame | None = None,
+                      roi: tuple[int, int, int, int] | None = None,
+                      margin: int = 0,
+                      strategy: str = MATCH_FULL,
+                      wait_for_change: bool = False) -> tuple[int, int] | None:
     """
     在指定时间内，周期性地等待一个模板图片出现在屏幕上。
 
     Args:
         device (Device): 设备控制器实例。
-        template_path (str): 要寻找的模板图片的路径。
+        template_key (str): 要寻找的模板的键，例如 'login/CLICK_INTO_GAME'。
         timeout (float, optional): 最长等待时间（秒）。默认为 20.0。
         interval (float, optional): 每次检测之间的间隔时间（秒）。默认为 1.0。
         debug_mode: 使find_template函数保存一个识别范围截图
-        pre_captured_image (bytes | None): 如果提供了预先捕获的截图字节，将只在该图上查找一次，忽略timeout和interval。
+        pre_captured_image (Frame | None): 如果提供了预先捕获的截图帧，将只在该图上查找一次，忽略timeout和interval。
+        roi (tuple | None): 设计分辨率下的搜索区域 (x, y, 宽, 高)，为None时搜索全屏。
+        margin (int): 在搜索区域四周额外扩展的像素。
+        strategy (str): 匹配策略，MATCH_FULL为全分辨率匹配，MATCH_PYRAMID为先粗后精的金字塔匹配。
+        wait_for_change (bool): 没找到时不再固定等待interval秒，而是一直等到画面真正发生变化再检查下一次。
 
     Returns:
         tuple[int, int] | None: 如果在超时前找到图片，返回其中心点坐标 (x, y)；
@@ -30,10 +49,11 @@ def wait_for_template(device: Device,
     # 行为: 不循环不等待不超时。它只对给定的截图进行一次模板匹配，然后立刻返回结果。
     # 主要使用者: Navigator 和 Page.is_on_page()。
     #   它们需要快速地判断“此时此刻，这个东西在不在图上？”
-    if pre_captured_image:
+    if pre_captured_image is not None:
         # 如果有预截图，则直接进行一次性查找
-        location = find_template(pre_captured_image, template_path)
-        print(f"在预截图中查找 {'成功' if location else '失败'}")
+        location = find_template(pre_captured_image, template_key, threshold=threshold, roi=roi, margin=margin,
+                                 strategy=strategy)
+        logger.debug("在预截图中查找%s%s", template_key, '成功' if location else '失败')
         return location
 
 
@@ -44,38 +64,174 @@ def wait_for_template(device: Device,
     #   比如 LoginTask 在执行完一个点击操作后，它不知道下一个界面什么时候才加载好，
     #   所以它必须调用这个模式，说：“去，给我等着那个‘主菜单’按钮出现，最多等30秒！”
     # 未来应用: 正如你预见的，以后所有的战斗、领取奖励、过剧情等任务，都会大量使用这个模式。
-    print(f"开始等待图片 '{template_path.split('/')[-1]}' 出现，最长等待 {timeout} 秒...")
+    with metrics.bind(device=device.serial), \
+            metrics.span('helpers.wait_for_template', template=template_key) as span:
+        location = _poll_frames(device,
+                                lambda frame: find_template(frame, template_key, threshold=threshold,
+                                                            debug_mode=debug_mode, roi=roi, margin=margin,
+                                                            strategy=strategy),
+                                template_key, timeout, interval, wait_for_change)
+        span.set(result='found' if location else 'timeout')
+    return location
+
+
+def wait_for_any(device: Device,
+                 targets: "Sequence[str | CheckElement]",
+                 timeout: float = 20.0,
+                 interval: float = 1,
+                 threshold: float = 0.9,
+                 pre_captured_image: Frame | None = None,
+                 strategy: str = MATCH_FULL,
+                 wait_for_change: bool = False) -> tuple[str, tuple[int, int]] | None:
+    """
+    等待几个模板中的任意一个出现。每一帧只截一次图，在同一帧上依次检查所有模板，
+    不用为每个模板分别调用wait_for_template、各截各的图。
+
+    Args:
+        device (Device): 设备控制器实例。
+        targets (Sequence[str | CheckElement]): 按优先级排列的模板键，或者带搜索区域的CheckElement（它自己的阈值优先）。
+        timeout (float, optional): 最长等待时间（秒）。默认为 20.0。
+        interval (float, optional): 每次检测之间的间隔时间（秒）。默认为 1.0。
+        threshold (float): 没有单独设置阈值的模板使用的阈值。
+        pre_captured_image (Frame | None): 如果提供了预先捕获的截图帧，将只在该图上查找一次，忽略timeout和interval。
+        strategy (str): 匹配策略，MATCH_FULL或MATCH_PYRAMID。
+        wait_for_change (bool): 没找到时不再固定等待interval秒，而是一直等到画面真正发生变化再检查下一次。
+
+    Returns:
+        tuple[str, tuple[int, int]] | None: (找到的模板键, 中心点坐标)，同一帧里出现了多个模板时返回排在前面的那个；
+                                            超时仍未找到则返回 None。
+    """
+    elements = [(target, None, 0, None) if isinstance(target, str)
+                else (target.key, target.roi, target.margin, target.threshold) for target in targets]
+
+    def check(frame: Frame) -> tuple[str, tuple[int, int]] | None:
+        for key, roi, margin, element_threshold in elements:
+            element_threshold = element_threshold if element_threshold is not None else threshold
+            location = find_template(frame, key, threshold=element_threshold, roi=roi, margin=margin,
+                                     strategy=strategy)
+            if location:
+                return key, location
+        return None
+
+    if pre_captured_image is not None:
+        return check(pre_captured_image)
+
+    description = "、".join(key for key, _, _, _ in elements)
+    with metrics.bind(device=device.serial), metrics.span('helpers.wait_for_any') as span:
+        found = _poll_frames(device, check, description, timeout, interval, wait_for_change)
+        span.set(result=found[0] if found else 'timeout')
+    return found
+
+
+def _poll_frames(device: Device,
+                 check,
+                 description: str,
+                 timeout: float,
+                 interval: float,
+                 wait_for_change: bool):
+    """
+    wait_for_template和wait_for_any的等待循环：每一帧截一次图交给check，直到它返回结果或者超时
+    :param check: 接收一帧画面，找到时返回结果，没找到时返回None
+    :param description: 在等什么，用于日志
+    其余参数含义见wait_for_template
+    """
+    logger.debug("开始等待图片%s出现，最长等待%s秒...", description, timeout)
 
     start_time = time.time()
-    not_found = False
+    attempts = 0
+    frame = None
 
     while time.time() - start_time < timeout:
-        # 1. 获取截图
-        screenshot_bytes = device.screenshot()
-        if not screenshot_bytes:
-            print("Warning: 在等待期间截图失败，0.5秒后重试...")
+        # 1. 获取截图（如果上一轮已经等到了变化后的画面，就直接用它）
+        # 画面没变时，find_template会直接复用之前的匹配结果
+        if frame is None:
+            frame = device.screenshot()
+        if frame is None:
+            logger.warning("在等待期间截图失败，0.5秒后重试...")
             time.sleep(0.5)
             continue  # 跳过本次循环，直接开始下一次
 
         # 2. 查找模板
-        location = find_template(screenshot_bytes,
-                                 template_path,
-                                 threshold=threshold,
-                                 debug_mode=debug_mode)
-        # 等待时，可以把阈值设高一点，要求更精确
-        if location:
-            print(f"成功找到图片，位置：{location}。")
-            return location
-
-        # 3. 如果没找到，就等待一个间隔时间
-        if not not_found:
-            print(f"未找到，{interval}秒后再次检查", end='')
-            not_found = True
-        # 如果没找到，打印一个等待提示（可以做得更优雅，但现在够用）
-        print(f".", end='', flush=True)
-        print("\n")
-        time.sleep(interval)
+        found = check(frame)
+        attempts += 1
+        if found:
+            logger.debug("成功找到图片%s（检查了%d次）：%s", description, attempts, found)
+            return found
+
+        # 3. 如果没找到，就等待一个间隔时间（或者等到画面发生变化）
+        if wait_for_change:
+            logger.debug("第%d次未找到%s，等画面变化后再次检查", attempts, description)
+            remaining = timeout - (time.time() - start_time)
+            frame = wait_for_frame_change(device, frame, timeout=remaining)
+        else:
+            logger.debug("第%d次未找到%s，%s秒后再次检查", attempts, description, interval)
+            frame = None
+            time.sleep(interval)
 
     # 4. 如果循环结束（超时了）还没返回，说明超时了
-    print(f"Error: 等待图片超时（超过 {timeout} 秒）。")
+    logger.warning("等待图片%s超时（超过%s秒，检查了%d次）。", description, timeout, attempts)
+    return None
+
+
+def wait_for_frame_change(device: Device,
+                          previous: Frame,
+                          timeout: float,
+                          poll_interval: float = 0.1,
+                          tolerance: float = DEFAULT_CHANGE_TOLERANCE) -> Frame | None:
+    """
+    阻塞直到屏幕画面和previous不同，用来代替固定时长的sleep。
+
+    Args:
+        device (Device): 设备控制器实例。
+        previous (Frame): 作为参照的上一帧画面。
+        timeout (float): 最长等待时间（秒）。
+        poll_interval (float): 两次截图之间的间隔（秒）。
+        tolerance (float): 单个缩略图像素允许的灰度差，没有任何像素超过它就认为画面没变（见Frame.differs_from）。
+
+    Returns:
+        Frame | None: 变化后的画面；超时仍未变化则返回 None。
+    """
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        time.sleep(poll_interval)
+        frame = device.screenshot()
+        if frame is not None and frame.differs_from(previous, tolerance):
+            return frame
     return None
+
+
+def wait_for_frame_stable(device: Device,
+                          timeout: float,
+                          stable_for: float = 0.5,
+                          poll_interval: float = 0.1,
+                          tolerance: float = DEFAULT_CHANGE_TOLERANCE) -> Frame | None:
+    """
+    阻塞直到屏幕画面停止变化（连续stable_for秒没有变化），用来等待动画、转场结束。
+
+    Args:
+        device (Device): 设备控制器实例。
+        timeout (float): 最长等待时间（秒）。
+        stable_for (float): 画面需要保持不变多少秒才算稳定。
+        poll_interval (float): 两次截图之间的间隔（秒）。
+        tolerance (float): 单个缩略图像素允许的灰度差（见Frame.differs_from）。
+
+    Returns:
+        Frame | None: 稳定后的画面；超时仍在变化则返回 None。
+    """
+    with metrics.bind(device=device.serial), metrics.span('helpers.wait_for_frame_stable') as span:
+        deadline = time.time() + timeout
+        reference = None
+        stable_since = time.time()
+        while time.time() < deadline:
+            frame = device.screenshot()
+            if frame is not None:
+                if frame.differs_from(reference, tolerance):
+                    reference = frame
+                    stable_since = time.time()
+                elif time.time() - stable_since >= stable_for:
+                    span.set(result='stable')
+                    return frame
+            time.sleep(poll_interval)
+        span.set(result='timeout')
+        return None
+
@@ -0,0 +1,46 @@
+import importlib
+import sys
+import types
+
+
+class _LazyModule(types.ModuleType):
+    """
+    模块的占位对象，第一次访问它的属性时才真正导入模块
+
+    导入后会把真正模块的属性全部拷到自己身上，之后的访问就是普通的属性查找，没有额外开销。
+    """
+
+    def __getattr__(self, attr):
+        # 只有在自己身上找不到属性时才会进到这里
+        module = importlib.import_module(self.__name__)
+        self.__dict__.update(module.__dict__)
+        return getattr(module, attr)
+
+    def __repr__(self):
+        state = "已导入" if self.__name__ in sys.modules else "未导入"
+        return f"<lazy module {self.__name__!r}（{state}）>"
+
+
+def lazy_import(name: str) -> types.ModuleType:
+    """
+    延迟导入一个模块，用来代替模块顶部的 `import xxx`
+
+    cv2、numpy、adbutils加起来要导入三百多毫秒，而 `main.py --check` 之类的场景根本用不到它们。
+    用法：
+        cv2 = lazy_import('cv2')
+        np = lazy_import('numpy')
+    之后照常使用cv2.xxx，第一次用到时才会真正导入。
+    注意在类型注解里使用这些模块时，需要在文件开头加上 `from __future__ import annotations`，
+    否则定义函数时就会因为求值注解而触发导入。
+    :param name: 模块名
+    :return: 已经导入过时直接返回真正的模块，否则返回占位对象
+    """
+    module = sys.modules.get(name)
+    if module is not None:
+        return module
+    return _LazyModule(name)
+
+
+def is_imported(name: str) -> bool:
+    """模块是否已经被真正导入"""
+    return name in sys.modules
@@ -0,0 +1,184 @@
+"""
+分级日志
+
+所有模块通过get_logger(__name__)拿到自己的logger，它们都挂在名为'zzz'的根logger下面：
+    logger = get_logger(__name__)
+    logger.debug("在坐标%s找到模板%s", location, key)     # 热路径上的细节，默认不输出
+    logger.info("当前页面：%s", page.name)                 # 任务进度
+
+为了让热路径上的日志几乎不占时间：
+1. 低于当前级别的日志在logger.debug()里就被丢弃，消息不会被格式化（所以要用%s占位符传参，而不是f-string）
+2. 达到级别的日志在调用线程里只把参数代入消息、附上设备/任务标签，然后放进队列就返回；
+   时间格式化、拼接和真正写控制台/文件都在后台线程里做，Windows控制台再慢也不会拖住识别循环
+3. 队列满了（控制台卡住）时直接丢弃新的日志并计数，绝不阻塞调用方
+
+设备和任务标签取自metrics.bind()绑定的上下文，和性能指标的标签是同一份。
+
+导入本模块不会改动logging的全局设置，也不会启动后台线程；入口脚本（main.py、dev_tools里需要日志的脚本）
+调用configure_logging()后才启用上面的队列输出。没有调用时日志照常传给Python的根logger，由宿主程序决定怎么输出。
+"""
+import atexit
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+
+from src.zzz_assistant.utils.paths import PROJECT_ROOT
+
+# 所有logger的根
+ROOT_LOGGER_NAME = 'zzz'
+# 默认级别：只输出任务进度和问题，热路径上的DEBUG日志不输出
+DEFAULT_LEVEL = logging.INFO
+# 队列最多积压多少条日志，超出后丢弃新的
+LOG_QUEUE_SIZE = 10000
+# 停止后台线程时最多等多久让它腾出队列位置（秒），控制台卡死时放弃剩下的日志
+LISTENER_STOP_TIMEOUT = 5.0
+LOG_FORMAT = '%(asctime)s.%(msecs)03d %(levelname)-7s %(context)s%(message)s'
+LOG_DATE_FORMAT = '%H:%M:%S'
+
+_root = logging.getLogger(ROOT_LOGGER_NAME)
+_lock = threading.Lock()
+_handler: "QueueLogHandler | None" = None
+_listener: "QueueLogListener | None" = None
+_context_labels = None
+
+
+def get_logger(name: str) -> logging.Logger:
+    """
+    :param name: 一般传__name__，'src.zzz_assistant.core.vision' 会变成 'zzz.core.vision'
+    """
+    if name.startswith('src.zzz_assistant.'):
+        name = name[len('src.zzz_assistant.'):]
+    elif name == '__main__':
+        name = 'main'
+    return logging.getLogger(f"{ROOT_LOGGER_NAME}.{name}")
+
+
+def _current_labels() -> dict:
+    # metrics里也要打日志，所以在第一次用到时才导入它
+    global _context_labels
+    if _context_labels is None:
+        from src.zzz_assistant.core.metrics import metrics
+        _context_labels = metrics.context_labels
+    return _context_labels()
+
+
+class QueueLogHandler(logging.handlers.QueueHandler):
+    """
+    把日志放进队列的handler（在调用线程里执行，要尽量快）
+
+    和标准库的QueueHandler相比：不在调用线程里做完整的格式化，只代入参数；队列满时丢弃而不是阻塞。
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # 参数可能在之后被修改，代入消息必须在这里做；其余的格式化交给后台线程
+        record.msg = record.getMessage()
+        record.args = None
+        labels = _current_labels()
+        device, task = labels.get('device'), labels.get('task')
+        record.context = f"[{' '.join(str(v) for v in (device, task) if v)}] " if device or task else ''
+        if record.exc_info:
+            # traceback对象不能跨线程保留，先格式化成文本
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class QueueLogListener(logging.handlers.QueueListener):
+    """在后台线程里把队列中的日志交给真正的handler（控制台、文件）"""
+
+    def enqueue_sentinel(self):
+        # 标准库直接put_nowait，队列满时结束标记放不进去；这里等后台线程腾出位置
+        self.queue.put(self._sentinel, timeout=LISTENER_STOP_TIMEOUT)
+
+
+def configure_logging(config: dict | None = None):
+    """
+    按配置文件的logging部分设置日志（可以重复调用，后一次的设置覆盖前一次）
+        logging:
+          level: INFO              # 根级别
+          file: logs/zzz.log       # 同时写到文件（相对项目根目录），留空则只输出到控制台
+          levels:                  # 单独调整某些模块，例如 core.vision: DEBUG
+            core.vision: DEBUG
+    """
+    global _handler, _listener
+    log_config = (config or {}).get('logging', {}) or {}
+    # 日志格式里不需要调用位置和进程信息，按标准库文档的优化建议关掉，创建每条记录能省下好几微秒
+    # 这是进程级的设置，所以只在入口脚本明确配置日志时才改
+    logging._srcfile = None
+    logging.logProcesses = False
+    logging.logMultiprocessing = False
+    # 不往Python的根logger传，避免第三方库配置的handler重复输出
+    _root.propagate = False
+    with _lock:
+        if _listener is not None:
+            _stop_listener()
+        if _handler is not None:
+            _root.removeHandler(_handler)
+
+        formatter = logging.Formatter(LOG_FORMAT, LOG_DATE_FORMAT)
+        handlers: list[logging.Handler] = [logging.StreamHandler(sys.stdout)]
+        log_file = log_config.get('file')
+        if log_file:
+            path = PROJECT_ROOT / log_file
+            os.makedirs(path.parent, exist_ok=True)
+            handlers.append(logging.FileHandler(path, encoding='utf-8'))
+        for handler in handlers:
+            handler.setFormatter(formatter)
+
+        log_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+        _handler = QueueLogHandler(log_queue)
+        _root.addHandler(_handler)
+        _listener = QueueLogListener(log_queue, *handlers, respect_handler_level=True)
+        _listener.start()
+    levels = {ROOT_LOGGER_NAME: log_config.get('level', DEFAULT_LEVEL)}
+    levels.update({f"{ROOT_LOGGER_NAME}.{name}": level for name, level in (log_config.get('levels') or {}).items()})
+    for name, level in levels.items():
+        try:
+            logging.getLogger(name).setLevel(level.upper() if isinstance(level, str) else level)
+        except ValueError:
+            _root.warning("日志级别%r无效，%s使用默认级别", level, name)
+
+
+def flush_logging():
+    """等后台线程把队列里已有的日志都写完"""
+    with _lock:
+        if _listener is not None and _stop_listener():
+            _listener.start()
+
+
+def _stop_listener() -> bool:
+    """
+    :return: 后台线程是否已经写完并退出
+    """
+    try:
+        _listener.stop()
+        return True
+    except queue.Full:
+        # 输出卡住了，后台线程是守护线程，由它继续慢慢写，不再等待
+        return False
+
+
+def dropped_records() -> int:
+    """因为队列满被丢弃的日志条数"""
+    return _handler.dropped if _handler is not None else 0
+
+
+@atexit.register
+def _shutdown():
+    """退出时写完剩下的日志"""
+    with _lock:
+        if _listener is not None:
+            _stop_listener()
@@ -3,4 +3,5 @@ from pathlib import Path
 PROJECT_ROOT = Path(__file__).resolve().parent.parent.parent.parent
 
 ASSETS_PATH = PROJECT_ROOT / "assets"
-CONFIG_PATH = PROJECT_ROOT / "config"
\ No newline at end of file
+CONFIG_PATH = PROJECT_ROOT / "config"
+CACHE_PATH = PROJECT_ROOT / "cache"
\ No newline at end of file